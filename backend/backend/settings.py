@@ -132,13 +132,47 @@ DATABASES = {
     }
 }
 
+REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379")
+
+REDIS_POOL = {
+    "MAX_CONNECTIONS": 50,
+    "HEALTH_CHECK_INTERVAL": 15,
+    "SOCKET_TIMEOUT": 2
+}
+
 CACHES = {
     "default": {
         "BACKEND": "django.core.cache.backends.redis.RedisCache",
-        "LOCATION": "redis://redis:6379"
+        "LOCATION": REDIS_URL,
+        "OPTIONS": {
+            "pool_class": "chat.redis_pool.InstrumentedConnectionPool",
+            "metrics_name": "cache",
+            "max_connections": REDIS_POOL["MAX_CONNECTIONS"],
+            "health_check_interval": REDIS_POOL["HEALTH_CHECK_INTERVAL"],
+            "socket_timeout": REDIS_POOL["SOCKET_TIMEOUT"],
+            "socket_connect_timeout": REDIS_POOL["SOCKET_TIMEOUT"]
+        }
     }
 }
 
+CLEANUP = {
+    "BATCH_SIZE": 1000,
+    "BATCH_PAUSE": 0.05,
+    "CHAT_BATCH_SIZE": 500,
+    "DELETED_CHATS_MAX_PER_RUN": 5000,
+    "INTERVAL": 60 * 60,
+    "SESSION_RETENTION": timedelta(days = 30),
+    "DELETED_FILE_RETENTION": timedelta(days = 30),
+    "GUEST_BATCH_SIZE": 50,
+    "GUEST_BATCH_PAUSE": 0.5,
+    "GUEST_MAX_PER_RUN": 5000
+}
+
+TEMPORARY_CHATS = {
+    "STORAGE": "cache",
+    "TTL": 60 * 60
+}
+
 STATIC_URL = "static/"
 STATIC_ROOT = "static"
 
@@ -161,13 +195,17 @@ CHANNEL_LAYERS = {
     "default": {
         "BACKEND": "channels_redis.core.RedisChannelLayer",
         "CONFIG": {
-            "hosts": [["redis", "6379"]]
+            "hosts": [{
+                "address": REDIS_URL,
+                "max_connections": REDIS_POOL["MAX_CONNECTIONS"],
+                "health_check_interval": REDIS_POOL["HEALTH_CHECK_INTERVAL"]
+            }]
         }
     }
 }
 
 REST_FRAMEWORK = {
-    "DEFAULT_AUTHENTICATION_CLASSES": ["rest_framework_simplejwt.authentication.JWTAuthentication"],
+    "DEFAULT_AUTHENTICATION_CLASSES": ["chat.authentication.RevocableJWTAuthentication"],
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
     "DEFAULT_THROTTLE_CLASSES": [] if DEBUG else [
         "chat.throttles.PerUserRateThrottle",
@@ -26,6 +26,7 @@ class ChatAdmin(admin.ModelAdmin):
         (None, {"fields": ("user", "display_uuid", "title", "pending_message_display", "is_archived", "is_temporary", "created_at_display")} ),
     )
     list_display = ("title", "uuid", "user_link", "is_pending", "is_archived_display", "is_temporary_display", "created_at_display")
+    list_select_related = ("user",)
     search_fields = ("title", "user__email")
     ordering = ("-created_at",)
 
@@ -76,9 +77,10 @@ class ChatAdmin(admin.ModelAdmin):
         return redirect(reverse("admin:chat_chat_change", args = [chat.pk]))
 
     def is_pending(self, chat: Chat):
-        return chat.pending_message is not None
+        return chat.pending_message_id is not None
 
     is_pending.short_description = "Pending"
+    is_pending.admin_order_field = "pending_message"
     is_pending.boolean = True
 
     def is_archived_display(self, chat: Chat):
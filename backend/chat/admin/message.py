@@ -1,3 +1,4 @@
+import codecs
 import logging
 
 logger = logging.getLogger(__name__)
@@ -5,11 +6,47 @@ logger = logging.getLogger(__name__)
 from django import forms
 from django.contrib import admin
 from django.contrib.admin.utils import display_for_field
+from django.contrib.admin.views.main import ChangeList
+from django.db.models import Prefetch
+from django.db.models.functions import Length, Substr
 from django.template.loader import render_to_string
 from django.urls import reverse
+from django.utils.html import escape
 from django.utils.safestring import mark_safe
 
-from ..models import Message
+from ..models import Message, MessageFile
+
+SUMMARY_LENGTH = 25
+PREVIEW_LENGTH = 1000
+PREVIEW_BYTES = PREVIEW_LENGTH * 4 + 4
+
+def get_preview_files():
+    return MessageFile.objects.defer("content").annotate(content_prefix = Substr("content", 1, PREVIEW_BYTES))
+
+def get_file_preview(prefix: bytes | memoryview):
+    text = codecs.getincrementaldecoder("utf-8")().decode(bytes(prefix))
+    if not all(character.isprintable() or character in "\n\r\t" for character in text[:PREVIEW_LENGTH]):
+        return "(binary content hidden)"
+    return "<pre>" + escape(text[:PREVIEW_LENGTH]) + ("..." if len(text) > PREVIEW_LENGTH else "") + "</pre>"
+
+def render_files(files):
+    items = []
+    for f in files:
+        try:
+            preview = get_file_preview(f.content_prefix)
+        except UnicodeDecodeError:
+            preview = "(binary content hidden)"
+
+        items.append({
+            "name": f.name,
+            "content_type": f.content_type,
+            "created_at": f.created_at.strftime("%Y-%m-%d %H:%M:%S"),
+            "preview": preview,
+        })
+
+    if not items:
+        return ""
+    return mark_safe(render_to_string("chat/files_list.html", {"items": items}))
 
 class MessageForm(forms.ModelForm):
     class Meta:
@@ -30,43 +67,19 @@ class MessageInline(admin.StackedInline):
     fields = ("text", "files_display", "is_from_user", "model", "last_modified_at_display", "created_at_display")
     readonly_fields = ("files_display", "last_modified_at_display", "created_at_display")
     extra = 0
+    ordering = ("position",)
     show_change_link = True
 
     class Media:
         js = ("chat/js/autoresize.js",)
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related(Prefetch("files", get_preview_files()))
+
     def files_display(self, message: Message):
         if not message.pk:
             return ""
-
-        files = message.files.all()
-        if not files:
-            return ""
-
-        items = []
-        for f in files:
-            preview = "(binary content hidden)"
-            try:
-                data = f.content
-                if isinstance(data, (bytes, bytearray)):
-                    try:
-                        text = data.decode("utf-8")
-                        if all(ch.isprintable() or ch in "\n\r\t" for ch in text):
-                            preview = "<pre>" + (text[:1000] + ("..." if len(text) > 1000 else "")) + "</pre>"
-                    except UnicodeDecodeError:
-                        preview = "(binary content hidden)"
-            except Exception:
-                preview = "(unable to read content)"
-
-            items.append({
-                "name": f.name,
-                "content_type": f.content_type,
-                "created_at": f.created_at.strftime("%Y-%m-%d %H:%M:%S"),
-                "preview": preview,
-            })
-
-        rendered = render_to_string("chat/files_list.html", {"items": items})
-        return mark_safe(rendered)
+        return render_files(message.files.all())
 
     files_display.short_description = "Files"
 
@@ -82,18 +95,27 @@ class MessageInline(admin.StackedInline):
 
     created_at_display.short_description = "Created"
 
+class MessageChangeList(ChangeList):
+    def get_queryset(self, request, exclude_parameters = None):
+        queryset = super().get_queryset(request, exclude_parameters)
+        return queryset.defer("text").annotate(summary_text = Substr("text", 1, SUMMARY_LENGTH), text_length = Length("text"))
+
 class MessageAdmin(admin.ModelAdmin):
     model = Message
     form = MessageForm
     readonly_fields = ("last_modified_at_display", "created_at_display")
     fields = ("chat", "text", "is_from_user", "model", "last_modified_at_display", "created_at_display")
     list_display = ("chat__title", "summary", "is_from_user", "model", "last_modified_at_display", "created_at_display")
+    list_select_related = ("chat__user",)
     search_fields = ("chat__title", "text")
     ordering = ("-created_at",)
 
     class Media:
         js = ("chat/js/autoresize.js",)
 
+    def get_changelist(self, request, **kwargs):
+        return MessageChangeList
+
     def chat_title(self, message: Message):
         if not message or not message.chat:
             return ""
@@ -105,36 +127,14 @@ class MessageAdmin(admin.ModelAdmin):
     def files_display(self, message: Message):
         if not message.pk:
             return ""
-        files = message.files.all()
-        if not files:
-            return ""
-        items = []
-        for f in files:
-            preview = "(binary content hidden)"
-            try:
-                data = f.content
-                if isinstance(data, (bytes, bytearray)):
-                    try:
-                        text = data.decode("utf-8")
-                        if all(character.isprintable() or character in "\n\r\t" for character in text):
-                            preview = "<pre>" + (text[:1000] + ("..." if len(text) > 1000 else "")) + "</pre>"
-                    except UnicodeDecodeError:
-                        preview = "(binary content hidden)"
-            except Exception:
-                preview = "(unable to read content)"
-            items.append({
-                "name": f.name,
-                "content_type": f.content_type,
-                "created_at": f.created_at.strftime("%Y-%m-%d %H:%M:%S"),
-                "preview": preview,
-            })
-        rendered = render_to_string("chat/files_list.html", {"items": items})
-        return mark_safe(rendered)
+        return render_files(get_preview_files().filter(message = message))
 
     files_display.short_description = "Files"
 
     def summary(self, message: Message):
-        return message.text[:25] + ("..." if len(message.text) > 25 else "")
+        if hasattr(message, "summary_text"):
+            return message.summary_text + ("..." if message.text_length > SUMMARY_LENGTH else "")
+        return message.text[:SUMMARY_LENGTH] + ("..." if len(message.text) > SUMMARY_LENGTH else "")
 
     def last_modified_at_display(self, message: Message):
         field = Message._meta.get_field("last_modified_at")
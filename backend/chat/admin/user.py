@@ -9,6 +9,7 @@ from django.contrib.admin.filters import BooleanFieldListFilter
 from django.contrib.admin.utils import display_for_field
 from django.contrib.auth.admin import UserAdmin as DjangoUserAdmin
 from django.contrib.auth.forms import AdminUserCreationForm, ReadOnlyPasswordHashField, AdminPasswordChangeForm
+from django.db.models import Count, Q
 from django.shortcuts import get_object_or_404, redirect
 from django.template.loader import render_to_string
 from django.urls import path, reverse
@@ -16,6 +17,7 @@ from django.utils import timezone
 from django.utils.safestring import mark_safe
 from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
 
+from ..authentication import revoke_user_tokens
 from ..models import User, UserMFA, UserPreferences, UserSession
 
 class AdminPasswordChangeFormWithMinLength(AdminPasswordChangeForm):
@@ -212,10 +214,11 @@ class UserAdmin(DjangoUserAdmin):
             logger.exception("Error creating related UserPreferences/UserMFA")
 
     def sessions_display(self, user: User):
-        total = user.sessions.count()
-        active = user.sessions.filter(logout_at = None).count()
-        inactive = user.sessions.exclude(logout_at = None).count()
-        sessions = user.sessions.filter(user = user).order_by("-login_at")[:10]
+        counts = user.sessions.aggregate(total = Count("pk"), active = Count("pk", filter = Q(logout_at = None)))
+        total = counts["total"]
+        active = counts["active"]
+        inactive = total - active
+        sessions = user.sessions.order_by("-login_at")[:10]
 
         items = []
         for s in sessions:
@@ -350,9 +353,7 @@ class UserAdmin(DjangoUserAdmin):
             return redirect(reverse("admin:chat_user_change", args = [user.pk]))
 
         user.sessions.filter(user = user, logout_at__isnull = True).update(logout_at = timezone.now())
-        tokens = OutstandingToken.objects.filter(user = user)
-        for token in tokens:
-            BlacklistedToken.objects.get_or_create(token = token)
+        revoke_user_tokens(user)
 
         return redirect(reverse("admin:chat_user_change", args = [user.pk]))
 
@@ -369,6 +370,7 @@ class UserSessionAdmin(admin.ModelAdmin):
     list_display = (
         "user__email", "login_at_display", "logout_at_display", "ip_address_display", "device_display", "browser", "os_display"
     )
+    list_select_related = ("user",)
     search_fields = ("user__email", "ip_address", "user_agent", "device", "browser", "os")
     ordering = ("-login_at",)
 
@@ -407,8 +409,8 @@ class UserSessionAdmin(admin.ModelAdmin):
             return "N/A"
 
         family = session.device.partition("family=")[2].partition(",")[0].replace("'", "").replace("None", "N/A")
-        brand = session.device.partition("brand=")[2].partition(",")[0].replace("None", "N/A")
-        model = session.device.partition("model=")[2].partition(",")[0].replace(")", "").replace("None", "N/A")
+        brand = session.device.partition("brand=")[2].partition(",")[0].replace("'", "").replace("None", "N/A")
+        model = session.device.partition("model=")[2].partition(",")[0].replace(")", "").replace("'", "").replace("None", "N/A")
 
         return mark_safe(
             "<pre style=\"white-space:pre-wrap;word-break:break-all;\">"
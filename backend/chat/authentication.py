@@ -0,0 +1,26 @@
+from django.utils import timezone
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from .models import User
+
+class RevocableJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        user: User = super().get_user(validated_token)
+        if is_token_revoked(user, validated_token):
+            raise AuthenticationFailed("Token has been revoked.", code = "token_revoked")
+        return user
+
+def is_token_revoked(user: User, token) -> bool:
+    if user.tokens_valid_after is None:
+        return False
+    return token.get("iat", 0) <= int(user.tokens_valid_after.timestamp())
+
+def revoke_user_tokens(user: User):
+    now = timezone.now()
+    user.tokens_valid_after = now
+    user.save(update_fields = ["tokens_valid_after"])
+
+    token_ids = OutstandingToken.objects.filter(user = user, expires_at__gt = now).values_list("pk", flat = True)
+    BlacklistedToken.objects.bulk_create([BlacklistedToken(token_id = token_id) for token_id in token_ids], ignore_conflicts = True)
\ No newline at end of file
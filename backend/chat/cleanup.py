@@ -0,0 +1,152 @@
+import logging
+import time
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q, QuerySet
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+
+from .models import AccountDeletion, Chat, DeletedMessageFile, EmailVerificationToken, Message, MessageFile, PasswordResetToken, PreAuthToken, User, UserSession
+from .versions import delete_messages_versions, delete_user_versions
+
+logger = logging.getLogger(__name__)
+
+def get_cleanup_settings() -> dict:
+    return settings.CLEANUP
+
+def get_expired_querysets(now: datetime) -> dict[str, QuerySet]:
+    session_retention: timedelta = get_cleanup_settings()["SESSION_RETENTION"]
+    deleted_file_retention: timedelta = get_cleanup_settings()["DELETED_FILE_RETENTION"]
+    return {
+        "pre_auth_tokens": PreAuthToken.objects.filter(Q(expires_at__lte = now) | Q(used_at__isnull = False)),
+        "email_verification_tokens": EmailVerificationToken.objects.filter(Q(expires_at__lte = now) | Q(used_at__isnull = False)),
+        "password_reset_tokens": PasswordResetToken.objects.filter(Q(expires_at__lte = now) | Q(used_at__isnull = False)),
+        "user_sessions": UserSession.objects.filter(logout_at__lte = now - session_retention),
+        "outstanding_tokens": OutstandingToken.objects.filter(expires_at__lte = now),
+        "deleted_message_files": DeletedMessageFile.objects.filter(deleted_at__lte = now - deleted_file_retention)
+    }
+
+def delete_in_batches(queryset: QuerySet, batch_size: int, batch_pause: float) -> int:
+    deleted = 0
+    while True:
+        pks = list(queryset.order_by("pk").values_list("pk", flat = True)[:batch_size])
+        if len(pks) == 0:
+            return deleted
+
+        with transaction.atomic():
+            queryset.model._base_manager.filter(pk__in = pks).delete()
+        deleted += len(pks)
+
+        if len(pks) < batch_size:
+            return deleted
+        time.sleep(batch_pause)
+
+def delete_chats(queryset: QuerySet[Chat], batch_size: int | None = None) -> int:
+    batch_size = batch_size or get_cleanup_settings()["CHAT_BATCH_SIZE"]
+
+    deleted = 0
+    while True:
+        chat_uuids = list(queryset.order_by("pk").values_list("pk", flat = True)[:batch_size])
+        if len(chat_uuids) == 0:
+            return deleted
+
+        delete_chat_batch(chat_uuids, queryset.db)
+        deleted += len(chat_uuids)
+
+        if len(chat_uuids) < batch_size:
+            return deleted
+
+def delete_chat_batch(chat_uuids: list, using: str):
+    with transaction.atomic(using = using):
+        Chat._base_manager.using(using).filter(pk__in = chat_uuids).update(pending_message = None)
+        for model in [MessageFile, DeletedMessageFile]:
+            model._base_manager.using(using).filter(message__chat_id__in = chat_uuids).delete()
+        Message._base_manager.using(using).filter(chat_id__in = chat_uuids).only("pk").delete()
+        Chat._base_manager.using(using).filter(pk__in = chat_uuids).only("pk").delete()
+    delete_messages_versions(chat_uuids)
+
+def purge_account(deletion: AccountDeletion, batch_size: int, batch_pause: float, max_chats: int) -> int:
+    user_id = deletion.user_id
+    chats = Chat.objects.filter(user_id = user_id)
+
+    deleted = 0
+    while deleted < max_chats:
+        chat_batch_size = min(batch_size, max_chats - deleted)
+        chat_uuids = list(chats.order_by("pk").values_list("pk", flat = True)[:chat_batch_size])
+        if len(chat_uuids) == 0:
+            break
+
+        delete_chat_batch(chat_uuids, chats.db)
+        deletion.deleted_chats += len(chat_uuids)
+        deletion.save(update_fields = ["deleted_chats"])
+        deleted += len(chat_uuids)
+
+        if len(chat_uuids) < chat_batch_size:
+            break
+        time.sleep(batch_pause)
+
+    if deleted >= max_chats and chats.exists():
+        return deleted
+
+    with transaction.atomic():
+        User.objects.filter(pk = user_id).delete()
+        deletion.completed_at = timezone.now()
+        deletion.save(update_fields = ["completed_at"])
+    delete_user_versions([user_id])
+    return deleted
+
+def purge_deleted_accounts() -> int:
+    cleanup_settings = get_cleanup_settings()
+    remaining_chats = cleanup_settings["DELETED_CHATS_MAX_PER_RUN"]
+
+    purged = 0
+    for deletion in AccountDeletion.objects.filter(user__isnull = False, completed_at__isnull = True).order_by("requested_at"):
+        remaining_chats -= purge_account(deletion, cleanup_settings["CHAT_BATCH_SIZE"], cleanup_settings["BATCH_PAUSE"], remaining_chats)
+        if deletion.completed_at is None:
+            break
+        purged += 1
+    return purged
+
+def get_expired_guests(now: datetime) -> QuerySet[User]:
+    return User.objects.filter(is_guest = True).filter(
+        Q(guest_identity__expires_at__lte = now) | Q(guest_identity__isnull = True, created_at__lte = now - timedelta(days = 1))
+    ).exclude(chats__pending_message__isnull = False).exclude(deletion__isnull = False)
+
+def sweep_expired_guests(now: datetime) -> int:
+    cleanup_settings = get_cleanup_settings()
+    batch_pause = cleanup_settings["GUEST_BATCH_PAUSE"]
+
+    deleted = 0
+    while deleted < cleanup_settings["GUEST_MAX_PER_RUN"]:
+        batch_size = min(cleanup_settings["GUEST_BATCH_SIZE"], cleanup_settings["GUEST_MAX_PER_RUN"] - deleted)
+        user_ids = list(get_expired_guests(now).order_by("pk").values_list("pk", flat = True)[:batch_size])
+        if len(user_ids) == 0:
+            break
+
+        delete_chats(Chat.objects.filter(user_id__in = user_ids), cleanup_settings["CHAT_BATCH_SIZE"])
+        with transaction.atomic():
+            User.objects.filter(pk__in = user_ids).delete()
+        delete_user_versions(user_ids)
+        deleted += len(user_ids)
+
+        if len(user_ids) < batch_size:
+            break
+        time.sleep(batch_pause)
+
+    return deleted
+
+def collect_garbage(batch_size: int | None = None, now: datetime | None = None) -> dict[str, int]:
+    cleanup_settings = get_cleanup_settings()
+    batch_size = batch_size or cleanup_settings["BATCH_SIZE"]
+    now = now or timezone.now()
+
+    counts = {}
+    for name, queryset in get_expired_querysets(now).items():
+        counts[name] = delete_in_batches(queryset, batch_size, cleanup_settings["BATCH_PAUSE"])
+    counts["guest_users"] = sweep_expired_guests(now)
+    counts["deleted_accounts"] = purge_deleted_accounts()
+
+    logger.info("Garbage collection deleted %s.", ", ".join(f"{count} {name}" for name, count in counts.items()))
+    return counts
\ No newline at end of file
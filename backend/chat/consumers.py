@@ -1,23 +1,28 @@
-import logging
-import os
-import time
-
 from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncJsonWebsocketConsumer
 from django.conf import settings
 from django.contrib.auth.models import AnonymousUser
 from jwt import decode as jwt_decode
-from redis import asyncio as aioredis
 
+from .authentication import is_token_revoked
+from .events import get_user_group
+from .limiter import get_token_bucket
 from .models import User
-from .tasks import astop_pending_chat, opened_chats
+from .stream_log import read_chunks
+from .tasks import adelete_temporary_chat, opened_chats
+from .temporary_chats import aget_temporary_chat
 
 class ChatConsumer(AsyncJsonWebsocketConsumer):
+    max_chat_subscriptions = 20
+
     async def connect(self):
-        self.redis_limiter = RedisTokenBucket("rate:user", 20, 60.0)
+        self.redis_limiter = get_token_bucket("rate:user", 20, 60.0, 5)
 
         self.user: User = await self.get_user_from_cookie()
         self.chat_uuid = ""
+        self.chat_uuids: set[str] = set()
+        self.multiplexed = False
+        self.has_user_events = False
 
         if self.user is None or isinstance(self.user, AnonymousUser):
             return await self.close(401, "User not authenticated.")
@@ -25,14 +30,11 @@ class ChatConsumer(AsyncJsonWebsocketConsumer):
         await self.accept()
 
     async def disconnect(self, code):
-        if self.chat_uuid != "":
-            opened_chats.discard(self.chat_uuid)
-            await self.channel_layer.group_discard(f"chat_{self.chat_uuid}", self.channel_name)
+        for chat_uuid in list(self.chat_uuids):
+            await self.leave_chat(chat_uuid)
 
-            chat = await database_sync_to_async(self.user.chats.filter(uuid = self.chat_uuid, is_temporary = True).first)()
-            if chat is not None:
-                await astop_pending_chat(chat)
-                await chat.adelete()
+        if self.has_user_events:
+            await self.channel_layer.group_discard(get_user_group(self.user.pk), self.channel_name)
 
     async def receive_json(self, content):
         allowed, retry_after = await self.redis_limiter.allow(str(getattr(self.user, "id", "anon")))
@@ -40,6 +42,9 @@ class ChatConsumer(AsyncJsonWebsocketConsumer):
             await self.send_json({"error": "rate_limited", "retry_after": retry_after})
             return
 
+        if type(content) == dict and "action" in content:
+            return await self.receive_action(content)
+
         if self.chat_uuid != "": return
 
         if type(content) != dict:
@@ -49,22 +54,103 @@ class ChatConsumer(AsyncJsonWebsocketConsumer):
         if type(chat_uuid) != str:
             return await self.close()
 
-        if await database_sync_to_async(self.user.chats.filter(uuid = chat_uuid).exists)():
+        if await self.can_join_chat(chat_uuid):
             self.chat_uuid = chat_uuid
-            await self.channel_layer.group_add(f"chat_{chat_uuid}", self.channel_name)
-            opened_chats.add(chat_uuid)
+            await self.join_chat(chat_uuid, content)
+
+    async def receive_action(self, content: dict):
+        self.multiplexed = True
+
+        action = content["action"]
+        chat_uuid = content.get("chat_uuid")
+
+        if action == "subscribe_events":
+            if not self.has_user_events:
+                self.has_user_events = True
+                await self.channel_layer.group_add(get_user_group(self.user.pk), self.channel_name)
+        elif action == "subscribe" and type(chat_uuid) == str:
+            if chat_uuid in self.chat_uuids or len(self.chat_uuids) >= self.max_chat_subscriptions:
+                return
+            if await self.can_join_chat(chat_uuid):
+                await self.join_chat(chat_uuid, content)
+        elif action == "unsubscribe" and type(chat_uuid) == str:
+            if chat_uuid in self.chat_uuids:
+                await self.leave_chat(chat_uuid)
+        else:
+            return await self.close()
+
+    async def can_join_chat(self, chat_uuid: str):
+        if await aget_temporary_chat(self.user.pk, chat_uuid) is not None:
+            return True
+        return await database_sync_to_async(self.user.chats.filter(uuid = chat_uuid).exists)()
+
+    async def join_chat(self, chat_uuid: str, content: dict):
+        self.chat_uuids.add(chat_uuid)
+        await self.channel_layer.group_add(f"chat_{chat_uuid}", self.channel_name)
+
+        last_seq = content.get("last_seq")
+        if type(last_seq) == int and await self.replay_stream(chat_uuid, content.get("stream_id"), last_seq):
+            return
+
+        opened_chats.add(chat_uuid)
+
+    async def leave_chat(self, chat_uuid: str):
+        self.chat_uuids.discard(chat_uuid)
+        opened_chats.discard(chat_uuid)
+        await self.channel_layer.group_discard(f"chat_{chat_uuid}", self.channel_name)
+        await adelete_temporary_chat(self.user, chat_uuid)
+
+    async def replay_stream(self, chat_uuid: str, stream_id: str | None, last_seq: int):
+        result = await read_chunks(chat_uuid, stream_id, last_seq)
+        if result is None:
+            return False
+
+        current_stream_id, resumed, chunks = result
+        tokens = [c for c in chunks if not c["end"]]
+
+        if resumed:
+            for chunk in tokens:
+                await self.send_chat_json(chat_uuid, {"token": chunk["token"], "message_index": chunk["message_index"], "seq": chunk["seq"], "stream_id": current_stream_id})
+        elif len(tokens) > 0:
+            await self.send_chat_json(chat_uuid, {
+                "message": "".join([c["token"] for c in tokens]),
+                "message_index": tokens[-1]["message_index"],
+                "seq": tokens[-1]["seq"],
+                "stream_id": current_stream_id
+            })
+
+        if len(tokens) < len(chunks):
+            await self.send_chat_json(chat_uuid, "end")
+
+        return True
+
+    async def send_chat_json(self, chat_uuid: str, content: dict | str):
+        if self.multiplexed:
+            content = {"chat_uuid": chat_uuid, "end": True} if content == "end" else {"chat_uuid": chat_uuid, **content}
+        await self.send_json(content)
 
     async def send_token(self, event):
-        await self.send_json({"token": event["token"], "message_index": event["message_index"]})
+        response = {"token": event["token"], "message_index": event["message_index"]}
+        if "seq" in event:
+            response["seq"] = event["seq"]
+            response["stream_id"] = event["stream_id"]
+        await self.send_chat_json(event.get("chat_uuid", self.chat_uuid), response)
 
     async def send_message(self, event):
-        await self.send_json({"message": event["message"], "message_index": event["message_index"]})
+        await self.send_chat_json(event.get("chat_uuid", self.chat_uuid), {"message": event["message"], "message_index": event["message_index"]})
 
     async def send_title(self, event):
-        await self.send_json({"title": event["title"]})
+        await self.send_chat_json(event.get("chat_uuid", self.chat_uuid), {"title": event["title"]})
 
     async def send_end(self, event):
-        await self.send_json("end")
+        await self.send_chat_json(event.get("chat_uuid", self.chat_uuid), "end")
+
+    async def send_user_event(self, event):
+        await self.send_json({"event": event["event"], **event["data"]})
+
+    async def send_user_events(self, event):
+        for user_event in event["events"]:
+            await self.send_json({"event": user_event["event"], **user_event["data"]})
 
     async def get_user_from_cookie(self):
         try:
@@ -84,83 +170,9 @@ class ChatConsumer(AsyncJsonWebsocketConsumer):
 
             decoded_data = jwt_decode(token, settings.SECRET_KEY, algorithms = ["HS256"])
             user_id = decoded_data.get("user_id")
-            return await User.objects.aget(id = user_id)
+            user = await User.objects.aget(id = user_id, is_active = True)
+            if is_token_revoked(user, decoded_data):
+                return AnonymousUser()
+            return user
         except Exception:
-            return AnonymousUser()
-
-_TOKEN_BUCKET_LUA = """
-local key = KEYS[1]
-local now = tonumber(ARGV[1])
-local capacity = tonumber(ARGV[2])
-local refill_per_sec = tonumber(ARGV[3])
-local requested = tonumber(ARGV[4])
-
-local data = redis.call("HMGET", key, "tokens", "ts")
-local tokens = tonumber(data[1])
-local ts = tonumber(data[2])
-
-if tokens == nil then
-  tokens = capacity
-  ts = now
-end
-
-local delta = math.max(0, now - ts)
-local filled = delta * refill_per_sec
-tokens = math.min(capacity, tokens + filled)
-
-if tokens >= requested then
-  tokens = tokens - requested
-  redis.call("HMSET", key, "tokens", tostring(tokens), "ts", tostring(now))
-  redis.call("EXPIRE", key, math.ceil(math.max(60, capacity / refill_per_sec * 2)))
-  return {1, tostring(tokens)}
-else
-  local need = (requested - tokens) / refill_per_sec
-  return {0, tostring(need)}
-end
-"""
-
-_redis = None
-async def get_redis():
-    global _redis
-    if _redis is None:
-        url = getattr(settings, "REDIS_URL", None)
-        if not url:
-            url = os.environ.get("REDIS_URL")
-        if not url and getattr(settings, "CACHES", None):
-            loc = settings.CACHES.get("default", {}).get("LOCATION")
-            if isinstance(loc, str) and loc.startswith("redis"):
-                url = loc
-        if not url:
-            url = "redis://redis:6379/0"
-
-        try:
-            _redis = aioredis.from_url(url, encoding = "utf-8", decode_responses = True)
-            await _redis.ping()
-        except Exception as e:
-            logging.warning("Redis not available (%s). Rate limiter disabled (fail-open).", e)
-            class _DummyRedis:
-                async def eval(self, *args, **kwargs):
-                    return ["1", "0"]
-            _redis = _DummyRedis()
-    return _redis
-
-class RedisTokenBucket:
-    def __init__(self, key_prefix: str, capacity: int, period: float):
-        self.key_prefix = key_prefix
-        self.capacity = float(capacity)
-        self.refill_per_sec = float(capacity) / float(period)
-
-    async def allow(self, key_id: str, requested: int = 1):
-        if os.environ.get("DJANGO_TEST") == "True":
-            return True, 0.0
-
-        redis = await get_redis()
-        key = f"{self.key_prefix}:{key_id}"
-        now = time.time()
-        res = await redis.eval(_TOKEN_BUCKET_LUA, 1, key, str(now), str(self.capacity), str(self.refill_per_sec), str(requested))
-        allowed = str(res[0]) == "1"
-        val = float(res[1])
-        if allowed:
-            return True, 0.0
-        else:
-            return False, val
\ No newline at end of file
+            return AnonymousUser()
\ No newline at end of file
@@ -0,0 +1,33 @@
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+def get_user_group(user_id: int):
+    return f"user_{user_id}"
+
+def send_user_event(user_id: int, event: str, **data):
+    transaction.on_commit(lambda: async_to_sync(asend_user_event)(user_id, event, **data))
+
+async def asend_user_event(user_id: int, event: str, **data):
+    try:
+        await get_channel_layer().group_send(get_user_group(user_id), {"type": "send_user_event", "event": event, "data": data})
+    except Exception:
+        logger.exception("Could not send user event '%s'.", event)
+
+def send_user_events(user_id: int, events: list[tuple[str, dict]]):
+    transaction.on_commit(lambda: async_to_sync(asend_user_events)(user_id, events))
+
+async def asend_user_events(user_id: int, events: list[tuple[str, dict]]):
+    if len(events) == 0:
+        return
+    try:
+        await get_channel_layer().group_send(
+            get_user_group(user_id),
+            {"type": "send_user_events", "events": [{"event": event, "data": data} for event, data in events]}
+        )
+    except Exception:
+        logger.exception("Could not send user events %s.", ", ".join(f"'{event}'" for event, _ in events))
\ No newline at end of file
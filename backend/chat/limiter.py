@@ -0,0 +1,187 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from redis.exceptions import NoScriptError, RedisError
+
+from .redis_pool import get_redis, get_sync_redis
+
+_TOKEN_BUCKET_LUA = """
+local key = KEYS[1]
+local now = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local refill_per_sec = tonumber(ARGV[3])
+local requested = tonumber(ARGV[4])
+local lease = tonumber(ARGV[5])
+
+local data = redis.call("HMGET", key, "tokens", "ts")
+local tokens = tonumber(data[1])
+local ts = tonumber(data[2])
+
+if tokens == nil then
+  tokens = capacity
+  ts = now
+end
+
+local delta = math.max(0, now - ts)
+local filled = delta * refill_per_sec
+tokens = math.min(capacity, tokens + filled)
+
+if tokens >= requested then
+  local granted = requested
+  if lease > requested and tokens - lease >= capacity / 2 then
+    granted = lease
+  end
+  tokens = tokens - granted
+  redis.call("HMSET", key, "tokens", tostring(tokens), "ts", tostring(now))
+  redis.call("EXPIRE", key, math.ceil(math.max(60, capacity / refill_per_sec * 2)))
+  return {1, tostring(tokens), tostring(granted)}
+else
+  local need = (requested - tokens) / refill_per_sec
+  return {0, tostring(need), "0"}
+end
+"""
+
+_TOKEN_BUCKET_SHA = hashlib.sha1(_TOKEN_BUCKET_LUA.encode()).hexdigest()
+
+class RedisTokenBucket:
+    max_local_keys = 10_000
+
+    def __init__(self, key_prefix: str, capacity: int, period: float, lease: int = 1):
+        self.key_prefix = key_prefix
+        self.capacity = float(capacity)
+        self.refill_per_sec = float(capacity) / float(period)
+        self.lease = max(1, min(int(lease), int(capacity)))
+        self.lease_ttl = self.lease / self.refill_per_sec
+
+        self._local_tokens: OrderedDict[str, tuple[int, float]] = OrderedDict()
+        self._local_lock = threading.Lock()
+
+    async def allow(self, key_id: str, requested: int = 1):
+        if os.environ.get("DJANGO_TEST") == "True":
+            return True, 0.0
+
+        key = f"{self.key_prefix}:{key_id}"
+        if self._take_local(key, requested):
+            return True, 0.0
+
+        redis = await get_redis()
+        if redis is None:
+            return True, 0.0
+
+        args = self._script_args(requested)
+        try:
+            try:
+                res = await redis.evalsha(_TOKEN_BUCKET_SHA, 1, key, *args)
+            except NoScriptError:
+                async with redis.pipeline(transaction = False) as pipe:
+                    pipe.script_load(_TOKEN_BUCKET_LUA)
+                    pipe.evalsha(_TOKEN_BUCKET_SHA, 1, key, *args)
+                    _, res = await pipe.execute()
+        except RedisError as e:
+            redis.connection_pool.metrics.mark_unhealthy(e)
+            return True, 0.0
+
+        return self._handle_result(key, requested, res)
+
+    def allow_sync(self, key_id: str, requested: int = 1):
+        return allow_many_sync([(self, key_id)], requested)[0]
+
+    def _script_args(self, requested: int):
+        return str(time.time()), str(self.capacity), str(self.refill_per_sec), str(requested), str(self.lease)
+
+    def _handle_result(self, key: str, requested: int, res):
+        allowed = str(res[0]) == "1"
+        if not allowed:
+            return False, float(res[1])
+
+        surplus = int(float(res[2])) - requested
+        if surplus > 0:
+            self._store_local(key, surplus)
+        return True, 0.0
+
+    def _take_local(self, key: str, requested: int):
+        if self.lease == 1:
+            return False
+
+        with self._local_lock:
+            entry = self._local_tokens.get(key)
+            if entry is None:
+                return False
+
+            tokens, expires_at = entry
+            if expires_at <= time.monotonic() or tokens < requested:
+                del self._local_tokens[key]
+                return False
+
+            if tokens == requested:
+                del self._local_tokens[key]
+            else:
+                self._local_tokens[key] = (tokens - requested, expires_at)
+            return True
+
+    def _store_local(self, key: str, tokens: int):
+        with self._local_lock:
+            self._local_tokens[key] = (tokens, time.monotonic() + self.lease_ttl)
+            self._local_tokens.move_to_end(key)
+            while len(self._local_tokens) > self.max_local_keys:
+                self._local_tokens.popitem(last = False)
+
+def allow_many_sync(checks: list[tuple[RedisTokenBucket, str]], requested: int = 1) -> list[tuple[bool, float]]:
+    results = [(True, 0.0)] * len(checks)
+    if os.environ.get("DJANGO_TEST") == "True":
+        return results
+
+    pending: list[tuple[int, RedisTokenBucket, str]] = []
+    for i, (bucket, key_id) in enumerate(checks):
+        key = f"{bucket.key_prefix}:{key_id}"
+        if not bucket._take_local(key, requested):
+            pending.append((i, bucket, key))
+
+    if len(pending) == 0:
+        return results
+
+    redis = get_sync_redis()
+    if redis is None:
+        return results
+
+    try:
+        with redis.pipeline(transaction = False) as pipe:
+            for _, bucket, key in pending:
+                pipe.evalsha(_TOKEN_BUCKET_SHA, 1, key, *bucket._script_args(requested))
+            responses = pipe.execute(raise_on_error = False)
+
+        missing = [j for j, res in enumerate(responses) if isinstance(res, NoScriptError)]
+        if len(missing) > 0:
+            with redis.pipeline(transaction = False) as pipe:
+                pipe.script_load(_TOKEN_BUCKET_LUA)
+                for j in missing:
+                    _, bucket, key = pending[j]
+                    pipe.evalsha(_TOKEN_BUCKET_SHA, 1, key, *bucket._script_args(requested))
+                _, *reloaded = pipe.execute()
+            for j, res in zip(missing, reloaded):
+                responses[j] = res
+
+        for res in responses:
+            if isinstance(res, Exception):
+                raise res
+    except RedisError as e:
+        redis.connection_pool.metrics.mark_unhealthy(e)
+        return results
+
+    for (i, bucket, key), res in zip(pending, responses):
+        results[i] = bucket._handle_result(key, requested, res)
+    return results
+
+_buckets: dict[tuple[str, int, float, int], RedisTokenBucket] = {}
+_buckets_lock = threading.Lock()
+
+def get_token_bucket(key_prefix: str, capacity: int, period: float, lease: int = 1) -> RedisTokenBucket:
+    key = (key_prefix, int(capacity), float(period), int(lease))
+    with _buckets_lock:
+        bucket = _buckets.get(key)
+        if bucket is None:
+            bucket = _buckets[key] = RedisTokenBucket(key_prefix, capacity, period, lease)
+    return bucket
\ No newline at end of file
@@ -0,0 +1,33 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from ...cleanup import collect_garbage, get_cleanup_settings
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = "Delete expired tokens, used tokens, old logged out sessions, expired guest users and deleted accounts in bounded batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type = int, help = "Rows deleted per transaction.")
+        parser.add_argument("--loop", action = "store_true", help = "Keep running and collect garbage every CLEANUP['INTERVAL'] seconds.")
+
+    def handle(self, *args, **options):
+        while True:
+            try:
+                counts = collect_garbage(options["batch_size"])
+                for name, count in counts.items():
+                    self.stdout.write(f"{name}: {count}")
+            except Exception:
+                if not options["loop"]:
+                    raise
+                logger.exception("Garbage collection failed")
+
+            if not options["loop"]:
+                return
+
+            close_old_connections()
+            time.sleep(get_cleanup_settings()["INTERVAL"])
\ No newline at end of file
@@ -1,6 +1,8 @@
 from django.core.handlers.asgi import ASGIRequest
 from django.utils.deprecation import MiddlewareMixin
-from user_agents import parse
+from django.utils.functional import lazy
+
+from .user_agent import parse_user_agent
 
 class JWTAuthCookieMiddleware(MiddlewareMixin):
     def process_request(self, request: ASGIRequest):
@@ -15,7 +17,6 @@ class RequestInfoMiddleware(MiddlewareMixin):
         ua_string = request.META.get("HTTP_USER_AGENT", "")
         request.user_agent_raw = ua_string
 
-        ua = parse(ua_string)
-        request.device = str(ua.device)
-        request.browser = ua.browser.family
-        request.os = ua.os.family
\ No newline at end of file
+        request.device = lazy(lambda: str(parse_user_agent(ua_string).device), str)()
+        request.browser = lazy(lambda: parse_user_agent(ua_string).browser.family, str)()
+        request.os = lazy(lambda: parse_user_agent(ua_string).os.family, str)()
\ No newline at end of file
@@ -0,0 +1,35 @@
+# Generated by Django 6.0 on 2026-10-19 09:39
+
+from django.db import migrations, models
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("chat", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="chat",
+            index=models.Index(fields=["user", "is_archived", "is_temporary", "-created_at"], name="chat_user_listing_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="chat",
+            index=models.Index(condition=models.Q(("pending_message__isnull", False)), fields=["user"], name="chat_user_pending_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="emailverificationtoken",
+            index=models.Index(condition=models.Q(("used_at__isnull", True)), fields=["user", "expires_at"], name="email_token_unused_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="message",
+            index=models.Index(fields=["chat", "created_at"], name="message_chat_created_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="preauthtoken",
+            index=models.Index(condition=models.Q(("used_at__isnull", True)), fields=["expires_at"], name="pre_auth_token_unused_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="usersession",
+            index=models.Index(fields=["user", "logout_at"], name="session_user_logout_idx"),
+        ),
+    ]
\ No newline at end of file
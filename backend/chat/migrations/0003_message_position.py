@@ -0,0 +1,47 @@
+# Generated by Django 6.0 on 2026-10-19 10:05
+
+from django.db import migrations, models
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+def assign_message_positions(apps, schema_editor):
+    Message = apps.get_model("chat", "Message")
+    messages = Message.objects.annotate(
+        row_number=Window(RowNumber(), partition_by=F("chat"), order_by=[F("created_at").asc(), F("id").asc()])
+    ).only("id")
+
+    batch = []
+    for message in messages.iterator(chunk_size=2000):
+        message.position = message.row_number - 1
+        batch.append(message)
+        if len(batch) == 2000:
+            Message.objects.bulk_update(batch, ["position"])
+            batch = []
+    Message.objects.bulk_update(batch, ["position"])
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("chat", "0002_add_query_indexes"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="message",
+            name="message_chat_created_idx",
+        ),
+        migrations.AddField(
+            model_name="message",
+            name="position",
+            field=models.PositiveIntegerField(editable=False, null=True),
+        ),
+        migrations.RunPython(assign_message_positions, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="message",
+            name="position",
+            field=models.PositiveIntegerField(editable=False),
+        ),
+        migrations.AddConstraint(
+            model_name="message",
+            constraint=models.UniqueConstraint(fields=("chat", "position"), name="message_chat_position_unique"),
+        ),
+    ]
\ No newline at end of file
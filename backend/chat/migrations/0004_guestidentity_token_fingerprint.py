@@ -0,0 +1,17 @@
+# Generated by Django 6.0 on 2026-10-19 10:40
+
+from django.db import migrations, models
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("chat", "0003_message_position"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="guestidentity",
+            name="token_fingerprint",
+            field=models.CharField(db_index=True, default="", max_length=64),
+            preserve_default=False,
+        ),
+    ]
\ No newline at end of file
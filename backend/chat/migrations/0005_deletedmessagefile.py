@@ -0,0 +1,21 @@
+# Generated by Django 6.0 on 2026-10-19 12:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("chat", "0004_guestidentity_token_fingerprint"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DeletedMessageFile",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("file_id", models.BigIntegerField()),
+                ("deleted_at", models.DateTimeField(auto_now_add=True)),
+                ("message", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="deleted_files", to="chat.message")),
+            ],
+        ),
+    ]
\ No newline at end of file
@@ -0,0 +1,16 @@
+# Generated by Django 6.0 on 2026-10-19 13:40
+
+from django.db import migrations, models
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("chat", "0006_accountdeletion"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="tokens_valid_after",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
\ No newline at end of file
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-19 14:10
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("chat", "0007_user_tokens_valid_after"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="usersession",
+            name="user",
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name="sessions", to=settings.AUTH_USER_MODEL),
+        ),
+    ]
\ No newline at end of file
@@ -3,28 +3,156 @@ import hmac
 import os
 import secrets
 import uuid
+from collections.abc import Hashable
 from datetime import timedelta
 
 import pyotp
+from asgiref.sync import sync_to_async
 from cryptography.fernet import Fernet
 from django.conf import settings
 from django.contrib.auth.hashers import check_password, make_password
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
-from django.db import models
+from django.core.exceptions import NON_FIELD_ERRORS, ValidationError
+from django.db import models, router, transaction
 from django.db.models.manager import BaseManager
 from django.utils import timezone
 
+from .versions import bump_chats_version, bump_messages_version, bump_user_version
+
 class ValidatingQuerySet(models.QuerySet):
-    def bulk_create(self, objs, **kwargs):
-        for obj in objs:
-            obj.full_clean()
+    def bulk_create(self, objs, validate = True, **kwargs):
+        objs = list(objs)
+        if validate:
+            self.validate(objs)
         return super().bulk_create(objs, **kwargs)
 
     def bulk_update(self, objs, fields, **kwargs):
-        for obj in objs:
-            obj.full_clean()
+        objs = list(objs)
+        fields = [fields] if isinstance(fields, str) else list(fields)
+        self.validate(objs, {self.model._meta.get_field(name).name for name in fields})
         return super().bulk_update(objs, fields, **kwargs)
 
+    def validate(self, objs: list[models.Model], names: set[str] | None = None):
+        if len(objs) == 0:
+            return
+
+        exclude = [f.name for f in self.model._meta.concrete_fields if isinstance(f, models.ForeignKey) or (names is not None and f.name not in names)]
+        for obj in objs:
+            obj.full_clean(exclude = exclude, validate_unique = False, validate_constraints = False)
+
+        self.validate_foreign_keys(objs, names)
+        self.validate_unique(objs, names)
+        self.validate_other_constraints(objs, names)
+
+    def validate_foreign_keys(self, objs: list[models.Model], names: set[str] | None = None):
+        for field in self.model._meta.concrete_fields:
+            if not isinstance(field, models.ForeignKey) or (names is not None and field.name not in names):
+                continue
+
+            values = set()
+            for obj in objs:
+                value = getattr(obj, field.attname)
+                if value is not None:
+                    values.add(field.target_field.to_python(value))
+                elif not field.blank:
+                    try:
+                        field.clean(value, obj)
+                    except ValidationError as e:
+                        raise ValidationError({field.name: e.error_list})
+
+            if len(values) == 0:
+                continue
+
+            remote_field_name = field.remote_field.field_name
+            existing = set(
+                field.remote_field.model._base_manager.using(self.db)
+                .filter(**{f"{remote_field_name}__in": values})
+                .complex_filter(field.get_limit_choices_to())
+                .values_list(remote_field_name, flat = True)
+            )
+
+            for obj in objs:
+                value = getattr(obj, field.attname)
+                if value is not None and field.target_field.to_python(value) not in existing:
+                    raise ValidationError({field.name: [ValidationError(
+                        field.error_messages["invalid"],
+                        code = "invalid",
+                        params = {
+                            "model": field.remote_field.model._meta.verbose_name,
+                            "pk": value,
+                            "field": remote_field_name,
+                            "value": value
+                        }
+                    )]})
+
+    def validate_unique(self, objs: list[models.Model], names: set[str] | None = None):
+        model_class = self.model
+
+        for unique_names in get_unique_field_names(model_class):
+            if names is not None and names.isdisjoint(unique_names):
+                continue
+
+            fields = [model_class._meta.get_field(name) for name in unique_names]
+            attnames = [f.attname for f in fields]
+
+            objs_by_key: dict[tuple, list[models.Model]] = {}
+            for obj in objs:
+                if len(fields) == 1 and fields[0].primary_key and not obj._state.adding:
+                    continue
+                key = tuple(getattr(obj, attname) for attname in attnames)
+                if any(value is None for value in key):
+                    continue
+                objs_by_key.setdefault(key, []).append(obj)
+
+            if len(objs_by_key) == 0:
+                continue
+
+            queryset = model_class._default_manager.using(self.db)
+            if len(attnames) == 1:
+                queryset = queryset.filter(**{f"{attnames[0]}__in": [key[0] for key in objs_by_key]})
+            else:
+                condition = models.Q()
+                for key in objs_by_key:
+                    condition |= models.Q(**dict(zip(attnames, key)))
+                queryset = queryset.filter(condition)
+
+            taken_by = {tuple(row[:-1]): row[-1] for row in queryset.values_list(*attnames, "pk")}
+
+            for obj in objs:
+                key = tuple(getattr(obj, attname) for attname in attnames)
+                if key not in objs_by_key:
+                    continue
+                if len(objs_by_key[key]) > 1 or (key in taken_by and (obj._state.adding or taken_by[key] != obj.pk)):
+                    error = obj.unique_error_message(model_class, unique_names)
+                    raise ValidationError({unique_names[0] if len(unique_names) == 1 else NON_FIELD_ERRORS: [error]})
+
+    def validate_other_constraints(self, objs: list[models.Model], names: set[str] | None = None):
+        constraints = [c for c in self.model._meta.constraints if not is_total_unique_constraint(c)]
+        if len(constraints) == 0:
+            return
+
+        exclude = None if names is None else get_unrelated_field_names(self.model, names)
+        for obj in objs:
+            for constraint in constraints:
+                constraint.validate(self.model, obj, exclude = exclude, using = self.db)
+
+def is_total_unique_constraint(constraint: models.BaseConstraint) -> bool:
+    return isinstance(constraint, models.UniqueConstraint) and len(constraint.fields) > 0 and constraint.condition is None
+
+def get_unique_field_names(model: type[models.Model]) -> list[tuple[str, ...]]:
+    return [
+        *[(f.name,) for f in model._meta.concrete_fields if f.unique],
+        *[tuple(names) for names in model._meta.unique_together],
+        *[tuple(c.fields) for c in model._meta.constraints if is_total_unique_constraint(c)]
+    ]
+
+def get_unrelated_field_names(model: type[models.Model], names: set[str]) -> list[str]:
+    related = set(names)
+    for unique_names in get_unique_field_names(model):
+        if not related.isdisjoint(unique_names):
+            related.update(unique_names)
+    return [f.name for f in model._meta.concrete_fields if f.name not in related]
+
 class ValidatingManager(models.Manager):
     def get_queryset(self):
         return ValidatingQuerySet(self.model, using = self._db)
@@ -43,9 +171,59 @@ class CleanOnSaveMixin(models.Model):
 
     def save(self, *args, validate = True, **kwargs):
         if validate:
-            self.full_clean()
+            update_fields = kwargs.get("update_fields")
+            if update_fields is None:
+                self.full_clean()
+                self.remember_validated_values([f.name for f in self._meta.concrete_fields])
+            else:
+                self.clean_update_fields(update_fields)
         return super().save(*args, **kwargs)
 
+    def clean_update_fields(self, update_fields):
+        validated_values: dict[str, object] = self.__dict__.setdefault("_validated_values", {})
+
+        names = {self._meta.get_field(name).name for name in update_fields}
+        changed = [
+            name for name in names
+            if name not in validated_values or validated_values[name] != self._meta.get_field(name).value_from_object(self)
+        ]
+        if len(changed) > 0:
+            self.full_clean(exclude = [f.name for f in self._meta.concrete_fields if f.name not in changed], validate_unique = False, validate_constraints = False)
+            self.remember_validated_values(changed)
+
+        exclude = get_unrelated_field_names(type(self), names)
+        self.validate_unique(exclude = exclude)
+        self.validate_constraints(exclude = exclude)
+
+    def remember_validated_values(self, names: list[str]):
+        validated_values: dict[str, object] = self.__dict__.setdefault("_validated_values", {})
+        for name in names:
+            value = self._meta.get_field(name).value_from_object(self)
+            if isinstance(value, Hashable):
+                validated_values[name] = value
+            else:
+                validated_values.pop(name, None)
+
+class VersionedMixin(CleanOnSaveMixin):
+    class Meta:
+        abstract = True
+
+    def save(self, *args, bump = True, **kwargs):
+        super().save(*args, **kwargs)
+        if bump:
+            transaction.on_commit(self.bump_version, kwargs.get("using") or self._state.db)
+
+    async def asave(self, *args, bump = True, **kwargs):
+        return await sync_to_async(self.save)(*args, bump = bump, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        transaction.on_commit(self.bump_version, kwargs.get("using") or self._state.db)
+        return result
+
+    def bump_version(self):
+        bump_user_version(self.user_id)
+
 class UserManager(BaseUserManager):
     def create_user(
         self,
@@ -96,6 +274,7 @@ class User(CleanOnSaveMixin, AbstractBaseUser, PermissionsMixin):
     is_staff = models.BooleanField(default = False)
 
     created_with_ip_address = models.GenericIPAddressField(blank = True, null = True)
+    tokens_valid_after = models.DateTimeField(blank = True, null = True)
     created_at = models.DateTimeField(auto_now_add = True)
 
     objects: UserManager = UserManager()
@@ -112,10 +291,14 @@ class User(CleanOnSaveMixin, AbstractBaseUser, PermissionsMixin):
     password_reset_tokens: BaseManager[EmailVerificationToken]
     chats: BaseManager[Chat]
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        transaction.on_commit(lambda: bump_user_version(self.pk), kwargs.get("using") or self._state.db)
+
     def __str__(self):
         return f"User with email {self.email} created at {self.created_at}."
 
-class UserPreferences(CleanOnSaveMixin):
+class UserPreferences(VersionedMixin):
     user = models.OneToOneField(User, models.CASCADE, related_name = "preferences")
 
     has_sidebar_open = models.BooleanField(default = True)
@@ -139,7 +322,7 @@ class UserPreferences(CleanOnSaveMixin):
     def __str__(self):
         return f"Preferences for {self.user.email}."
 
-class UserMFA(CleanOnSaveMixin):
+class UserMFA(VersionedMixin):
     user = models.OneToOneField(User, models.CASCADE, related_name = "mfa")
 
     is_enabled = models.BooleanField(default = False)
@@ -218,12 +401,13 @@ class UserMFA(CleanOnSaveMixin):
     def __str__(self):
         return f"MFA for {self.user.email}."
 
-class UserSession(CleanOnSaveMixin):
+class UserSession(VersionedMixin):
     class Meta:
         verbose_name = "User Session"
         verbose_name_plural = "User Sessions"
+        indexes = [models.Index(fields = ["user", "logout_at"], name = "session_user_logout_idx")]
 
-    user = models.ForeignKey(User, models.CASCADE, related_name = "sessions")
+    user = models.ForeignKey(User, models.CASCADE, related_name = "sessions", db_index = False)
     uuid = models.UUIDField(primary_key = True, default = uuid.uuid4, editable = False)
 
     login_at = models.DateTimeField(auto_now_add = True)
@@ -241,6 +425,9 @@ class UserSession(CleanOnSaveMixin):
         return f"Session created at {self.login_at} for {self.user.email}."
 
 class EmailVerificationToken(CleanOnSaveMixin):
+    class Meta:
+        indexes = [models.Index(fields = ["user", "expires_at"], condition = models.Q(used_at__isnull = True), name = "email_token_unused_idx")]
+
     user = models.ForeignKey(User, models.CASCADE, related_name = "email_verification_tokens")
 
     token_hash = models.CharField(max_length = 128)
@@ -253,6 +440,9 @@ class EmailVerificationToken(CleanOnSaveMixin):
         return f"Email verification token created at {self.created_at} owned by {self.user.email}."
 
 class PreAuthToken(CleanOnSaveMixin):
+    class Meta:
+        indexes = [models.Index(fields = ["expires_at"], condition = models.Q(used_at__isnull = True), name = "pre_auth_token_unused_idx")]
+
     user = models.ForeignKey(User, models.CASCADE, related_name = "pre_auth_tokens")
 
     token_hash = models.CharField(max_length = 128)
@@ -280,7 +470,13 @@ class PasswordResetToken(CleanOnSaveMixin):
     def __str__(self):
         return f"Password reset token created at {self.created_at} owned by {self.user.email}."
 
-class Chat(CleanOnSaveMixin):
+class Chat(VersionedMixin):
+    class Meta:
+        indexes = [
+            models.Index(fields = ["user", "is_archived", "is_temporary", "-created_at"], name = "chat_user_listing_idx"),
+            models.Index(fields = ["user"], condition = models.Q(pending_message__isnull = False), name = "chat_user_pending_idx")
+        ]
+
     user = models.ForeignKey(User, models.CASCADE, related_name = "chats")
 
     uuid = models.UUIDField(primary_key = True, default = uuid.uuid4, editable = False)
@@ -297,11 +493,81 @@ class Chat(CleanOnSaveMixin):
         message: Message | None = self.messages.order_by("-last_modified_at").first()
         return message.last_modified_at if message else self.created_at
 
+    async def alast_modified_at(self):
+        message: Message | None = await self.messages.order_by("-last_modified_at").afirst()
+        return message.last_modified_at if message else self.created_at
+
+    def add_message(self, text: str, is_from_user: bool, model: str = "", files = ()):
+        message = self.messages.create(text = text, is_from_user = is_from_user, model = model)
+        self.update_message_files(message, files, [])
+        return message
+
+    def get_messages_at(self, positions: list[int]) -> dict[int, Message]:
+        return {m.position: m for m in self.messages.filter(position__in = positions)}
+
+    def get_message_files(self, message: Message) -> list[MessageFile]:
+        return list(message.files.all())
+
+    def update_message_files(self, message: Message, added_files, removed_files: list[MessageFile]):
+        for removed_file in removed_files:
+            removed_file.delete()
+
+        new_files = []
+        for file in added_files:
+            file.seek(0)
+            new_files.append(MessageFile(message = message, name = file.name, content = file.read(), content_type = file.content_type))
+        message.files.bulk_create(new_files)
+
+    def bump_version(self):
+        bump_chats_version(self.user_id)
+
     def __str__(self):
         return f"Chat titled {self.title} created at {self.created_at} owned by {self.user.email}."
 
-class Message(CleanOnSaveMixin):
+class MessageQuerySet(ValidatingQuerySet):
+    def bulk_create(self, objs, **kwargs):
+        objs = list(objs)
+        with transaction.atomic(using = self.db):
+            self.assign_positions(objs)
+            created = super().bulk_create(objs, **kwargs)
+        for chat_id in {m.chat_id for m in objs}:
+            transaction.on_commit(lambda chat_id = chat_id: bump_messages_version(chat_id), self.db)
+        return created
+
+    def window(self, limit: int, before: int | None = None) -> list[Message]:
+        messages = self if before is None else self.filter(position__lt = before)
+        return list(messages.order_by("-position")[:limit])[::-1]
+
+    def assign_positions(self, messages: list[Message]):
+        unpositioned = [m for m in messages if m.position is None]
+        if len(unpositioned) == 0:
+            return
+
+        chat_ids = {m.chat_id for m in unpositioned}
+        list(Chat._base_manager.using(self.db).select_for_update().filter(pk__in = chat_ids).order_by("pk").values_list("pk", flat = True))
+
+        next_positions: dict[uuid.UUID, int] = dict(
+            self.model._base_manager.using(self.db)
+            .filter(chat_id__in = chat_ids)
+            .values("chat_id")
+            .annotate(next_position = models.Max("position") + 1)
+            .values_list("chat_id", "next_position")
+        )
+
+        for message in unpositioned:
+            message.position = next_positions.get(message.chat_id, 0)
+            next_positions[message.chat_id] = message.position + 1
+
+class MessageManager(ValidatingManager):
+    def get_queryset(self):
+        return MessageQuerySet(self.model, using = self._db)
+
+class Message(VersionedMixin):
+    class Meta:
+        constraints = [models.UniqueConstraint(fields = ["chat", "position"], name = "message_chat_position_unique")]
+
     chat = models.ForeignKey(Chat, models.CASCADE, related_name = "messages")
+    position = models.PositiveIntegerField(editable = False)
 
     text = models.TextField(blank = True)
     is_from_user = models.BooleanField()
@@ -310,16 +576,29 @@ class Message(CleanOnSaveMixin):
     last_modified_at = models.DateTimeField(auto_now = True)
     created_at = models.DateTimeField(auto_now_add = True)
 
+    objects: MessageManager = MessageManager()
+
     files: BaseManager[MessageFile]
 
     @staticmethod
     def available_models() -> list[str]:
         return [c[0] for c in Message._meta.get_field("model").choices]
 
+    def save(self, *args, **kwargs):
+        if self.position is None:
+            using = kwargs.get("using") or router.db_for_write(Message, instance = self)
+            with transaction.atomic(using = using):
+                Message.objects.db_manager(using).get_queryset().assign_positions([self])
+                return super().save(*args, **kwargs)
+        return super().save(*args, **kwargs)
+
+    def bump_version(self):
+        bump_messages_version(self.chat_id)
+
     def __str__(self):
         return f"Message created at {self.created_at} in {self.chat.title} owned by {self.chat.user.email}."
 
-class MessageFile(CleanOnSaveMixin):
+class MessageFile(VersionedMixin):
     message = models.ForeignKey(Message, models.CASCADE, related_name = "files")
 
     name = models.CharField(max_length = 200)
@@ -328,6 +607,18 @@ class MessageFile(CleanOnSaveMixin):
 
     created_at = models.DateTimeField(auto_now_add = True)
 
+    def delete(self, *args, **kwargs):
+        deleted_message_file = DeletedMessageFile(message_id = self.message_id, file_id = self.pk)
+        result = super().delete(*args, **kwargs)
+        deleted_message_file.save()
+        return result
+
+    def bump_version(self):
+        if MessageFile.message.is_cached(self):
+            bump_messages_version(self.message.chat_id)
+        else:
+            bump_messages_version(Message.objects.filter(pk = self.message_id).values_list("chat_id", flat = True).first())
+
     @staticmethod
     def max_content_size() -> int:
         return MessageFile._meta.get_field("content").max_length
@@ -339,11 +630,20 @@ class MessageFile(CleanOnSaveMixin):
     def __str__(self):
         return f"File of message named {self.name} created at {self.created_at} in {self.message} owned by {self.message.chat.user.email}."
 
+class DeletedMessageFile(CleanOnSaveMixin):
+    message = models.ForeignKey(Message, models.CASCADE, related_name = "deleted_files")
+    file_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add = True)
+
+    def __str__(self):
+        return f"Deleted file {self.file_id} of message {self.message_id} at {self.deleted_at}."
+
 class GuestIdentity(CleanOnSaveMixin):
     user = models.OneToOneField(User, models.CASCADE, related_name = "guest_identity")
 
     ip_address = models.GenericIPAddressField(blank = True, null = True)
     user_agent_hash = models.CharField(max_length = 64, blank = True)
+    token_fingerprint = models.CharField(max_length = 64, db_index = True)
 
     expires_at = models.DateTimeField()
     last_used_at = models.DateTimeField(auto_now = True)
@@ -351,22 +651,60 @@ class GuestIdentity(CleanOnSaveMixin):
 
     @staticmethod
     def create(ip_address: str, user_agent_raw: str):
-        email = f"guest_{uuid.uuid4()}@example.com"
         token = secrets.token_urlsafe(32)
-        user: User = User.objects.create_user(email, token, True, True, True)
 
-        identity = GuestIdentity.objects.create(
+        user = User(email = f"guest_{uuid.uuid4()}@example.com", has_verified_email = True, is_active = True, is_guest = True)
+        user.set_unusable_password()
+
+        identity = GuestIdentity(
             user = user,
-            expires_at = timezone.now() + timedelta(days = 30),
             ip_address = ip_address,
-            user_agent_hash = hash_user_agent(user_agent_raw)
+            user_agent_hash = hash_user_agent(user_agent_raw),
+            token_fingerprint = derive_token_fingerprint(token),
+            expires_at = timezone.now() + timedelta(days = 30)
         )
 
+        with transaction.atomic():
+            User.objects.bulk_create([user])
+            UserPreferences.objects.bulk_create([UserPreferences(user = user)], validate = False)
+            UserMFA.objects.bulk_create([UserMFA(user = user)], validate = False)
+            GuestIdentity.objects.bulk_create([identity], validate = False)
+
         return identity, token
 
+    @staticmethod
+    def get_by_token(token: str):
+        return GuestIdentity.objects.select_related("user").filter(
+            token_fingerprint = derive_token_fingerprint(token),
+            expires_at__gt = timezone.now()
+        ).first()
+
     def __str__(self):
         return f"Guest identity with email {self.user.email} to expire at {self.expires_at} and created at {self.created_at}"
 
+class AccountDeletion(CleanOnSaveMixin):
+    user = models.OneToOneField(User, models.SET_NULL, related_name = "deletion", blank = True, null = True)
+
+    deleted_chats = models.PositiveIntegerField(default = 0)
+
+    requested_at = models.DateTimeField(auto_now_add = True)
+    completed_at = models.DateTimeField(blank = True, null = True)
+
+    @staticmethod
+    def request(user: User):
+        with transaction.atomic():
+            user.email = f"deleted_{uuid.uuid4()}@example.com"
+            user.is_active = False
+            user.set_unusable_password()
+            user.save()
+
+            user.sessions.filter(logout_at__isnull = True).update(logout_at = timezone.now())
+            GuestIdentity.objects.filter(user = user).delete()
+            return AccountDeletion.objects.create(user = user)
+
+    def __str__(self):
+        return f"Account deletion requested at {self.requested_at} with {self.deleted_chats} chats deleted."
+
 def hash_user_agent(user_agent: str) -> str:
     return hashlib.sha256(user_agent.encode()).hexdigest()
 
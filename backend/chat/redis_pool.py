@@ -0,0 +1,200 @@
+import asyncio
+import logging
+import threading
+import time
+import weakref
+
+import redis as sync_redis
+from django.conf import settings
+from redis import asyncio as aioredis
+
+logger = logging.getLogger(__name__)
+
+def get_redis_url() -> str:
+    return settings.REDIS_URL
+
+def get_pool_settings() -> dict:
+    return settings.REDIS_POOL
+
+class PoolMetrics:
+    def __init__(self, name: str, max_connections: int):
+        self.name = name
+        self.max_connections = max_connections
+        self.lock = threading.Lock()
+
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.exhausted = 0
+
+        self.checkouts = 0
+        self.hold_total = 0.0
+        self.hold_max = 0.0
+
+        self.healthy = True
+        self.failures = 0
+        self.last_health_check = 0.0
+
+    def acquired(self):
+        with self.lock:
+            self.in_use += 1
+            self.peak_in_use = max(self.peak_in_use, self.in_use)
+
+    def released(self):
+        with self.lock:
+            self.in_use = max(0, self.in_use - 1)
+
+    def exhaust(self):
+        with self.lock:
+            self.exhausted += 1
+
+    def observe(self, seconds: float):
+        with self.lock:
+            self.checkouts += 1
+            self.hold_total += seconds
+            self.hold_max = max(self.hold_max, seconds)
+
+    def mark_healthy(self):
+        with self.lock:
+            was_healthy = self.healthy
+            self.healthy = True
+        if not was_healthy:
+            logger.info("Redis pool '%s' is available again.", self.name)
+
+    def mark_unhealthy(self, error: Exception):
+        with self.lock:
+            was_healthy = self.healthy
+            self.healthy = False
+            if was_healthy:
+                self.failures += 1
+        if was_healthy:
+            logger.warning("Redis pool '%s' not available (%s). Failing open until the next health check.", self.name, error)
+
+    def as_dict(self):
+        with self.lock:
+            return {
+                "name": self.name,
+                "healthy": self.healthy,
+                "max_connections": self.max_connections,
+                "in_use": self.in_use,
+                "peak_in_use": self.peak_in_use,
+                "saturation": self.in_use / self.max_connections if self.max_connections else 0.0,
+                "exhausted": self.exhausted,
+                "failures": self.failures,
+                "checkouts": self.checkouts,
+                "hold_avg_ms": self.hold_total / self.checkouts * 1000 if self.checkouts else 0.0,
+                "hold_max_ms": self.hold_max * 1000
+            }
+
+_metrics: dict[str, PoolMetrics] = {}
+_metrics_lock = threading.Lock()
+
+def get_pool_metrics(name: str, max_connections: int) -> PoolMetrics:
+    with _metrics_lock:
+        metrics = _metrics.get(name)
+        if metrics is None:
+            metrics = _metrics[name] = PoolMetrics(name, max_connections)
+    return metrics
+
+def export_metrics() -> list[dict]:
+    with _metrics_lock:
+        pools = list(_metrics.values())
+    return [p.as_dict() for p in pools]
+
+class InstrumentedConnectionPool(sync_redis.ConnectionPool):
+    def __init__(self, *args, metrics_name: str = "cache", **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = get_pool_metrics(metrics_name, self.max_connections)
+
+    def get_connection(self, *args, **kwargs):
+        try:
+            connection = super().get_connection(*args, **kwargs)
+        except sync_redis.ConnectionError as e:
+            if "Too many connections" in str(e):
+                self.metrics.exhaust()
+            raise
+        self.metrics.acquired()
+        connection.acquired_at = time.monotonic()
+        return connection
+
+    def release(self, connection):
+        self.metrics.released()
+        self.metrics.observe(time.monotonic() - getattr(connection, "acquired_at", time.monotonic()))
+        return super().release(connection)
+
+class AsyncInstrumentedConnectionPool(aioredis.ConnectionPool):
+    def __init__(self, *args, metrics_name: str = "consumer", **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = get_pool_metrics(metrics_name, self.max_connections)
+
+    async def get_connection(self, *args, **kwargs):
+        try:
+            connection = await super().get_connection(*args, **kwargs)
+        except aioredis.ConnectionError as e:
+            if "Too many connections" in str(e):
+                self.metrics.exhaust()
+            raise
+        self.metrics.acquired()
+        connection.acquired_at = time.monotonic()
+        return connection
+
+    async def release(self, connection):
+        self.metrics.released()
+        self.metrics.observe(time.monotonic() - getattr(connection, "acquired_at", time.monotonic()))
+        return await super().release(connection)
+
+def get_pool_kwargs() -> dict:
+    pool_settings = get_pool_settings()
+    return {
+        "max_connections": pool_settings["MAX_CONNECTIONS"],
+        "health_check_interval": pool_settings["HEALTH_CHECK_INTERVAL"],
+        "socket_timeout": pool_settings["SOCKET_TIMEOUT"],
+        "socket_connect_timeout": pool_settings["SOCKET_TIMEOUT"],
+        "decode_responses": True
+    }
+
+_async_clients: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, aioredis.Redis] = weakref.WeakKeyDictionary()
+
+async def get_redis() -> aioredis.Redis | None:
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        pool = AsyncInstrumentedConnectionPool.from_url(get_redis_url(), metrics_name = "consumer", **get_pool_kwargs())
+        client = _async_clients[loop] = aioredis.Redis(connection_pool = pool)
+
+    metrics: PoolMetrics = client.connection_pool.metrics
+    now = time.monotonic()
+    if now - metrics.last_health_check >= get_pool_settings()["HEALTH_CHECK_INTERVAL"]:
+        metrics.last_health_check = now
+        try:
+            await client.ping()
+            metrics.mark_healthy()
+        except Exception as e:
+            metrics.mark_unhealthy(e)
+
+    return client if metrics.healthy else None
+
+_sync_client: sync_redis.Redis | None = None
+_sync_client_lock = threading.Lock()
+
+def get_sync_redis() -> sync_redis.Redis | None:
+    global _sync_client
+    with _sync_client_lock:
+        if _sync_client is None:
+            pool = InstrumentedConnectionPool.from_url(get_redis_url(), metrics_name = "throttle", **get_pool_kwargs())
+            _sync_client = sync_redis.Redis(connection_pool = pool)
+        client = _sync_client
+
+        metrics: PoolMetrics = client.connection_pool.metrics
+        now = time.monotonic()
+        check_health = now - metrics.last_health_check >= get_pool_settings()["HEALTH_CHECK_INTERVAL"]
+        if check_health:
+            metrics.last_health_check = now
+
+    if check_health:
+        try:
+            client.ping()
+            metrics.mark_healthy()
+        except Exception as e:
+            metrics.mark_unhealthy(e)
+
+    return client if metrics.healthy else None
\ No newline at end of file
@@ -1,3 +1,5 @@
+from django.db.models import Count, OuterRef, QuerySet, Subquery
+from django.db.models.functions import Coalesce
 from drf_spectacular.utils import extend_schema_field, extend_schema_serializer, OpenApiExample
 from rest_framework import serializers
 
@@ -19,15 +21,21 @@ class ChatSerializer(serializers.ModelSerializer):
 
     @extend_schema_field(serializers.IntegerField(allow_null=True))
     def get_pending_message_id(self, chat: Chat):
-        return chat.pending_message.id if chat.pending_message is not None else None
+        return chat.pending_message_id
 
     @extend_schema_field(serializers.IntegerField())
     def get_index(self, chat: Chat):
+        if hasattr(chat, "index"):
+            return chat.index
         for i, c in enumerate(chat.user.chats.order_by("-created_at")):
             if c == chat:
                 return i
         return 0
 
+def with_index(chats: QuerySet[Chat]) -> QuerySet[Chat]:
+    newer_chats = Chat.objects.filter(user = OuterRef("user"), created_at__gt = OuterRef("created_at")).order_by().values("user")
+    return chats.annotate(index = Coalesce(Subquery(newer_chats.annotate(count = Count("pk")).values("count")), 0))
+
 @extend_schema_serializer(
     examples=[
         OpenApiExample("Chat UUID Example", value={"chat_uuid": "123e4567-e89b-12d3-a456-426614174000"})
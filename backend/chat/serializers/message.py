@@ -22,6 +22,8 @@ class MessageFileSerializer(serializers.ModelSerializer):
 
     @extend_schema_field(serializers.IntegerField())
     def get_content_size(self, message_file: MessageFile):
+        if hasattr(message_file, "content_size"):
+            return message_file.content_size
         return len(message_file.content)
 
 class MessageSerializer(serializers.ModelSerializer):
@@ -37,6 +39,31 @@ class MessageSerializer(serializers.ModelSerializer):
             "model": {"help_text": "AI model used for the response."},
         }
 
+class MessageChangeSerializer(MessageSerializer):
+    index = serializers.IntegerField(source = "position", read_only = True, help_text="Index of the message in the chat.")
+
+    class Meta(MessageSerializer.Meta):
+        fields = ["index", *MessageSerializer.Meta.fields]
+
+class MessageChangesSerializer(serializers.Serializer):
+    messages = MessageChangeSerializer(many = True, help_text="Messages created or modified since the cursor.")
+    removed_file_ids = serializers.ListField(child = serializers.IntegerField(), help_text="IDs of files removed since the cursor.")
+    message_count = serializers.IntegerField(help_text="Total number of messages in the chat.")
+    cursor = serializers.DateTimeField(allow_null = True, help_text="Cursor to pass as `since` on the next call.")
+
+class MessageWindowSerializer(serializers.Serializer):
+    messages = MessageChangeSerializer(many = True, help_text="Messages of the window in chronological order.")
+    has_more = serializers.BooleanField(help_text="True if there are older messages before the window.")
+
+class GetMessageWindowSerializer(serializers.Serializer):
+    chat_uuid = serializers.UUIDField(help_text="UUID of the chat.")
+    limit = serializers.IntegerField(min_value = 1, max_value = 200, default = 50, help_text="Maximum number of messages to return.")
+    before = serializers.IntegerField(min_value = 0, required = False, help_text="Only return messages with an index lower than this one.")
+
+class GetMessageChangesSerializer(serializers.Serializer):
+    chat_uuid = serializers.UUIDField(help_text="UUID of the chat.")
+    since = serializers.DateTimeField(required = False, help_text="Cursor returned by a previous call.")
+
 class GetMessageFileContentSerializer(serializers.Serializer):
     chat_uuid = serializers.UUIDField(help_text="UUID of the chat.")
     message_file_id = serializers.IntegerField(min_value = 1, help_text="ID of the file to retrieve.")
@@ -0,0 +1,76 @@
+import secrets
+
+from redis.exceptions import RedisError
+
+from .redis_pool import get_redis
+
+MAX_CHUNKS = 4000
+TTL = 60 * 60
+
+def get_pointer_key(chat_uuid: str):
+    return f"chat_stream:{chat_uuid}"
+
+def get_stream_key(chat_uuid: str, stream_id: str):
+    return f"chat_stream:{chat_uuid}:{stream_id}"
+
+async def start_stream(chat_uuid: str) -> str:
+    stream_id = secrets.token_hex(4)
+
+    redis = await get_redis()
+    if redis is None:
+        return stream_id
+
+    try:
+        await redis.set(get_pointer_key(chat_uuid), stream_id, ex = TTL)
+    except RedisError as e:
+        redis.connection_pool.metrics.mark_unhealthy(e)
+    return stream_id
+
+async def append_chunk(chat_uuid: str, stream_id: str, seq: int, message_index: int, token: str = "", end: bool = False):
+    redis = await get_redis()
+    if redis is None:
+        return
+
+    key = get_stream_key(chat_uuid, stream_id)
+    fields = {"message_index": message_index, "token": token, "end": int(end)}
+    try:
+        if seq > 1 and not end:
+            await redis.xadd(key, fields, id = f"{seq}-0", maxlen = MAX_CHUNKS, approximate = True)
+            return
+
+        async with redis.pipeline(transaction = False) as pipe:
+            pipe.xadd(key, fields, id = f"{seq}-0", maxlen = MAX_CHUNKS, approximate = True)
+            pipe.expire(key, TTL)
+            pipe.expire(get_pointer_key(chat_uuid), TTL)
+            await pipe.execute()
+    except RedisError as e:
+        redis.connection_pool.metrics.mark_unhealthy(e)
+
+async def read_chunks(chat_uuid: str, stream_id: str | None, last_seq: int):
+    redis = await get_redis()
+    if redis is None:
+        return None
+
+    try:
+        current_stream_id = await redis.get(get_pointer_key(chat_uuid))
+        if current_stream_id is None:
+            return None
+
+        resumed = current_stream_id == stream_id
+        entries = await redis.xrange(get_stream_key(chat_uuid, current_stream_id), f"{last_seq + 1 if resumed else 1}-0", "+")
+    except RedisError as e:
+        redis.connection_pool.metrics.mark_unhealthy(e)
+        return None
+
+    chunks = [{
+        "seq": int(entry_id.split("-")[0]),
+        "message_index": int(fields["message_index"]),
+        "token": fields["token"],
+        "end": fields["end"] == "1"
+    } for entry_id, fields in entries]
+
+    expected_first_seq = last_seq + 1 if resumed else 1
+    if len(chunks) > 0 and chunks[0]["seq"] != expected_first_seq:
+        return None
+
+    return current_stream_id, resumed, chunks
\ No newline at end of file
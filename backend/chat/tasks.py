@@ -9,9 +9,15 @@ import ollama
 from channels.db import database_sync_to_async
 from channels.layers import get_channel_layer
 
+from .events import asend_user_event, send_user_event, send_user_events
 from .models import Chat, Message, User
+from .stream_log import append_chunk, start_stream
+from .temporary_chats import TemporaryChat, TemporaryMessage, adiscard_temporary_chat, aget_temporary_chat, clear_temporary_pending_message, get_user_temporary_chats
+from .versions import bump_chats_version, bump_messages_version
 
-def generate_pending_message_in_chat(chat: Chat, should_generate_title: bool = False, should_randomize: bool = False):
+CONTEXT_WINDOW = 200
+
+def generate_pending_message_in_chat(chat: Chat | TemporaryChat, should_generate_title: bool = False, should_randomize: bool = False):
     if chat.pending_message is not None:
         future = asyncio.run_coroutine_threadsafe(generate_message(chat, should_generate_title, should_randomize), event_loop)
         future.add_done_callback(lambda f: task_done_callback(f, str(chat.uuid)))
@@ -28,9 +34,12 @@ def task_done_callback(future: asyncio.Future[None], chat_uuid: str):
     if exception:
         logger.exception("Task failed", exc_info = exception)
 
-async def generate_message(chat: Chat, should_generate_title: bool, should_randomize: bool):
-    messages: list[dict[str, str]] = await get_messages(chat.pending_message)
-    message_index = len(messages) - 1
+async def generate_message(chat: Chat | TemporaryChat, should_generate_title: bool, should_randomize: bool):
+    if isinstance(chat, TemporaryChat):
+        messages: list[dict[str, str]] = await get_temporary_messages(chat)
+    else:
+        messages: list[dict[str, str]] = await get_messages(chat.pending_message)
+    message_index = chat.pending_message.position
 
     model, options = get_ollama_model_and_options(chat.pending_message.model)
 
@@ -40,37 +49,50 @@ async def generate_message(chat: Chat, should_generate_title: bool, should_rando
     elif should_randomize:
         options["seed"] = random.randint(-(10 ** 10), 10 ** 10)
 
+    stream_id = await start_stream(str(chat.uuid))
+    seq = 0
+
+    await asend_user_event(chat.user_id, "chat_pending", chat_uuid = str(chat.uuid), pending_message_id = chat.pending_message.pk)
+
     try:
-        async for part in await ollama_client.chat(model, messages, stream = True, options = options):
-            token = part.message.content
-
-            if type(token) == str:
-                chat.pending_message.text += token
-                if not await safe_save_message_text(chat.pending_message):
-                    return
-                await channel_layer.group_send(f"chat_{str(chat.uuid)}", {"type": "send_token", "token": token, "message_index": message_index})
-
-            if str(chat.uuid) in opened_chats:
-                opened_chats.discard(str(chat.uuid))
-                await channel_layer.group_send(f"chat_{str(chat.uuid)}", {"type": "send_message", "message": chat.pending_message.text, "message_index": message_index})
-    except asyncio.CancelledError:
-        if should_generate_title:
-            await generate_title(chat)
-        chat.pending_message = None
-        if not await safe_save_chat_pending_message(chat):
+        try:
+            async for part in await ollama_client.chat(model, messages, stream = True, options = options):
+                token = part.message.content
+
+                if type(token) == str:
+                    chat.pending_message.text += token
+                    if not await save_pending_message_text(chat):
+                        return
+                    seq += 1
+                    await append_chunk(str(chat.uuid), stream_id, seq, message_index, token)
+                    await channel_layer.group_send(
+                        f"chat_{str(chat.uuid)}",
+                        {"type": "send_token", "chat_uuid": str(chat.uuid), "token": token, "message_index": message_index, "seq": seq, "stream_id": stream_id}
+                    )
+
+                if str(chat.uuid) in opened_chats:
+                    opened_chats.discard(str(chat.uuid))
+                    await channel_layer.group_send(f"chat_{str(chat.uuid)}", {"type": "send_message", "chat_uuid": str(chat.uuid), "message": chat.pending_message.text, "message_index": message_index})
+        except asyncio.CancelledError:
+            if should_generate_title:
+                await generate_title(chat)
+            chat.pending_message = None
+            await save_chat_pending_message(chat)
             return
-        return
 
-    await channel_layer.group_send(f"chat_{str(chat.uuid)}", {"type": "send_message", "message": chat.pending_message.text, "message_index": message_index})
+        await channel_layer.group_send(f"chat_{str(chat.uuid)}", {"type": "send_message", "chat_uuid": str(chat.uuid), "message": chat.pending_message.text, "message_index": message_index})
 
-    if should_generate_title:
-        await generate_title(chat)
+        if should_generate_title:
+            await generate_title(chat)
 
-    chat.pending_message = None
-    if not await safe_save_chat_pending_message(chat):
-        return
+        chat.pending_message = None
+        if not await save_chat_pending_message(chat):
+            return
 
-    await channel_layer.group_send(f"chat_{str(chat.uuid)}", {"type": "send_end"})
+        await asend_user_event(chat.user_id, "chat_pending", chat_uuid = str(chat.uuid), pending_message_id = None)
+    finally:
+        await append_chunk(str(chat.uuid), stream_id, seq + 1, message_index, end = True)
+        await channel_layer.group_send(f"chat_{str(chat.uuid)}", {"type": "send_end", "chat_uuid": str(chat.uuid)})
 
 async def generate_title(chat: Chat):
     model, options = get_ollama_model_and_options(chat.pending_message.model)
@@ -101,26 +123,35 @@ async def generate_title(chat: Chat):
         if title != "":
             chat.title = title
             await safe_save_chat_title(chat)
-            await channel_layer.group_send(f"chat_{str(chat.uuid)}", {"type": "send_title", "title": chat.title})
+            await channel_layer.group_send(f"chat_{str(chat.uuid)}", {"type": "send_title", "chat_uuid": str(chat.uuid), "title": chat.title})
+            await asend_user_event(chat.user_id, "chat_renamed", chat_uuid = str(chat.uuid), title = chat.title)
 
 @database_sync_to_async
-def get_messages(up_to_message: Message) -> list[dict[str, str]]:
+def get_messages(up_to_message: Message, window: int = CONTEXT_WINDOW) -> list[dict[str, str]]:
     messages = [{"role": "system", "content": get_system_prompt(up_to_message.chat.user)}]
 
-    for message in up_to_message.chat.messages.order_by("created_at"):
-        if message.pk == up_to_message.pk:
-            break
+    for message in up_to_message.chat.messages.prefetch_related("files").window(window, up_to_message.position):
         messages.append(get_message_dict(message))
 
     return messages
 
-def get_message_dict(message: Message) -> dict[str, str]:
+@database_sync_to_async
+def get_temporary_messages(chat: TemporaryChat, window: int = CONTEXT_WINDOW) -> list[dict[str, str]]:
+    messages = [{"role": "system", "content": get_system_prompt(User.objects.select_related("preferences").get(pk = chat.user_id))}]
+
+    for message in chat.messages[max(chat.pending_message.position - window, 0):chat.pending_message.position]:
+        messages.append(get_message_dict(message))
+
+    return messages
+
+def get_message_dict(message: Message | TemporaryMessage) -> dict[str, str]:
     if message.is_from_user:
-        if message.files.count() == 0:
+        files = message.files if isinstance(message, TemporaryMessage) else list(message.files.all())
+        if len(files) == 0:
             return {"role": "user", "content": message.text}
 
         images = []
-        for file in message.files.all():
+        for file in files:
             if "image" in file.content_type:
                 os.makedirs("chat_temp", exist_ok = True)
                 with open(f"chat_temp/{file.pk}_{file.name}", "wb+") as writer:
@@ -128,7 +159,7 @@ def get_message_dict(message: Message) -> dict[str, str]:
                 images.append(f"chat_temp/{file.pk}_{file.name}")
 
         file_contents = []
-        for file in message.files.all():
+        for file in files:
             if "image" not in file.content_type:
                 try:
                     file_contents.append(f"=== File: {file.name} ===\n{file.content.decode()}")
@@ -173,35 +204,71 @@ def cancel_chat_future(chat_uuid: str):
         chat_futures[str(chat_uuid)].cancel()
 
 def stop_pending_chat(chat: Chat):
+    was_pending = chat.pending_message_id is not None
     cancel_chat_future(chat.uuid)
     chat.pending_message = None
     chat.save(update_fields = ["pending_message"])
+    if was_pending:
+        send_user_event(chat.user_id, "chat_pending", chat_uuid = str(chat.uuid), pending_message_id = None)
 
 async def astop_pending_chat(chat: Chat):
+    was_pending = chat.pending_message_id is not None
     cancel_chat_future(chat.uuid)
     chat.pending_message = None
     await chat.asave(update_fields = ["pending_message"])
+    if was_pending:
+        await asend_user_event(chat.user_id, "chat_pending", chat_uuid = str(chat.uuid), pending_message_id = None)
+
+async def adelete_temporary_chat(user: User, chat_uuid: str):
+    temporary_chat = await aget_temporary_chat(user.pk, chat_uuid)
+    if temporary_chat is not None:
+        await adiscard_temporary_chat(user.pk, chat_uuid)
+        cancel_chat_future(chat_uuid)
+        if temporary_chat.pending_message is not None:
+            await asend_user_event(user.pk, "chat_pending", chat_uuid = str(chat_uuid), pending_message_id = None)
+        return
+
+    chat = await user.chats.filter(uuid = chat_uuid, is_temporary = True).afirst()
+    if chat is not None:
+        await astop_pending_chat(chat)
+        await chat.adelete()
 
 def stop_user_pending_chats(user: User):
-    pending_chats = Chat.objects.filter(user = user).exclude(pending_message = None)
+    pending_chats = Chat.objects.filter(user = user).filter(pending_message__isnull = False)
+    chat_uuids = [str(chat_uuid) for chat_uuid in pending_chats.values_list("uuid", flat = True)]
 
-    if pending_chats.count() > 0:
-        for pending_chat in pending_chats:
-            cancel_chat_future(pending_chat.uuid)
+    for chat_uuid in chat_uuids:
+        cancel_chat_future(chat_uuid)
+
+    if len(chat_uuids) > 0:
+        pending_chats.update(pending_message = None)
+        bump_chats_version(user.pk)
+
+    for chat_uuid, pending_message_id in get_user_temporary_chats(user.pk).items():
+        if pending_message_id is not None:
+            cancel_chat_future(chat_uuid)
+            clear_temporary_pending_message(user.pk, chat_uuid)
+            chat_uuids.append(chat_uuid)
 
-    pending_chats.update(pending_message = None)
+    send_user_events(user.pk, [("chat_pending", {"chat_uuid": chat_uuid, "pending_message_id": None}) for chat_uuid in chat_uuids])
 
 def reset_stopped_pending_chats(user: User):
-    pending_chats = Chat.objects.filter(user = user).exclude(pending_message = None)
+    pending_chats = Chat.objects.filter(user = user).filter(pending_message__isnull = False)
     if pending_chats.count() > 0:
         for pending_chat in pending_chats:
             if str(pending_chat.uuid) not in chat_futures:
                 pending_chat.pending_message = None
                 pending_chat.save(update_fields = ["pending_message"])
 
+    for chat_uuid, pending_message_id in get_user_temporary_chats(user.pk).items():
+        if pending_message_id is not None and chat_uuid not in chat_futures:
+            clear_temporary_pending_message(user.pk, chat_uuid)
+
 def is_any_user_chat_pending(user: User) -> bool:
     reset_stopped_pending_chats(user)
-    pending_chats = Chat.objects.filter(user = user).exclude(pending_message = None)
+    if any(p is not None for p in get_user_temporary_chats(user.pk).values()):
+        return True
+    pending_chats = Chat.objects.filter(user = user).filter(pending_message__isnull = False)
     return True if pending_chats.count() > 0 else False
 
 def get_ollama_model_and_options(model: str):
@@ -211,7 +278,7 @@ async def safe_save_message_text(message: Message):
     exists = await database_sync_to_async(Message.objects.filter(pk = message.pk).exists)()
     if not exists:
         return False
-    await message.asave(update_fields = ["text"])
+    await message.asave(update_fields = ["text", "last_modified_at"], bump = False)
     return True
 
 async def safe_save_chat_title(chat: Chat):
@@ -226,8 +293,19 @@ async def safe_save_chat_pending_message(chat: Chat):
     if not exists:
         return False
     await chat.asave(update_fields = ["pending_message"])
+    await database_sync_to_async(bump_messages_version)(chat.pk)
     return True
 
+async def save_pending_message_text(chat: Chat | TemporaryChat):
+    if isinstance(chat, TemporaryChat):
+        return True
+    return await safe_save_message_text(chat.pending_message)
+
+async def save_chat_pending_message(chat: Chat | TemporaryChat):
+    if isinstance(chat, TemporaryChat):
+        return await chat.asave_if_stored()
+    return await safe_save_chat_pending_message(chat)
+
 IS_PLAYWRIGHT_TEST = os.getenv("PLAYWRIGHT_TEST") == "True"
 
 if IS_PLAYWRIGHT_TEST:
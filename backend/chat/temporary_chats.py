@@ -0,0 +1,168 @@
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Chat, User
+
+def is_stored_in_cache() -> bool:
+    return settings.TEMPORARY_CHATS["STORAGE"] == "cache"
+
+def get_ttl() -> int:
+    return settings.TEMPORARY_CHATS["TTL"]
+
+def get_chat_key(chat_uuid: str):
+    return f"temporary_chat:{chat_uuid}"
+
+def get_user_chats_key(user_id: int):
+    return f"temporary_chats:{user_id}"
+
+class TemporaryFile:
+    def __init__(self, id: int, name: str, content: bytes, content_type: str):
+        self.id = id
+        self.pk = uuid.uuid4().hex
+        self.name = name
+        self.content = content
+        self.content_type = content_type
+
+class TemporaryMessage:
+    def __init__(self, chat: TemporaryChat, position: int, text: str, is_from_user: bool, model: str = ""):
+        self.chat = chat
+        self.id = position + 1
+        self.pk = self.id
+        self.position = position
+        self.text = text
+        self.is_from_user = is_from_user
+        self.model = model
+        self.files: list[TemporaryFile] = []
+
+    def save(self, *args, **kwargs):
+        self.chat.save()
+
+class TemporaryChat:
+    is_archived = False
+    is_temporary = True
+    index = 0
+
+    def __init__(self, user_id: int, title: str):
+        self.uuid = uuid.uuid4()
+        self.user_id = user_id
+        self.title = title
+        self.messages: list[TemporaryMessage] = []
+        self.pending_message: TemporaryMessage | None = None
+        self.next_file_id = 1
+
+    @property
+    def pending_message_id(self):
+        return self.pending_message.id if self.pending_message is not None else None
+
+    def add_message(self, text: str, is_from_user: bool, model: str = "", files = ()):
+        message = TemporaryMessage(self, len(self.messages), text, is_from_user, model)
+        self.messages.append(message)
+        self.update_message_files(message, files, [])
+        return message
+
+    def add_file(self, message: TemporaryMessage, name: str, content: bytes, content_type: str):
+        message.files.append(TemporaryFile(self.next_file_id, name, content, content_type))
+        self.next_file_id += 1
+
+    def get_messages_at(self, positions: list[int]) -> dict[int, TemporaryMessage]:
+        return {p: self.messages[p] for p in positions if 0 <= p < len(self.messages)}
+
+    def get_message_files(self, message: TemporaryMessage) -> list[TemporaryFile]:
+        return list(message.files)
+
+    def update_message_files(self, message: TemporaryMessage, added_files, removed_files: list[TemporaryFile]):
+        removed_file_ids = {f.id for f in removed_files}
+        message.files = [f for f in message.files if f.id not in removed_file_ids]
+        for file in added_files:
+            file.seek(0)
+            self.add_file(message, file.name, file.read(), file.content_type)
+        self.save()
+
+    def save(self, *args, **kwargs):
+        cache.set(get_chat_key(self.uuid), self, get_ttl())
+        user_chats = cache.get(get_user_chats_key(self.user_id), {})
+        if update_user_chats(user_chats, str(self.uuid), self.pending_message_id):
+            cache.set(get_user_chats_key(self.user_id), user_chats, get_ttl())
+
+    async def asave(self, *args, **kwargs):
+        await cache.aset(get_chat_key(self.uuid), self, get_ttl())
+        user_chats = await cache.aget(get_user_chats_key(self.user_id), {})
+        if update_user_chats(user_chats, str(self.uuid), self.pending_message_id):
+            await cache.aset(get_user_chats_key(self.user_id), user_chats, get_ttl())
+
+    async def asave_if_stored(self):
+        if not await cache.atouch(get_chat_key(self.uuid), get_ttl()):
+            return False
+        await self.asave()
+        return True
+
+def create_chat(user: User, title: str, is_temporary: bool) -> Chat | TemporaryChat:
+    if is_temporary and is_stored_in_cache():
+        chat = TemporaryChat(user.pk, title)
+        chat.save()
+        return chat
+    return user.chats.create(title = title, is_temporary = is_temporary)
+
+def get_chat(user: User, chat_uuid: str) -> Chat | TemporaryChat | None:
+    chat = get_temporary_chat(user.pk, chat_uuid)
+    if chat is None:
+        chat = user.chats.filter(uuid = chat_uuid).first()
+    return chat
+
+def get_temporary_chat(user_id: int, chat_uuid: str) -> TemporaryChat | None:
+    if not is_stored_in_cache():
+        return None
+
+    chat: TemporaryChat | None = cache.get(get_chat_key(chat_uuid))
+    if chat is None or chat.user_id != user_id:
+        return None
+
+    cache.touch(get_chat_key(chat_uuid), get_ttl())
+    return chat
+
+async def aget_temporary_chat(user_id: int, chat_uuid: str) -> TemporaryChat | None:
+    if not is_stored_in_cache():
+        return None
+
+    chat: TemporaryChat | None = await cache.aget(get_chat_key(chat_uuid))
+    if chat is None or chat.user_id != user_id:
+        return None
+
+    await cache.atouch(get_chat_key(chat_uuid), get_ttl())
+    return chat
+
+def get_user_temporary_chats(user_id: int) -> dict[str, int | None]:
+    if not is_stored_in_cache():
+        return {}
+    return cache.get(get_user_chats_key(user_id), {})
+
+def clear_temporary_pending_message(user_id: int, chat_uuid: str):
+    chat = get_temporary_chat(user_id, chat_uuid)
+    if chat is None:
+        discard_temporary_chat(user_id, chat_uuid)
+        return
+
+    chat.pending_message = None
+    chat.save()
+
+def update_user_chats(user_chats: dict[str, int | None], chat_uuid: str, pending_message_id: int | None):
+    if chat_uuid in user_chats and user_chats[chat_uuid] == pending_message_id:
+        return False
+    user_chats[chat_uuid] = pending_message_id
+    return True
+
+def discard_temporary_chat(user_id: int, chat_uuid: str):
+    cache.delete(get_chat_key(chat_uuid))
+    user_chats = cache.get(get_user_chats_key(user_id), {})
+    if str(chat_uuid) in user_chats:
+        del user_chats[str(chat_uuid)]
+        cache.set(get_user_chats_key(user_id), user_chats, get_ttl())
+
+async def adiscard_temporary_chat(user_id: int, chat_uuid: str):
+    await cache.adelete(get_chat_key(chat_uuid))
+    user_chats = await cache.aget(get_user_chats_key(user_id), {})
+    if str(chat_uuid) in user_chats:
+        del user_chats[str(chat_uuid)]
+        await cache.aset(get_user_chats_key(user_id), user_chats, get_ttl())
\ No newline at end of file
@@ -0,0 +1,99 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .utils import create_user
+from ..models import User
+
+class AdminChangelists(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser("admin@example.com", "adminpassword")
+        self.client.force_login(self.admin)
+
+    def create_chats(self, count: int):
+        for i in range(count):
+            user = create_user(f"user{User.objects.count()}@example.com")
+            chat = user.chats.create(title = f"Chat {i + 1}")
+            chat.messages.create(text = "Hello!" * 10, is_from_user = True)
+            chat.pending_message = chat.messages.create(text = "", is_from_user = False)
+            chat.save()
+            user.sessions.create()
+
+    def count_queries(self, url: str):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def assertConstantQueries(self, url: str):
+        self.create_chats(1)
+        queries = self.count_queries(url)
+        self.create_chats(5)
+        self.assertEqual(self.count_queries(url), queries)
+
+    def test_chats(self):
+        self.assertConstantQueries("/admin/chat/chat/")
+
+    def test_messages(self):
+        self.assertConstantQueries("/admin/chat/message/")
+
+    def test_sessions(self):
+        self.assertConstantQueries("/admin/chat/usersession/")
+
+    def test_user_change_page(self):
+        self.create_chats(1)
+        user = User.objects.get(email = "user1@example.com")
+        user.sessions.create(logout_at = timezone.now())
+        response = self.client.get(f"/admin/chat/user/{user.pk}/change/")
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "<span><strong>Total: </strong>2</span>", html = True)
+        self.assertContains(response, "<span><strong>Active: </strong>1</span>", html = True)
+        self.assertContains(response, "<span><strong>Inactive: </strong>1</span>", html = True)
+
+    def test_session_change_page_shows_stored_device(self):
+        session = create_user().sessions.create(
+            user_agent = ("Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) " * 4)[:200],
+            device = "Device(family='iPhone', brand='Apple', model='iPhone')"
+        )
+        response = self.client.get(f"/admin/chat/usersession/{session.pk}/change/")
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Family: iPhone\nBrand: Apple\nModel: iPhone")
+
+    def test_message_summary(self):
+        self.create_chats(1)
+        response = self.client.get("/admin/chat/message/")
+        self.assertContains(response, "Hello!Hello!Hello!Hello!H...")
+
+class MessageFilePreviews(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser("admin@example.com", "adminpassword")
+        self.client.force_login(self.admin)
+        self.chat = create_user().chats.create(title = "Chat")
+        self.message = self.chat.messages.create(text = "Hello!", is_from_user = True)
+
+    def get_change_page(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(f"/admin/chat/chat/{self.chat.pk}/change/")
+        self.assertEqual(response.status_code, 200)
+        for query in context.captured_queries:
+            if "chat_messagefile" in query["sql"]:
+                self.assertNotRegex(query["sql"], r"(?<!\()\"chat_messagefile\"\.\"content\"")
+        return response
+
+    def test_text(self):
+        self.message.files.create(name = "file.txt", content = "<b>é</b>".encode() * 1000, content_type = "text/plain")
+        response = self.get_change_page()
+        self.assertContains(response, "<pre>" + "&lt;b&gt;é&lt;/b&gt;" * 125 + "...</pre>", html = False)
+
+    def test_short_text(self):
+        self.message.files.create(name = "file.txt", content = b"Hello!", content_type = "text/plain")
+        self.assertContains(self.get_change_page(), "<pre>Hello!</pre>")
+
+    def test_binary(self):
+        self.message.files.create(name = "file.bin", content = b"\x00\x01\xff" * 10_000, content_type = "application/octet-stream")
+        self.assertContains(self.get_change_page(), "(binary content hidden)")
+
+    def test_truncated_multibyte_character(self):
+        self.message.files.create(name = "file.txt", content = ("a" + "é" * 3000).encode(), content_type = "text/plain")
+        self.assertContains(self.get_change_page(), "<pre>a" + "é" * 999 + "...</pre>")
\ No newline at end of file
@@ -0,0 +1,172 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .utils import create_user
+from ..cleanup import collect_garbage, delete_chats, sweep_expired_guests
+from ..models import Chat, DeletedMessageFile, EmailVerificationToken, GuestIdentity, Message, MessageFile, PasswordResetToken, PreAuthToken, User, UserSession
+from ..versions import get_chats_version, get_messages_version, get_user_version
+
+class CollectGarbage(TestCase):
+    def setUp(self):
+        self.user = create_user()
+        now = timezone.now()
+
+        for expires_at, used_at in [(now - timedelta(minutes = 1), None), (now + timedelta(minutes = 5), now), (now + timedelta(minutes = 5), None)]:
+            self.user.pre_auth_tokens.create(token_hash = "hash", ip_address = "127.0.0.1", user_agent_hash = "hash", expires_at = expires_at, used_at = used_at)
+            self.user.email_verification_tokens.create(token_hash = "hash", expires_at = expires_at, used_at = used_at)
+            self.user.password_reset_tokens.create(token_fingerprint = "fingerprint", ip_address = "127.0.0.1", user_agent_hash = "hash", expires_at = expires_at, used_at = used_at)
+
+        self.user.sessions.create(logout_at = now - timedelta(days = 31))
+        self.user.sessions.create(logout_at = now - timedelta(days = 1))
+        self.user.sessions.create()
+
+        message = self.user.chats.create(title = "Test chat").messages.create(text = "Hello!", is_from_user = True)
+        message.deleted_files.create(file_id = 1)
+        message.deleted_files.create(file_id = 2)
+        DeletedMessageFile.objects.filter(file_id = 1).update(deleted_at = now - timedelta(days = 31))
+
+        self.valid_refresh = RefreshToken.for_user(self.user)
+        expired_refresh = RefreshToken.for_user(self.user)
+        OutstandingToken.objects.filter(jti = expired_refresh["jti"]).update(expires_at = now - timedelta(minutes = 1))
+        expired_refresh.blacklist()
+
+    def test(self):
+        counts = collect_garbage(batch_size = 1)
+        self.assertEqual(counts, {
+            "pre_auth_tokens": 2,
+            "email_verification_tokens": 2,
+            "password_reset_tokens": 2,
+            "user_sessions": 1,
+            "outstanding_tokens": 1,
+            "deleted_message_files": 1,
+            "guest_users": 0,
+            "deleted_accounts": 0
+        })
+
+        for model in [PreAuthToken, EmailVerificationToken, PasswordResetToken]:
+            self.assertEqual(model.objects.count(), 1)
+            token = model.objects.first()
+            self.assertIsNone(token.used_at)
+            self.assertGreater(token.expires_at, timezone.now())
+
+        self.assertEqual(UserSession.objects.count(), 2)
+        self.assertEqual(list(OutstandingToken.objects.values_list("jti", flat = True)), [self.valid_refresh["jti"]])
+        self.assertEqual(BlacklistedToken.objects.count(), 0)
+        self.assertEqual(list(DeletedMessageFile.objects.values_list("file_id", flat = True)), [2])
+
+        self.assertEqual(set(collect_garbage().values()), {0})
+
+    def test_command(self):
+        stdout = StringIO()
+        call_command("collect_garbage", "--batch-size", "10", stdout = stdout)
+        self.assertEqual(stdout.getvalue().splitlines(), [
+            "pre_auth_tokens: 2",
+            "email_verification_tokens: 2",
+            "password_reset_tokens: 2",
+            "user_sessions: 1",
+            "outstanding_tokens: 1",
+            "deleted_message_files: 1",
+            "guest_users: 0",
+            "deleted_accounts: 0"
+        ])
+
+class DeleteChats(TestCase):
+    def create_chat(self, user: User, title: str):
+        chat = user.chats.create(title = title)
+        message = chat.messages.create(text = "Hello!", is_from_user = True)
+        message.files.create(name = "file.txt", content = b"content", content_type = "text/plain")
+        message.files.create(name = "other.txt", content = b"content", content_type = "text/plain").delete()
+        chat.pending_message = chat.messages.create(text = "", is_from_user = False)
+        chat.save()
+        return chat
+
+    def test(self):
+        user = create_user()
+        other_user = create_user("someone@example.com")
+        for i in range(5):
+            self.create_chat(user, f"Chat {i + 1}")
+        other_chat = self.create_chat(other_user, "Other chat")
+        chat_uuids = list(Chat.objects.values_list("uuid", flat = True))
+        for chat_uuid in chat_uuids:
+            get_messages_version(chat_uuid)
+
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(delete_chats(Chat.objects.filter(user = user), batch_size = 2), 5)
+        for query in context.captured_queries:
+            self.assertNotIn('"content"', query["sql"])
+            self.assertNotIn('"text"', query["sql"])
+
+        self.assertEqual(list(Chat.objects.values_list("uuid", flat = True)), [other_chat.uuid])
+        self.assertEqual(set(Message.objects.values_list("chat_id", flat = True)), {other_chat.uuid})
+        self.assertEqual(MessageFile.objects.count(), 1)
+        self.assertEqual(DeletedMessageFile.objects.count(), 1)
+        for chat_uuid in chat_uuids:
+            self.assertEqual(cache.get(f"messages_version:{chat_uuid}") is None, chat_uuid != other_chat.uuid)
+
+        self.assertEqual(delete_chats(Chat.objects.filter(user = user)), 0)
+
+@override_settings(CLEANUP = {**settings.CLEANUP, "CHAT_BATCH_SIZE": 1, "GUEST_BATCH_SIZE": 2, "GUEST_BATCH_PAUSE": 0})
+class SweepExpiredGuests(TestCase):
+    def create_guest(self, expired: bool):
+        identity, _ = GuestIdentity.create("127.0.0.1", "")
+        if expired:
+            GuestIdentity.objects.filter(pk = identity.pk).update(expires_at = timezone.now() - timedelta(minutes = 1))
+
+        chat = identity.user.chats.create(title = "Chat")
+        message = chat.messages.create(text = "Hello!", is_from_user = True)
+        message.files.create(name = "file.txt", content = b"content", content_type = "text/plain")
+        return identity.user
+
+    def test(self):
+        expired_guests = [self.create_guest(True) for _ in range(3)]
+        active_guest = self.create_guest(False)
+        user = create_user()
+        for guest in [*expired_guests, active_guest]:
+            get_user_version(guest.pk)
+            get_chats_version(guest.pk)
+        chat_uuids = list(Chat.objects.filter(user__in = expired_guests).values_list("uuid", flat = True))
+        for chat_uuid in chat_uuids:
+            get_messages_version(chat_uuid)
+
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(sweep_expired_guests(timezone.now()), 3)
+        chat_deletes = [query for query in context.captured_queries if query["sql"].startswith('DELETE FROM "chat_chat"')]
+        self.assertEqual(len(chat_deletes), 3)
+
+        self.assertEqual(set(User.objects.values_list("pk", flat = True)), {active_guest.pk, user.pk})
+        self.assertFalse(Chat.objects.filter(user__in = expired_guests).exists())
+        self.assertFalse(Message.objects.filter(chat__user__in = expired_guests).exists())
+        self.assertEqual(MessageFile.objects.count(), 1)
+        self.assertEqual(GuestIdentity.objects.count(), 1)
+        for guest in [*expired_guests, active_guest]:
+            for key in [f"user_version:{guest.pk}", f"chats_version:{guest.pk}"]:
+                self.assertEqual(cache.get(key) is None, guest != active_guest)
+        for chat_uuid in chat_uuids:
+            self.assertIsNone(cache.get(f"messages_version:{chat_uuid}"))
+
+    def test_skips_pending_chats(self):
+        guest = self.create_guest(True)
+        chat = guest.chats.first()
+        chat.pending_message = chat.messages.create(text = "", is_from_user = False)
+        chat.save()
+
+        self.assertEqual(sweep_expired_guests(timezone.now()), 0)
+        self.assertTrue(User.objects.filter(pk = guest.pk).exists())
+
+    def test_max_per_run(self):
+        for _ in range(5):
+            self.create_guest(True)
+
+        with self.settings(CLEANUP = {**settings.CLEANUP, "GUEST_BATCH_SIZE": 2, "GUEST_BATCH_PAUSE": 0, "GUEST_MAX_PER_RUN": 3}):
+            self.assertEqual(sweep_expired_guests(timezone.now()), 3)
+        self.assertEqual(User.objects.count(), 2)
\ No newline at end of file
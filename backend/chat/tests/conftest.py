@@ -1,5 +1,10 @@
 import pytest
+from django.core.cache import cache
 
 @pytest.fixture(autouse = True)
 def disable_ssl_redirect(settings):
-    settings.SECURE_SSL_REDIRECT = False
\ No newline at end of file
+    settings.SECURE_SSL_REDIRECT = False
+
+@pytest.fixture(autouse = True)
+def clear_cache():
+    cache.clear()
\ No newline at end of file
@@ -14,9 +14,13 @@ from freezegun import freeze_time
 from rest_framework_simplejwt.tokens import AccessToken
 
 from .utils import create_user
-from ..consumers import ChatConsumer, RedisTokenBucket
+from .. import consumers
+from ..consumers import ChatConsumer
+from ..events import asend_user_event, asend_user_events
+from ..limiter import RedisTokenBucket
 from ..models import User
 from ..tasks import ollama_client, opened_chats, generate_message
+from ..temporary_chats import aget_temporary_chat, create_chat
 
 @pytest.mark.asyncio
 async def test_reject_unauthenticated_connection():
@@ -174,6 +178,53 @@ async def test_generate_message_streaming(transactional_db, monkeypatch):
 
     await ws.disconnect()
 
+@pytest.mark.asyncio
+async def test_cancelled_generation_sends_end(transactional_db, monkeypatch):
+    user, ws = await connect_to_communicator_with_user()
+    chat = await user.chats.acreate(title = "Chat")
+
+    pending = await chat.messages.acreate(text = "", is_from_user = False, model = "Qwen3-VL:4B")
+    chat.pending_message = pending
+    await chat.asave(update_fields = ["pending_message"])
+
+    async def fake_chat(model, messages, stream = True, options = None):
+        async def gen():
+            class Part:
+                def __init__(self, text):
+                    self.message = type("M", (), {"content": text})
+
+            yield Part("Hello")
+            await asyncio.sleep(10)
+            yield Part(" world")
+
+        return gen()
+
+    monkeypatch.setattr(ollama_client, "chat", fake_chat)
+
+    await ws.send_json_to({"chat_uuid": str(chat.uuid)})
+    await assert_in(str(chat.uuid), opened_chats)
+
+    task = asyncio.create_task(generate_message(chat, False, False))
+
+    while True:
+        response = await ws.receive_json_from()
+        if isinstance(response, dict) and response.get("token") == "Hello":
+            break
+
+    task.cancel()
+    await task
+
+    while True:
+        response = await ws.receive_json_from()
+        if response == "end":
+            break
+
+    await chat.arefresh_from_db()
+    assert chat.pending_message_id is None
+    assert (await chat.messages.aget(pk = pending.pk)).text == "Hello"
+
+    await ws.disconnect()
+
 @pytest.mark.asyncio
 async def test_disconnect_removes_opened_chat(transactional_db):
     user, ws = await connect_to_communicator_with_user()
@@ -221,6 +272,211 @@ async def test_rate_limited(transactional_db, monkeypatch):
     assert response == {"error": "rate_limited", "retry_after": 3.5}
     await ws.disconnect()
 
+@pytest.mark.asyncio
+async def test_resume_stream_replays_missing_chunks(transactional_db, monkeypatch):
+    async def fake_read_chunks(chat_uuid, stream_id, last_seq):
+        assert stream_id == "abcd1234"
+        assert last_seq == 2
+        return "abcd1234", True, [
+            {"seq": 3, "message_index": 1, "token": " wor", "end": False},
+            {"seq": 4, "message_index": 1, "token": "ld", "end": False}
+        ]
+
+    monkeypatch.setattr(consumers, "read_chunks", fake_read_chunks)
+
+    user, ws = await connect_to_communicator_with_user()
+    chat = await user.chats.acreate(title = "Chat")
+
+    await ws.send_json_to({"chat_uuid": str(chat.uuid), "stream_id": "abcd1234", "last_seq": 2})
+    assert await ws.receive_json_from() == {"token": " wor", "message_index": 1, "seq": 3, "stream_id": "abcd1234"}
+    assert await ws.receive_json_from() == {"token": "ld", "message_index": 1, "seq": 4, "stream_id": "abcd1234"}
+    assert await ws.receive_nothing(0.1, 0.01)
+    assert str(chat.uuid) not in opened_chats
+
+    await ws.disconnect()
+
+@pytest.mark.asyncio
+async def test_resume_unknown_stream_sends_full_message(transactional_db, monkeypatch):
+    async def fake_read_chunks(chat_uuid, stream_id, last_seq):
+        return "efgh5678", False, [
+            {"seq": 1, "message_index": 1, "token": "Hello", "end": False},
+            {"seq": 2, "message_index": 1, "token": " world", "end": False},
+            {"seq": 3, "message_index": 1, "token": "", "end": True}
+        ]
+
+    monkeypatch.setattr(consumers, "read_chunks", fake_read_chunks)
+
+    user, ws = await connect_to_communicator_with_user()
+    chat = await user.chats.acreate(title = "Chat")
+
+    await ws.send_json_to({"chat_uuid": str(chat.uuid), "stream_id": "abcd1234", "last_seq": 10})
+    assert await ws.receive_json_from() == {"message": "Hello world", "message_index": 1, "seq": 2, "stream_id": "efgh5678"}
+    assert await ws.receive_json_from() == "end"
+
+    await ws.disconnect()
+
+@pytest.mark.asyncio
+async def test_resume_without_stream_log_falls_back_to_opened_chats(transactional_db, monkeypatch):
+    async def fake_read_chunks(chat_uuid, stream_id, last_seq):
+        return None
+
+    monkeypatch.setattr(consumers, "read_chunks", fake_read_chunks)
+
+    user, ws = await connect_to_communicator_with_user()
+    chat = await user.chats.acreate(title = "Chat")
+
+    await ws.send_json_to({"chat_uuid": str(chat.uuid), "stream_id": "abcd1234", "last_seq": 0})
+    await assert_in(str(chat.uuid), opened_chats)
+
+    await ws.disconnect()
+
+@pytest.mark.asyncio
+async def test_multiplexed_subscribe_to_several_chats(transactional_db):
+    user, ws = await connect_to_communicator_with_user()
+    chat1 = await user.chats.acreate(title = "Chat 1")
+    chat2 = await user.chats.acreate(title = "Chat 2")
+
+    await ws.send_json_to({"action": "subscribe", "chat_uuid": str(chat1.uuid)})
+    await ws.send_json_to({"action": "subscribe", "chat_uuid": str(chat2.uuid)})
+    await assert_in(str(chat1.uuid), opened_chats)
+    await assert_in(str(chat2.uuid), opened_chats)
+
+    channel_layer = get_channel_layer()
+    await channel_layer.group_send(f"chat_{chat1.uuid}", {"type": "send_token", "chat_uuid": str(chat1.uuid), "token": "Hello", "message_index": 0})
+    assert await ws.receive_json_from() == {"chat_uuid": str(chat1.uuid), "token": "Hello", "message_index": 0}
+
+    await channel_layer.group_send(f"chat_{chat2.uuid}", {"type": "send_title", "chat_uuid": str(chat2.uuid), "title": "Some Chat"})
+    assert await ws.receive_json_from() == {"chat_uuid": str(chat2.uuid), "title": "Some Chat"}
+
+    await channel_layer.group_send(f"chat_{chat2.uuid}", {"type": "send_end", "chat_uuid": str(chat2.uuid)})
+    assert await ws.receive_json_from() == {"chat_uuid": str(chat2.uuid), "end": True}
+
+    await ws.disconnect()
+    await assert_not_in(str(chat1.uuid), opened_chats)
+    await assert_not_in(str(chat2.uuid), opened_chats)
+
+@pytest.mark.asyncio
+async def test_multiplexed_unsubscribe(transactional_db):
+    user, ws = await connect_to_communicator_with_user()
+    chat = await user.chats.acreate(title = "Chat")
+
+    await ws.send_json_to({"action": "subscribe", "chat_uuid": str(chat.uuid)})
+    await assert_in(str(chat.uuid), opened_chats)
+
+    await ws.send_json_to({"action": "unsubscribe", "chat_uuid": str(chat.uuid)})
+    await assert_not_in(str(chat.uuid), opened_chats)
+
+    channel_layer = get_channel_layer()
+    await channel_layer.group_send(f"chat_{chat.uuid}", {"type": "send_token", "chat_uuid": str(chat.uuid), "token": "Hello", "message_index": 0})
+    assert await ws.receive_nothing(0.1, 0.01)
+
+    await ws.disconnect()
+
+@pytest.mark.asyncio
+async def test_multiplexed_unsubscribe_deletes_temporary_chat(transactional_db):
+    user, ws = await connect_to_communicator_with_user()
+    chat = await user.chats.acreate(title = "Chat", is_temporary = True)
+
+    await ws.send_json_to({"action": "subscribe", "chat_uuid": str(chat.uuid)})
+    await assert_in(str(chat.uuid), opened_chats)
+
+    await ws.send_json_to({"action": "unsubscribe", "chat_uuid": str(chat.uuid)})
+    await assert_not_in(str(chat.uuid), opened_chats)
+    assert await user.chats.filter(uuid = chat.uuid).aexists() is False
+
+    await ws.disconnect()
+
+@pytest.mark.asyncio
+async def test_temporary_chat_in_cache(transactional_db, monkeypatch):
+    user, ws = await connect_to_communicator_with_user()
+    chat = await database_sync_to_async(create_chat)(user, "Chat 1", True)
+    await database_sync_to_async(chat.add_message)("Hello!", True)
+    chat.pending_message = await database_sync_to_async(chat.add_message)("", False, "Qwen3-VL:4B")
+    await chat.asave()
+
+    async def fake_chat(model, messages, stream = True, options = None):
+        assert messages[1:] == [{"role": "user", "content": "Hello!"}]
+
+        async def gen():
+            for t in ["Hello", " world"]:
+                yield type("Part", (), {"message": type("M", (), {"content": t})})
+
+        return gen()
+
+    monkeypatch.setattr(ollama_client, "chat", fake_chat)
+
+    await ws.send_json_to({"action": "subscribe", "chat_uuid": str(chat.uuid)})
+    await assert_in(str(chat.uuid), opened_chats)
+
+    await generate_message(chat, False, False)
+    stored_chat = await aget_temporary_chat(user.pk, chat.uuid)
+    assert stored_chat.messages[1].text == "Hello world"
+    assert stored_chat.pending_message is None
+
+    await ws.send_json_to({"action": "unsubscribe", "chat_uuid": str(chat.uuid)})
+    await assert_not_in(str(chat.uuid), opened_chats)
+    await ws.disconnect()
+
+    assert await aget_temporary_chat(user.pk, chat.uuid) is None
+    assert await user.chats.acount() == 0
+
+@pytest.mark.asyncio
+async def test_multiplexed_subscribe_ignores_other_users_chats(transactional_db):
+    _, ws = await connect_to_communicator_with_user()
+    other_user = await database_sync_to_async(create_user)("other@example.com")
+    chat = await other_user.chats.acreate(title = "Chat")
+
+    await ws.send_json_to({"action": "subscribe", "chat_uuid": str(chat.uuid)})
+    assert await ws.receive_nothing(0.1, 0.01)
+    assert str(chat.uuid) not in opened_chats
+
+    await ws.disconnect()
+
+@pytest.mark.asyncio
+async def test_subscribe_user_events(transactional_db):
+    user, ws = await connect_to_communicator_with_user()
+
+    await ws.send_json_to({"action": "subscribe_events"})
+    assert await ws.receive_nothing(0.1, 0.01)
+
+    await asend_user_event(user.pk, "chat_renamed", chat_uuid = "123", title = "New Title")
+    assert await ws.receive_json_from() == {"event": "chat_renamed", "chat_uuid": "123", "title": "New Title"}
+
+    await asend_user_event(user.pk, "chats_archived", is_archived = True)
+    assert await ws.receive_json_from() == {"event": "chats_archived", "is_archived": True}
+
+    await ws.disconnect()
+
+@pytest.mark.asyncio
+async def test_subscribe_several_user_events(transactional_db):
+    user, ws = await connect_to_communicator_with_user()
+
+    await ws.send_json_to({"action": "subscribe_events"})
+    assert await ws.receive_nothing(0.1, 0.01)
+
+    await asend_user_events(user.pk, [("chat_pending", {"chat_uuid": "123", "pending_message_id": None}), ("chats_deleted", {})])
+    assert await ws.receive_json_from() == {"event": "chat_pending", "chat_uuid": "123", "pending_message_id": None}
+    assert await ws.receive_json_from() == {"event": "chats_deleted"}
+
+    await ws.disconnect()
+
+@pytest.mark.asyncio
+async def test_user_events_require_subscription(transactional_db):
+    user, ws = await connect_to_communicator_with_user()
+
+    await asend_user_event(user.pk, "chat_renamed", chat_uuid = "123", title = "New Title")
+    assert await ws.receive_nothing(0.1, 0.01)
+
+    await ws.disconnect()
+
+@pytest.mark.asyncio
+async def test_invalid_action_closes_connection(transactional_db):
+    _, ws = await connect_to_communicator_with_user()
+    await ws.send_json_to({"action": "unknown"})
+    output = await ws.receive_output()
+    assert output["type"] == "websocket.close"
+    await ws.disconnect()
+
 def get_access_cookie_for_user(user: User):
     return f"access_token={AccessToken.for_user(user)}"
 
@@ -0,0 +1,35 @@
+from unittest.mock import AsyncMock, patch
+
+from django.test import TestCase
+
+from ..events import get_user_group, send_user_event, send_user_events
+
+class SendUserEvent(TestCase):
+    @patch("chat.events.get_channel_layer")
+    def test_sent_on_commit(self, mock_get_channel_layer):
+        group_send = mock_get_channel_layer.return_value.group_send = AsyncMock()
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            send_user_event(1, "chat_renamed", chat_uuid = "123", title = "New Title")
+        group_send.assert_not_awaited()
+
+        for callback in callbacks:
+            callback()
+        group_send.assert_awaited_once_with(
+            get_user_group(1),
+            {"type": "send_user_event", "event": "chat_renamed", "data": {"chat_uuid": "123", "title": "New Title"}}
+        )
+
+    @patch("chat.events.get_channel_layer")
+    def test_channel_layer_errors_are_logged(self, mock_get_channel_layer):
+        mock_get_channel_layer.return_value.group_send = AsyncMock(side_effect = ConnectionError("unavailable"))
+
+        with self.assertLogs("chat.events", "ERROR") as logs:
+            with self.captureOnCommitCallbacks(execute = True):
+                send_user_event(1, "chats_deleted")
+                send_user_events(1, [("chat_pending", {"chat_uuid": "123", "pending_message_id": None})])
+
+        self.assertEqual([record.getMessage() for record in logs.records], [
+            "Could not send user event 'chats_deleted'.",
+            "Could not send user events 'chat_pending'."
+        ])
\ No newline at end of file
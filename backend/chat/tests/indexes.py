@@ -0,0 +1,50 @@
+from datetime import timedelta
+
+from django.db import connection
+from django.db.models import QuerySet
+from django.test import TestCase
+from django.utils import timezone
+
+from .utils import create_user
+from ..models import Chat, PreAuthToken
+
+class QueryIndexes(TestCase):
+    def setUp(self):
+        self.user = create_user()
+        chat = self.user.chats.create(title = "Chat")
+        chat.messages.create(text = "Hello!", is_from_user = True)
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("SET enable_seqscan = off")
+
+    def assertUsesIndex(self, queryset: QuerySet, index_name: str):
+        plan = queryset.explain()
+        if connection.vendor == "postgresql":
+            self.assertNotIn("Seq Scan", plan)
+            self.assertIn(index_name, plan)
+        else:
+            self.assertNotRegex(plan, r"\bSCAN (?!.*USING)")
+
+    def test_chat_listing(self):
+        chats = self.user.chats.filter(is_archived = False, is_temporary = False).order_by("-created_at")
+        self.assertUsesIndex(chats, "chat_user_listing_idx")
+
+    def test_pending_chats(self):
+        chats = Chat.objects.filter(user = self.user, pending_message__isnull = False)
+        self.assertUsesIndex(chats, "chat_user_pending_idx")
+
+    def test_chat_messages(self):
+        messages = self.user.chats.first().messages.order_by("position")
+        self.assertUsesIndex(messages, "message_chat_position_unique")
+
+    def test_active_sessions(self):
+        sessions = self.user.sessions.filter(logout_at__isnull = True)
+        self.assertUsesIndex(sessions, "session_user_logout_idx")
+
+    def test_unused_pre_auth_tokens(self):
+        tokens = PreAuthToken.objects.filter(used_at__isnull = True, expires_at__gt = timezone.now())
+        self.assertUsesIndex(tokens, "pre_auth_token_unused_idx")
+
+    def test_unused_email_verification_tokens(self):
+        tokens = self.user.email_verification_tokens.filter(used_at__isnull = True, expires_at__gt = timezone.now() - timedelta(hours = 1))
+        self.assertUsesIndex(tokens, "email_token_unused_idx")
\ No newline at end of file
@@ -0,0 +1,208 @@
+import pytest
+from freezegun import freeze_time
+from redis.exceptions import NoScriptError
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory
+from rest_framework.views import APIView
+
+from .. import limiter
+from ..limiter import RedisTokenBucket, allow_many_sync, get_token_bucket
+from ..redis_pool import PoolMetrics
+from ..throttles import RefreshRateThrottle, SignupRateThrottle
+
+class FakeConnectionPool:
+    def __init__(self):
+        self.metrics = PoolMetrics("test", 10)
+
+class FakeRedis:
+    def __init__(self, results: list[list[str]], missing_script: bool = False):
+        self.connection_pool = FakeConnectionPool()
+        self.results = results
+        self.missing_script = missing_script
+        self.calls = 0
+        self.loaded = 0
+
+    async def evalsha(self, *args):
+        if self.missing_script:
+            raise NoScriptError("NOSCRIPT")
+        self.calls += 1
+        return self.results.pop(0)
+
+    def pipeline(self, transaction = True):
+        return FakePipeline(self)
+
+class FakePipeline:
+    def __init__(self, redis: FakeRedis):
+        self.redis = redis
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+    def script_load(self, script):
+        self.commands.append("load")
+
+    def evalsha(self, *args):
+        self.commands.append("evalsha")
+
+    async def execute(self):
+        self.redis.loaded += 1
+        self.redis.missing_script = False
+        self.redis.calls += 1
+        return [limiter._TOKEN_BUCKET_SHA, self.redis.results.pop(0)]
+
+class FakeSyncRedis:
+    def __init__(self):
+        self.connection_pool = FakeConnectionPool()
+        self.buckets: dict[str, tuple[float, float]] = {}
+        self.loaded = False
+        self.executed = 0
+
+    def pipeline(self, transaction = True):
+        return FakeSyncPipeline(self)
+
+    def run_script(self, key: str, now: str, capacity: str, refill_per_sec: str, requested: str, lease: str):
+        now, capacity, refill_per_sec, requested, lease = float(now), float(capacity), float(refill_per_sec), float(requested), float(lease)
+        tokens, ts = self.buckets.get(key, (capacity, now))
+        tokens = min(capacity, tokens + max(0, now - ts) * refill_per_sec)
+
+        if tokens < requested:
+            return ["0", str((requested - tokens) / refill_per_sec), "0"]
+
+        granted = lease if lease > requested and tokens - lease >= capacity / 2 else requested
+        self.buckets[key] = (tokens - granted, now)
+        return ["1", str(tokens - granted), str(granted)]
+
+class FakeSyncPipeline:
+    def __init__(self, redis: FakeSyncRedis):
+        self.redis = redis
+        self.commands = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def script_load(self, script):
+        self.commands.append(("load",))
+
+    def evalsha(self, sha, numkeys, key, *args):
+        self.commands.append(("evalsha", key, *args))
+
+    def execute(self, raise_on_error = True):
+        self.redis.executed += 1
+        results = []
+        for command in self.commands:
+            if command[0] == "load":
+                self.redis.loaded = True
+                results.append(limiter._TOKEN_BUCKET_SHA)
+            elif not self.redis.loaded:
+                results.append(NoScriptError("NOSCRIPT"))
+            else:
+                results.append(self.redis.run_script(*command[1:]))
+        return results
+
+@pytest.fixture
+def fake_sync_redis(monkeypatch):
+    monkeypatch.delenv("DJANGO_TEST")
+    redis = FakeSyncRedis()
+    monkeypatch.setattr(limiter, "get_sync_redis", lambda: redis)
+    return redis
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    monkeypatch.delenv("DJANGO_TEST")
+
+    def install(redis: FakeRedis):
+        async def get_redis():
+            return redis
+        monkeypatch.setattr(limiter, "get_redis", get_redis)
+        return redis
+
+    return install
+
+@pytest.mark.asyncio
+async def test_leased_tokens_skip_redis(fake_redis):
+    redis = fake_redis(FakeRedis([["1", "15", "5"], ["1", "10", "5"]]))
+    bucket = RedisTokenBucket("rate:test", 20, 60.0, 5)
+
+    for _ in range(5):
+        assert await bucket.allow("1") == (True, 0.0)
+    assert redis.calls == 1
+
+    assert await bucket.allow("1") == (True, 0.0)
+    assert redis.calls == 2
+
+@pytest.mark.asyncio
+async def test_without_lease_every_check_reaches_redis(fake_redis):
+    redis = fake_redis(FakeRedis([["1", "19", "1"], ["1", "18", "1"], ["0", "2.5", "0"]]))
+    bucket = RedisTokenBucket("rate:test", 20, 60.0)
+
+    assert await bucket.allow("1") == (True, 0.0)
+    assert await bucket.allow("1") == (True, 0.0)
+    assert await bucket.allow("1") == (False, 2.5)
+    assert redis.calls == 3
+
+@pytest.mark.asyncio
+async def test_missing_script_is_reloaded(fake_redis):
+    redis = fake_redis(FakeRedis([["1", "19", "1"]], missing_script = True))
+    bucket = RedisTokenBucket("rate:test", 20, 60.0)
+
+    assert await bucket.allow("1") == (True, 0.0)
+    assert redis.loaded == 1
+
+@pytest.mark.asyncio
+async def test_fails_open_without_redis(monkeypatch):
+    monkeypatch.delenv("DJANGO_TEST")
+
+    async def get_redis():
+        return None
+    monkeypatch.setattr(limiter, "get_redis", get_redis)
+
+    bucket = RedisTokenBucket("rate:test", 1, 60.0)
+    assert await bucket.allow("1") == (True, 0.0)
+    assert await bucket.allow("1") == (True, 0.0)
+
+def test_token_buckets_are_shared():
+    assert get_token_bucket("rate:shared", 20, 60.0) is get_token_bucket("rate:shared", 20, 60.0)
+    assert get_token_bucket("rate:shared", 20, 60.0) is not get_token_bucket("rate:shared", 10, 60.0)
+
+def test_sync_checks_are_pipelined(fake_sync_redis):
+    checks = [(RedisTokenBucket("rate:first", 20, 60.0), "1"), (RedisTokenBucket("rate:second", 1, 60.0), "1")]
+
+    with freeze_time():
+        assert allow_many_sync(checks) == [(True, 0.0), (True, 0.0)]
+        assert fake_sync_redis.executed == 2
+
+        assert allow_many_sync(checks) == [(True, 0.0), (False, 60.0)]
+        assert fake_sync_redis.executed == 3
+
+@pytest.mark.django_db
+def test_throttle_refills_instead_of_sliding_window(fake_sync_redis):
+    class View(APIView):
+        authentication_classes = []
+        permission_classes = []
+        throttle_classes = [SignupRateThrottle, RefreshRateThrottle]
+
+        def get(self, request):
+            return Response()
+
+    view = View.as_view()
+    factory = APIRequestFactory()
+
+    with freeze_time() as frozen_time:
+        for _ in range(3):
+            assert view(factory.get("/", REMOTE_ADDR = "10.0.0.1")).status_code == 200
+        assert fake_sync_redis.executed == 4
+
+        response = view(factory.get("/", REMOTE_ADDR = "10.0.0.1"))
+        assert response.status_code == 429
+        assert response["Retry-After"] == "20"
+
+        frozen_time.tick(20)
+        assert view(factory.get("/", REMOTE_ADDR = "10.0.0.1")).status_code == 200
+        assert view(factory.get("/", REMOTE_ADDR = "10.0.0.1")).status_code == 429
\ No newline at end of file
@@ -1,4 +1,8 @@
-from django.test import TestCase
+from django.test import RequestFactory, TestCase
+
+from .. import middleware
+from ..user_agent import parse_user_agent
+from ..views.utils import readable_user_agent
 
 class JWTAuthCookieMiddleware(TestCase):
     def test_auth_header_is_added_when_access_token_cookie_exists(self):
@@ -11,4 +15,26 @@ class JWTAuthCookieMiddleware(TestCase):
     def test_auth_header_is_not_added_if_cookie_missing(self):
         response = self.client.get("/test/echo-auth/")
         self.assertEqual(response.status_code, 200)
-        self.assertIsNone(response.json()["auth"])
\ No newline at end of file
+        self.assertIsNone(response.json()["auth"])
+
+class RequestInfoMiddleware(TestCase):
+    user_agent = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+
+    def setUp(self):
+        parse_user_agent.cache_clear()
+
+    def test_user_agent_is_parsed_lazily_and_once(self):
+        request = RequestFactory().get("/", HTTP_USER_AGENT = self.user_agent, HTTP_X_FORWARDED_FOR = "127.0.0.2, 127.0.0.3")
+        middleware.RequestInfoMiddleware(lambda request: None).process_request(request)
+
+        self.assertEqual(request.ip_address, "127.0.0.2")
+        self.assertEqual(request.user_agent_raw, self.user_agent)
+        self.assertEqual(parse_user_agent.cache_info().currsize, 0)
+
+        self.assertEqual(request.browser, "Chrome")
+        self.assertEqual(request.os, "Windows")
+        self.assertEqual(str(request.device), "Device(family='Other', brand=None, model=None)")
+        self.assertEqual(readable_user_agent(self.user_agent), "Chrome on Windows")
+
+        cache_info = parse_user_agent.cache_info()
+        self.assertEqual((cache_info.misses, cache_info.hits), (1, 3))
\ No newline at end of file
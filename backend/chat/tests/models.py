@@ -3,12 +3,15 @@ from datetime import timedelta
 from django.contrib.auth import authenticate
 from django.contrib.auth.hashers import check_password
 from django.core.exceptions import ValidationError
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 from freezegun import freeze_time
 
 from .utils import create_user
 from .. import models
+from ..versions import get_messages_version
 
 class User(TestCase):
     def test_creation(self):
@@ -146,6 +149,52 @@ class UserPreferences(TestCase):
             self.assertEqual(dict(cm.exception), {"language": [f"Value '{l}' is not a valid choice."]})
             self.assertEqual(models.UserPreferences.objects.count(), 0)
 
+    def test_existing_user_with_bulk_create(self):
+        users = [create_user(f"test{i + 1}@example.com") for i in range(3)]
+        users[0].preferences.delete()
+        users[1].preferences.delete()
+
+        with self.assertRaises(ValidationError) as cm:
+            models.UserPreferences.objects.bulk_create([models.UserPreferences(user = u) for u in users])
+        self.assertEqual(cm.exception.message_dict, {"user": ["User preferences with this User already exists."]})
+
+        with self.assertRaises(ValidationError) as cm:
+            models.UserPreferences.objects.bulk_create([models.UserPreferences(user = users[0]) for _ in range(2)])
+        self.assertEqual(cm.exception.message_dict, {"user": ["User preferences with this User already exists."]})
+
+        self.assertEqual(models.UserPreferences.objects.count(), 1)
+
+    def test_bulk_create_checks_unique_fields_in_one_query(self):
+        users = [create_user(f"test{i + 1}@example.com") for i in range(10)]
+        models.UserPreferences.objects.all().delete()
+
+        with self.assertNumQueries(3):
+            models.UserPreferences.objects.bulk_create([models.UserPreferences(user = u) for u in users])
+        self.assertEqual(models.UserPreferences.objects.count(), 10)
+
+    def test_missing_user_with_bulk_create(self):
+        user = create_user()
+        user.preferences.delete()
+
+        with self.assertRaises(ValidationError) as cm:
+            models.UserPreferences.objects.bulk_create([models.UserPreferences(user = user), models.UserPreferences(user_id = 999)])
+        self.assertEqual(cm.exception.message_dict, {"user": ["user instance with id 999 is not a valid choice."]})
+
+        self.assertEqual(models.UserPreferences.objects.count(), 0)
+
+    def test_existing_user_with_bulk_update(self):
+        users = [create_user(f"test{i + 1}@example.com") for i in range(2)]
+        preferences = [u.preferences for u in users]
+
+        preferences[1].user = users[0]
+        with self.assertRaises(ValidationError) as cm:
+            models.UserPreferences.objects.bulk_update(preferences, ["user"])
+        self.assertEqual(cm.exception.message_dict, {"user": ["User preferences with this User already exists."]})
+
+        preferences[1].user = users[1]
+        with self.assertNumQueries(3):
+            models.UserPreferences.objects.bulk_update(preferences, ["user"])
+
     def test_invalid_languages_with_bulk_update(self):
         users = [create_user(f"test{i + 1}@example.com") for i in range(5)]
 
@@ -321,6 +370,22 @@ class Chat(TestCase):
             self.assertEqual(chat.last_modified_at(), bot_message.last_modified_at)
             self.assertNotEqual(chat.last_modified_at(), bot_message.created_at)
 
+    def test_update_fields_validation_is_cached(self):
+        user = create_user()
+        chat = user.chats.create(title = "Test chat")
+        message = chat.messages.create(text = "Hello!", is_from_user = True)
+
+        chat.pending_message = message
+        with self.assertNumQueries(3):
+            chat.save(update_fields = ["pending_message"])
+        with self.assertNumQueries(2):
+            chat.save(update_fields = ["pending_message"])
+
+        chat.title = "x" * 201
+        with self.assertRaises(ValidationError) as cm:
+            chat.save(update_fields = ["title"])
+        self.assertEqual(dict(cm.exception), {"title": ["Ensure this value has at most 200 characters (it has 201)."]})
+
 class Message(TestCase):
     def test_creation(self):
         user = create_user()
@@ -356,6 +421,141 @@ class Message(TestCase):
         self.assertEqual(dict(cm.exception), {"model": [f"Value '{m}' is not a valid choice."]})
         self.assertEqual(models.Message.objects.count(), 0)
 
+    def test_positions(self):
+        user = create_user()
+        chat1 = user.chats.create(title = "Chat 1")
+        chat2 = user.chats.create(title = "Chat 2")
+
+        self.assertEqual(chat1.messages.create(text = "Hello!", is_from_user = True).position, 0)
+        self.assertEqual(chat1.messages.create(text = "Hi!", is_from_user = False).position, 1)
+
+        models.Message.objects.bulk_create([
+            models.Message(chat = chat, text = f"Message {i + 1}", is_from_user = i % 2 == 0)
+            for chat in [chat1, chat2] for i in range(3)
+        ])
+        self.assertEqual(list(chat1.messages.order_by("position").values_list("position", "text")), [
+            (0, "Hello!"), (1, "Hi!"), (2, "Message 1"), (3, "Message 2"), (4, "Message 3")
+        ])
+        self.assertEqual(list(chat2.messages.order_by("position").values_list("position", "text")), [
+            (0, "Message 1"), (1, "Message 2"), (2, "Message 3")
+        ])
+
+    def test_positions_lock_chat(self):
+        user = create_user()
+        chat = user.chats.create(title = "Test chat")
+
+        with CaptureQueriesContext(connection) as context:
+            chat.messages.create(text = "Hello!", is_from_user = True)
+            models.Message.objects.bulk_create([models.Message(chat = chat, text = "Hi!", is_from_user = False)])
+
+        locks = [q["sql"] for q in context.captured_queries if "chat_chat" in q["sql"] and "FOR UPDATE" in q["sql"]]
+        self.assertEqual(len(locks), 2 if connection.features.has_select_for_update else 0)
+        self.assertEqual(list(chat.messages.order_by("position").values_list("position", flat = True)), [0, 1])
+
+    def test_window(self):
+        user = create_user()
+        chat = user.chats.create(title = "Test chat")
+        models.Message.objects.bulk_create([models.Message(chat = chat, text = f"Message {i}", is_from_user = True) for i in range(5)])
+
+        self.assertEqual([m.position for m in chat.messages.all().window(2)], [3, 4])
+        self.assertEqual([m.position for m in chat.messages.all().window(2, 3)], [1, 2])
+        self.assertEqual([m.position for m in chat.messages.all().window(10, 2)], [0, 1])
+
+        with self.assertNumQueries(1):
+            self.assertEqual(chat.messages.all().window(2, 0), [])
+
+    def test_version_is_bumped_on_commit(self):
+        user = create_user()
+        chat = user.chats.create(title = "Test chat")
+        version = get_messages_version(chat.uuid)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            message = chat.messages.create(text = "Hello!", is_from_user = True)
+        self.assertEqual(get_messages_version(chat.uuid), version)
+
+        for callback in callbacks:
+            callback()
+        self.assertGreater(get_messages_version(chat.uuid), version)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            message.text = "Hi!"
+            message.save(update_fields = ["text", "last_modified_at"], bump = False)
+        self.assertEqual(callbacks, [])
+
+    def test_deleting_file_uses_cached_message(self):
+        user = create_user()
+        chat = user.chats.create(title = "Test chat")
+        message = chat.messages.create(text = "Hello!", is_from_user = True)
+        message.files.create(name = "file.txt", content = b"content", content_type = "text/plain")
+
+        file = chat.get_message_files(message)[0]
+        with self.captureOnCommitCallbacks(execute = True):
+            with self.assertNumQueries(3):
+                file.delete()
+
+    def test_duplicate_position(self):
+        user = create_user()
+        chat = user.chats.create(title = "Test chat")
+        message = chat.messages.create(text = "Hello!", is_from_user = True)
+
+        with self.assertRaises(ValidationError) as cm:
+            chat.messages.create(text = "Hi!", is_from_user = False, position = message.position)
+        self.assertEqual(dict(cm.exception), {"__all__": ["Message with this Chat and Position already exists."]})
+
+    def test_update_fields_only_validates_those_fields(self):
+        user = create_user()
+        chat = user.chats.create(title = "Test chat")
+        message = chat.messages.create(text = "Hello!", is_from_user = False)
+
+        message.model = "invalid"
+        message.text = "Hi!"
+        message.save(update_fields = ["text"])
+
+        message.refresh_from_db()
+        self.assertEqual(message.text, "Hi!")
+        self.assertEqual(message.model, "")
+
+        message.model = "invalid"
+        with self.assertRaises(ValidationError) as cm:
+            message.save(update_fields = ["model"])
+        self.assertEqual(dict(cm.exception), {"model": ["Value 'invalid' is not a valid choice."]})
+
+    def test_update_fields_validation_cache_keeps_unique_checks(self):
+        user = create_user()
+        chat = user.chats.create(title = "Test chat")
+        message1 = chat.messages.create(text = "Hello!", is_from_user = True)
+        message2 = chat.messages.create(text = "Hi!", is_from_user = False)
+
+        message2.position = 5
+        message2.save(update_fields = ["position"])
+
+        models.Message.objects.filter(pk = message2.pk).update(position = 1)
+        models.Message.objects.filter(pk = message1.pk).update(position = 5)
+
+        with self.assertRaises(ValidationError) as cm:
+            message2.save(update_fields = ["position"])
+        self.assertEqual(dict(cm.exception), {"__all__": ["Message with this Chat and Position already exists."]})
+
+    def test_bulk_update_only_validates_those_fields(self):
+        user = create_user()
+        chat = user.chats.create(title = "Test chat")
+        messages = [chat.messages.create(text = "Hello!", is_from_user = False) for _ in range(2)]
+
+        for message in messages:
+            message.model = "invalid"
+            message.text = "Hi!"
+        models.Message.objects.bulk_update(messages, ["text"])
+        self.assertEqual(list(chat.messages.values_list("text", "model")), [("Hi!", ""), ("Hi!", "")])
+
+        with self.assertRaises(ValidationError) as cm:
+            models.Message.objects.bulk_update(messages, ["model"])
+        self.assertEqual(dict(cm.exception), {"model": ["Value 'invalid' is not a valid choice."]})
+
+        messages[1].position = messages[0].position
+        with self.assertRaises(ValidationError) as cm:
+            models.Message.objects.bulk_update(messages, ["position"])
+        self.assertEqual(dict(cm.exception), {"__all__": ["Message with this Chat and Position already exists."]})
+
     def test_invalid_models_with_bulk_create(self):
         user = create_user()
         chat = user.chats.create(title = "Test chat")
@@ -396,6 +596,7 @@ class GuestIdentity(TestCase):
             self.assertEqual(identity.created_at, timezone.now())
             self.assertEqual(identity.ip_address, "")
             self.assertEqual(identity.user_agent_hash, "e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495991b7852b855")
+            self.assertEqual(identity.token_fingerprint, models.derive_token_fingerprint(token))
 
             self.assertEqual(type(token), str)
             self.assertEqual(len(token), 43)
@@ -404,7 +605,7 @@ class GuestIdentity(TestCase):
             self.assertEqual(type(user), models.User)
 
             self.assertEqual(len(user.email), 42 + len("@example.com"))
-            self.assertEqual(len(user.password), 89)
+            self.assertFalse(user.has_usable_password())
             self.assertTrue(user.email.endswith("@example.com"))
             self.assertTrue(user.is_active)
             self.assertTrue(user.is_guest)
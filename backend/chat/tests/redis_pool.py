@@ -0,0 +1,91 @@
+import threading
+
+import pytest
+import redis as sync_redis
+from redis import asyncio as aioredis
+
+from .. import redis_pool
+from ..redis_pool import PoolMetrics, export_metrics, get_redis, get_sync_redis
+
+@pytest.fixture
+def unreachable_redis(settings, monkeypatch):
+    settings.REDIS_URL = "redis://127.0.0.1:1"
+    settings.REDIS_POOL = {"MAX_CONNECTIONS": 5, "HEALTH_CHECK_INTERVAL": 0, "SOCKET_TIMEOUT": 0.1}
+    monkeypatch.setattr(redis_pool, "_async_clients", redis_pool.weakref.WeakKeyDictionary())
+    monkeypatch.setattr(redis_pool, "_sync_client", None)
+    monkeypatch.setattr(redis_pool, "_metrics", {})
+
+@pytest.mark.asyncio
+async def test_fails_open_and_recovers(unreachable_redis, monkeypatch):
+    assert await get_redis() is None
+
+    metrics = export_metrics()[0]
+    assert metrics["name"] == "consumer"
+    assert metrics["healthy"] is False
+    assert metrics["failures"] == 1
+    assert metrics["max_connections"] == 5
+
+    async def ping(self, **kwargs):
+        return True
+    monkeypatch.setattr(aioredis.Redis, "ping", ping)
+
+    client = await get_redis()
+    assert client is not None
+    assert export_metrics()[0]["healthy"] is True
+
+def test_sync_fails_open(unreachable_redis):
+    assert get_sync_redis() is None
+    assert export_metrics()[0]["name"] == "throttle"
+    assert export_metrics()[0]["healthy"] is False
+
+def test_sync_health_check_does_not_block(unreachable_redis, settings, monkeypatch):
+    ping_started = threading.Event()
+    release_ping = threading.Event()
+    def ping(self, **kwargs):
+        ping_started.set()
+        release_ping.wait(5)
+        return True
+    monkeypatch.setattr(sync_redis.Redis, "ping", ping)
+    settings.REDIS_POOL = {**settings.REDIS_POOL, "HEALTH_CHECK_INTERVAL": 60}
+
+    thread = threading.Thread(target = get_sync_redis)
+    thread.start()
+    assert ping_started.wait(5)
+
+    other = threading.Thread(target = get_sync_redis)
+    other.start()
+    other.join(1)
+    blocked = other.is_alive()
+
+    release_ping.set()
+    thread.join()
+    other.join()
+    assert not blocked
+
+def test_pool_metrics():
+    metrics = PoolMetrics("test", 4)
+    metrics.acquired()
+    metrics.acquired()
+    metrics.observe(0.002)
+    metrics.released()
+    metrics.observe(0.004)
+
+    data = metrics.as_dict()
+    assert data["in_use"] == 1
+    assert data["peak_in_use"] == 2
+    assert data["saturation"] == 0.25
+    assert data["checkouts"] == 2
+    assert data["hold_avg_ms"] == pytest.approx(3)
+    assert data["hold_max_ms"] == pytest.approx(4)
+
+def test_failures_count_transitions():
+    metrics = PoolMetrics("test", 4)
+    metrics.mark_unhealthy(ConnectionError())
+    metrics.mark_unhealthy(ConnectionError())
+    metrics.mark_healthy()
+    metrics.mark_unhealthy(ConnectionError())
+    metrics.exhaust()
+
+    data = metrics.as_dict()
+    assert data["failures"] == 2
+    assert data["exhausted"] == 1
\ No newline at end of file
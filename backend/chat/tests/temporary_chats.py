@@ -0,0 +1,61 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from .utils import create_user
+from ..models import Chat
+from ..tasks import is_any_user_chat_pending, stop_user_pending_chats
+from ..temporary_chats import create_chat, discard_temporary_chat, get_chat, get_temporary_chat, get_user_temporary_chats
+
+class TemporaryChats(TestCase):
+    def setUp(self):
+        self.addCleanup(cache.clear)
+        self.user = create_user()
+
+    def test_loads_independent_copies(self):
+        chat = create_chat(self.user, "Chat 1", True)
+        chat.add_message("Hello!", True)
+
+        first = get_temporary_chat(self.user.pk, chat.uuid)
+        second = get_temporary_chat(self.user.pk, chat.uuid)
+        first.messages[0].text = "Changed"
+        self.assertEqual(second.messages[0].text, "Hello!")
+
+        first.messages[0].save()
+        self.assertEqual(get_temporary_chat(self.user.pk, chat.uuid).messages[0].text, "Changed")
+        self.assertEqual(Chat.objects.count(), 0)
+
+    def test_get_chat(self):
+        temporary_chat = create_chat(self.user, "Chat 1", True)
+        stored_chat = create_chat(self.user, "Chat 2", False)
+        other_user = create_user("someone@example.com")
+
+        self.assertEqual(get_chat(self.user, temporary_chat.uuid).uuid, temporary_chat.uuid)
+        self.assertEqual(get_chat(self.user, stored_chat.uuid), stored_chat)
+        self.assertIsNone(get_chat(other_user, temporary_chat.uuid))
+        self.assertIsNone(get_chat(other_user, stored_chat.uuid))
+
+    def test_stop_user_pending_chats(self):
+        chat = create_chat(self.user, "Chat 1", True)
+        chat.add_message("Hello!", True)
+        chat.pending_message = chat.add_message("", False)
+        chat.save()
+        self.assertEqual(get_user_temporary_chats(self.user.pk), {str(chat.uuid): 2})
+
+        stop_user_pending_chats(self.user)
+
+        self.assertIsNone(get_temporary_chat(self.user.pk, chat.uuid).pending_message)
+        self.assertEqual(get_user_temporary_chats(self.user.pk), {str(chat.uuid): None})
+        self.assertFalse(is_any_user_chat_pending(self.user))
+
+    def test_discard(self):
+        chat = create_chat(self.user, "Chat 1", True)
+        discard_temporary_chat(self.user.pk, chat.uuid)
+        self.assertIsNone(get_temporary_chat(self.user.pk, chat.uuid))
+        self.assertEqual(get_user_temporary_chats(self.user.pk), {})
+
+    @override_settings(TEMPORARY_CHATS = {"STORAGE": "database", "TTL": 60})
+    def test_database_storage(self):
+        chat = create_chat(self.user, "Chat 1", True)
+        self.assertIsInstance(chat, Chat)
+        self.assertTrue(chat.is_temporary)
+        self.assertEqual(get_chat(self.user, chat.uuid), chat)
\ No newline at end of file
@@ -1,7 +1,10 @@
 import uuid
 
+from asgiref.sync import sync_to_async
+
 from ..utils import ViewsTestCase
-from ...models import Chat, Message, User
+from ...views import chat as chat_views
+from ...models import Chat, Message, MessageFile, User
 
 class GetChat(ViewsTestCase):
     def test(self):
@@ -144,6 +147,52 @@ class GetChats(ViewsTestCase):
         ]
         self.assertEqual(response.json(), {"chats": expected_chats, "has_more": False})
 
+    def test_not_modified(self):
+        user = self.create_and_login_user()
+        chat = user.chats.create(title = "Greetings")
+
+        response = self.client.get("/api/get-chats/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Cache-Control"], "private, no-cache")
+        etag = response["ETag"]
+
+        response = self.client.get("/api/get-chats/", HTTP_IF_NONE_MATCH = etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+        self.assertEqual(response["ETag"], etag)
+
+        response = self.client.get("/api/get-chats/?archived=true", HTTP_IF_NONE_MATCH = etag)
+        self.assertEqual(response.status_code, 200)
+
+        chat.title = "Salutations"
+        with self.captureOnCommitCallbacks(execute = True):
+            chat.save()
+
+        response = self.client.get("/api/get-chats/", HTTP_IF_NONE_MATCH = etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["chats"][0]["title"], "Salutations")
+        self.assertNotEqual(response["ETag"], etag)
+
+        etag = response["ETag"]
+        self.client.delete("/api/delete-chats/")
+
+        response = self.client.get("/api/get-chats/", HTTP_IF_NONE_MATCH = etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"chats": [], "has_more": False})
+
+    async def test_async(self):
+        self.assertTrue(chat_views.GetChats.view_is_async)
+
+        user = await sync_to_async(self.create_and_login_user)()
+        for i in range(3):
+            await user.chats.acreate(title = f"Chat {i + 1}")
+
+        self.async_client.cookies = self.client.cookies
+        response = await self.async_client.get("/api/get-chats/?limit=2")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([(c["title"], c["index"]) for c in response.json()["chats"]], [("Chat 3", 0), ("Chat 2", 1)])
+        self.assertTrue(response.json()["has_more"])
+
 class SearchChats(ViewsTestCase):
     def test(self):
         user = self.create_and_login_user()
@@ -668,6 +717,20 @@ class DeleteChats(ViewsTestCase):
         self.assertEqual(Chat.objects.first().user, user1)
         self.assertEqual(Chat.objects.last().user, user1)
 
+    def test_deletes_messages_of_pending_chats(self):
+        user = self.create_and_login_user()
+        chat = user.chats.create(title = "Test chat")
+        message = chat.messages.create(text = "Hello!", is_from_user = True)
+        message.files.create(name = "file.txt", content = b"content", content_type = "text/plain")
+        chat.pending_message = chat.messages.create(text = "", is_from_user = False)
+        chat.save()
+
+        response = self.client.delete("/api/delete-chats/")
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(Chat.objects.count(), 0)
+        self.assertEqual(Message.objects.count(), 0)
+        self.assertEqual(MessageFile.objects.count(), 0)
+
 class StopPendingChats(ViewsTestCase):
     def test(self):
         user1 = self.create_and_login_user()
@@ -1,11 +1,17 @@
 import uuid
+from datetime import timedelta
 from unittest.mock import patch
+from urllib.parse import urlencode
 
+from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
 from django.test.client import encode_multipart, BOUNDARY
+from django.utils import timezone
 
-from ..utils import ViewsTestCase
+from ..utils import ViewsTestCase, create_user
 from ...models import Chat, Message, MessageFile, User
+from ...temporary_chats import create_chat, get_temporary_chat, get_user_temporary_chats
 
 class GetMessageFileContent(ViewsTestCase):
     def test(self):
@@ -89,6 +95,19 @@ class GetMessageFileIDs(ViewsTestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.json(), [[1, 2, 3, 4, 5], [6, 7, 8, 9, 10]])
 
+    def test_query_count_is_independent_of_message_count(self):
+        user = self.create_and_login_user()
+        chat = user.chats.create(title = "File Analysis")
+        for i in range(20):
+            message = chat.messages.create(text = f"Message {i + 1}", is_from_user = i % 2 == 0)
+            if i % 4 == 0:
+                message.files.create(name = "file.txt", content = b"content", content_type = "text/plain")
+
+        with self.assertNumQueries(3):
+            response = self.client.get(f"/api/get-message-file-ids/?chat_uuid={chat.uuid}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), [[i // 4 + 1] if i % 4 == 0 else [] for i in range(20)])
+
     def test_requires_chat_uuid(self):
         self.create_and_login_user()
         response = self.client.get(f"/api/get-message-file-ids/")
@@ -148,6 +167,171 @@ class GetMessages(ViewsTestCase):
         ]
         self.assertEqual(response.json(), expected_messages)
 
+    def test_not_modified(self):
+        user = self.create_and_login_user()
+        chat = user.chats.create(title = "Test chat")
+        chat.messages.create(text = "Hello!", is_from_user = True)
+
+        response = self.client.get(f"/api/get-messages/?chat_uuid={chat.uuid}")
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+
+        response = self.client.get(f"/api/get-messages/?chat_uuid={chat.uuid}", HTTP_IF_NONE_MATCH = f"W/{etag}")
+        self.assertEqual(response.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute = True):
+            bot_message = chat.messages.create(text = "", is_from_user = False)
+            bot_message.text = "Hi!"
+            bot_message.save(update_fields = ["text"])
+
+        response = self.client.get(f"/api/get-messages/?chat_uuid={chat.uuid}", HTTP_IF_NONE_MATCH = etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([m["text"] for m in response.json()], ["Hello!", "Hi!"])
+
+        etag = response["ETag"]
+        chat_uuid = chat.uuid
+        with self.captureOnCommitCallbacks(execute = True):
+            chat.delete()
+
+        response = self.client.get(f"/api/get-messages/?chat_uuid={chat_uuid}", HTTP_IF_NONE_MATCH = etag)
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(response.has_header("ETag"))
+
+class GetMessageWindow(ViewsTestCase):
+    def test(self):
+        user = self.create_and_login_user()
+        response = self.client.get(f"/api/get-message-window/?chat_uuid={uuid.uuid4()}")
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json(), {"detail": "Chat was not found."})
+
+        chat = user.chats.create(title = "Test chat")
+        response = self.client.get(f"/api/get-message-window/?chat_uuid={chat.uuid}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"messages": [], "has_more": False})
+
+        Message.objects.bulk_create([Message(chat = chat, text = f"Message {i}", is_from_user = i % 2 == 0) for i in range(5)])
+        message = chat.messages.get(position = 4)
+        message.files.create(name = "file.txt", content = b"content", content_type = "text/plain")
+
+        response = self.client.get(f"/api/get-message-window/?chat_uuid={chat.uuid}&limit=2")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([(m["index"], m["text"]) for m in response.json()["messages"]], [(3, "Message 3"), (4, "Message 4")])
+        self.assertEqual(response.json()["messages"][1]["files"][0]["content_size"], 7)
+        self.assertTrue(response.json()["has_more"])
+
+        response = self.client.get(f"/api/get-message-window/?chat_uuid={chat.uuid}&limit=2&before=3")
+        self.assertEqual([m["index"] for m in response.json()["messages"]], [1, 2])
+        self.assertTrue(response.json()["has_more"])
+
+        response = self.client.get(f"/api/get-message-window/?chat_uuid={chat.uuid}&limit=2&before=1")
+        self.assertEqual([m["index"] for m in response.json()["messages"]], [0])
+        self.assertFalse(response.json()["has_more"])
+
+        response = self.client.get(f"/api/get-message-window/?chat_uuid={chat.uuid}&limit=201")
+        self.assertEqual(response.status_code, 400)
+
+    def test_query_count_is_independent_of_message_count(self):
+        user = self.create_and_login_user()
+        chat = user.chats.create(title = "Test chat")
+        Message.objects.bulk_create([Message(chat = chat, text = "Hello!", is_from_user = True) for _ in range(100)])
+
+        with self.assertNumQueries(4):
+            response = self.client.get(f"/api/get-message-window/?chat_uuid={chat.uuid}&limit=10")
+        self.assertEqual(len(response.json()["messages"]), 10)
+
+class GetMessageChanges(ViewsTestCase):
+    def test(self):
+        user = self.create_and_login_user()
+        response = self.client.get(f"/api/get-message-changes/?chat_uuid={uuid.uuid4()}")
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json(), {"detail": "Chat was not found."})
+
+        chat = user.chats.create(title = "Test chat")
+        response = self.client.get(f"/api/get-message-changes/?chat_uuid={chat.uuid}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"messages": [], "removed_file_ids": [], "message_count": 0, "cursor": None})
+
+        user_message = chat.messages.create(text = "Hello!", is_from_user = True)
+        message_file = user_message.files.create(name = "file.txt", content = b"content", content_type = "text/plain")
+        bot_message = chat.messages.create(text = "Hi!", is_from_user = False)
+
+        now = timezone.now()
+        Message.objects.filter(pk = user_message.pk).update(last_modified_at = now - timedelta(hours = 2))
+        Message.objects.filter(pk = bot_message.pk).update(last_modified_at = now - timedelta(hours = 1))
+
+        response = self.client.get(f"/api/get-message-changes/?chat_uuid={chat.uuid}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([m["index"] for m in response.json()["messages"]], [0, 1])
+        self.assertEqual(response.json()["messages"][0]["files"][0]["id"], message_file.id)
+        self.assertEqual(response.json()["message_count"], 2)
+
+        since = response.json()["cursor"]
+        response = self.client.get(f"/api/get-message-changes/?{urlencode({"chat_uuid": chat.uuid, "since": since})}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["messages"], [
+            {"index": 1, "id": bot_message.id, "text": "Hi!", "is_from_user": False, "files": [], "model": ""}
+        ])
+        self.assertEqual(response.json()["removed_file_ids"], [])
+        self.assertEqual(response.json()["cursor"], since)
+
+        user_message.refresh_from_db()
+        message_file_id = message_file.id
+        message_file.delete()
+        user_message.text = "Hello there!"
+        user_message.save()
+
+        response = self.client.get(f"/api/get-message-changes/?{urlencode({"chat_uuid": chat.uuid, "since": since})}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([(m["index"], m["text"]) for m in response.json()["messages"]], [(0, "Hello there!"), (1, "Hi!")])
+        self.assertEqual(response.json()["messages"][0]["files"], [])
+        self.assertEqual(response.json()["removed_file_ids"], [message_file_id])
+        self.assertGreater(response.json()["cursor"], since)
+
+        since = response.json()["cursor"]
+        response = self.client.get(f"/api/get-message-changes/?{urlencode({"chat_uuid": chat.uuid, "since": since})}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([m["index"] for m in response.json()["messages"]], [0])
+
+    def test_cursor_overlap(self):
+        user = self.create_and_login_user()
+        chat = user.chats.create(title = "Test chat")
+        message = chat.messages.create(text = "Hello!", is_from_user = True)
+        late_message = chat.messages.create(text = "Hi!", is_from_user = False)
+
+        now = timezone.now()
+        Message.objects.filter(pk = message.pk).update(last_modified_at = now)
+        Message.objects.filter(pk = late_message.pk).update(last_modified_at = now - timedelta(seconds = 3))
+
+        since = now.isoformat()
+        response = self.client.get(f"/api/get-message-changes/?{urlencode({"chat_uuid": chat.uuid, "since": since})}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([m["index"] for m in response.json()["messages"]], [0, 1])
+
+        Message.objects.filter(pk = late_message.pk).update(last_modified_at = now - timedelta(seconds = 10))
+        with self.captureOnCommitCallbacks(execute = True):
+            message.text = "Hello there!"
+            message.save()
+        response = self.client.get(f"/api/get-message-changes/?{urlencode({"chat_uuid": chat.uuid, "since": since})}")
+        self.assertEqual([m["index"] for m in response.json()["messages"]], [0])
+
+    def test_since_older_than_deleted_file_retention(self):
+        user = self.create_and_login_user()
+        chat = user.chats.create(title = "Test chat")
+        message = chat.messages.create(text = "Hello!", is_from_user = True)
+        Message.objects.filter(pk = message.pk).update(last_modified_at = timezone.now() - timedelta(days = 40))
+
+        since = (timezone.now() - timedelta(days = 31)).isoformat()
+        response = self.client.get(f"/api/get-message-changes/?{urlencode({"chat_uuid": chat.uuid, "since": since})}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([m["index"] for m in response.json()["messages"]], [0])
+
+    def test_temporary_chat(self):
+        user = self.create_and_login_user()
+        self.addCleanup(cache.clear)
+        chat = create_chat(user, "Temporary chat", True)
+        response = self.client.get(f"/api/get-message-changes/?chat_uuid={chat.uuid}")
+        self.assertEqual(response.status_code, 404)
+
 class NewMessage(ViewsTestCase):
     @patch("chat.views.message.generate_pending_message_in_chat")
     def test(self, mock_generate):
@@ -305,6 +489,7 @@ class NewMessage(ViewsTestCase):
                 files.append(SimpleUploadedFile(f"file{i + 1}.txt", bytes([b % 255 for b in range(s)]), "text/plain"))
             post_and_assert(files)
 
+    @override_settings(TEMPORARY_CHATS = {"STORAGE": "database", "TTL": 60})
     @patch("chat.views.message.is_any_user_chat_pending", return_value = False)
     @patch("chat.views.message.generate_pending_message_in_chat")
     def test_temporary_chat(self, _1, _2):
@@ -334,6 +519,52 @@ class NewMessage(ViewsTestCase):
         self.assertFalse(bot_message.is_from_user)
         self.assertEqual(bot_message.model, "Qwen3-VL:4B")
 
+    @patch("chat.views.message.generate_pending_message_in_chat")
+    def test_temporary_chat_in_cache(self, mock_generate):
+        self.addCleanup(cache.clear)
+        user = self.create_and_login_user()
+
+        file = SimpleUploadedFile("file.txt", b"hello world", "text/plain")
+        response = self.client.post("/api/new-message/", {"text": "Hello!", "temporary": True, "files": [file]}, format = "multipart")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["title"], "Chat 1")
+        self.assertEqual(response.json()["pending_message_id"], 2)
+        self.assertTrue(response.json()["is_temporary"])
+
+        self.assertEqual(Chat.objects.count(), 0)
+        self.assertEqual(Message.objects.count(), 0)
+        self.assertEqual(MessageFile.objects.count(), 0)
+
+        chat = get_temporary_chat(user.pk, response.json()["uuid"])
+        self.assertEqual([(m.text, m.is_from_user, m.model) for m in chat.messages], [("Hello!", True, ""), ("", False, "Qwen3-VL:4B")])
+        self.assertEqual([(f.name, f.content, f.content_type) for f in chat.messages[0].files], [("file.txt", b"hello world", "text/plain")])
+        self.assertIs(chat.pending_message, chat.messages[1])
+        self.assertEqual(get_user_temporary_chats(user.pk), {str(chat.uuid): 2})
+        self.assertEqual(mock_generate.call_args[0][0].uuid, chat.uuid)
+
+        chat.messages[1].text = "Hi!"
+        chat.pending_message = None
+        chat.save()
+
+        response = self.client.post("/api/new-message/", {"chat_uuid": str(chat.uuid), "text": "How are you?"}, format = "multipart")
+        self.assertEqual(response.status_code, 200)
+
+        chat = get_temporary_chat(user.pk, chat.uuid)
+        self.assertEqual([m.text for m in chat.messages], ["Hello!", "Hi!", "How are you?", ""])
+        self.assertIs(chat.pending_message, chat.messages[3])
+        self.assertEqual(Chat.objects.count(), 0)
+
+    def test_temporary_chat_of_other_user(self):
+        self.addCleanup(cache.clear)
+        other_user = create_user("someone@example.com")
+        chat = create_chat(other_user, "Chat 1", True)
+
+        self.create_and_login_user()
+        response = self.client.post("/api/new-message/", {"chat_uuid": str(chat.uuid), "text": "Hello!"}, format = "multipart")
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json(), {"detail": "Chat was not found."})
+        self.assertEqual(len(get_temporary_chat(other_user.pk, chat.uuid).messages), 0)
+
 class EditMessage(ViewsTestCase):
     @patch("chat.views.message.generate_pending_message_in_chat")
     def test(self, mock_generate):
@@ -553,6 +784,36 @@ class EditMessage(ViewsTestCase):
         self.assertEqual(Message.objects.count(), 2)
         self.assertEqual(Message.objects.last().text, "")
 
+    @patch("chat.views.message.generate_pending_message_in_chat")
+    def test_temporary_chat_in_cache(self, mock_generate):
+        self.addCleanup(cache.clear)
+        user = self.create_and_login_user()
+        chat = create_chat(user, "Chat 1", True)
+        chat.add_message("Describe the files.", True, files = [SimpleUploadedFile(f"File {i + 1}.txt", f"Content {i + 1}".encode(), "text/plain") for i in range(3)])
+        chat.add_message("The files are about...", False, "Qwen3-VL:4B")
+
+        body = encode_multipart(
+            BOUNDARY,
+            {
+                "chat_uuid": str(chat.uuid),
+                "text": "Summarize the files.",
+                "index": 0,
+                "added_files": [SimpleUploadedFile("File 4.txt", b"Content 4", "text/plain")],
+                "removed_file_ids": [2]
+            }
+        )
+        response = self.client.patch("/api/edit-message/", body, f"multipart/form-data; boundary={BOUNDARY}")
+        self.assertEqual(response.status_code, 200)
+
+        chat = get_temporary_chat(user.pk, chat.uuid)
+        message, bot_message = chat.messages
+        self.assertEqual(message.text, "Summarize the files.")
+        self.assertEqual([(f.id, f.name) for f in message.files], [(1, "File 1.txt"), (3, "File 3.txt"), (4, "File 4.txt")])
+        self.assertEqual(bot_message.text, "")
+        self.assertIs(chat.pending_message, bot_message)
+        self.assertEqual(MessageFile.objects.count(), 0)
+        mock_generate.assert_called_once()
+
 class RegenerateMessage(ViewsTestCase):
     @patch("chat.views.message.generate_pending_message_in_chat")
     def test(self, mock_generate):
@@ -589,6 +850,34 @@ class RegenerateMessage(ViewsTestCase):
         self.assertEqual(mock_generate.call_args[0][0], chat)
         self.assertTrue(mock_generate.call_args[1]["should_randomize"])
 
+    @patch("chat.views.message.generate_pending_message_in_chat")
+    def test_temporary_chat_in_cache(self, mock_generate):
+        self.addCleanup(cache.clear)
+        user = self.create_and_login_user()
+        chat = create_chat(user, "Chat 1", True)
+        chat.add_message("Hello!", True)
+        chat.add_message("Hello! How can I help you today?", False, "Qwen3-VL:4B")
+
+        body = encode_multipart(BOUNDARY, {"chat_uuid": str(chat.uuid), "index": 1, "model": "Gemma3:1B"})
+        response = self.client.patch("/api/regenerate-message/", body, f"multipart/form-data; boundary={BOUNDARY}")
+        self.assertEqual(response.status_code, 200)
+
+        chat = get_temporary_chat(user.pk, chat.uuid)
+        bot_message = chat.messages[1]
+        self.assertEqual(bot_message.text, "")
+        self.assertEqual(bot_message.model, "Gemma3:1B")
+        self.assertIs(chat.pending_message, bot_message)
+        self.assertEqual(Message.objects.count(), 0)
+        mock_generate.assert_called_once()
+        self.assertTrue(mock_generate.call_args[1]["should_randomize"])
+
+        chat.pending_message = None
+        chat.save()
+        body = encode_multipart(BOUNDARY, {"chat_uuid": str(chat.uuid), "index": 2, "model": "Gemma3:1B"})
+        response = self.client.patch("/api/regenerate-message/", body, f"multipart/form-data; boundary={BOUNDARY}")
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json(), {"detail": "Index out of range."})
+
     @patch("chat.views.message.is_any_user_chat_pending", return_value = True)
     def test_cannot_regenerate_while_a_chat_is_pending(self, _):
         self.create_and_login_user()
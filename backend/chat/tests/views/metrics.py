@@ -0,0 +1,21 @@
+from ..utils import ViewsTestCase, create_user
+
+class RedisMetrics(ViewsTestCase):
+    def test(self):
+        user = create_user()
+        user.is_staff = True
+        user.save()
+        self.login_user()
+
+        response = self.client.get("/api/redis-metrics/")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("pools", response.json())
+
+    def test_requires_staff(self):
+        self.create_and_login_user()
+        response = self.client.get("/api/redis-metrics/")
+        self.assertEqual(response.status_code, 403)
+
+    def test_requires_login(self):
+        response = self.client.get("/api/redis-metrics/")
+        self.assertEqual(response.status_code, 401)
\ No newline at end of file
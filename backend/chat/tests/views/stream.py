@@ -0,0 +1,122 @@
+import asyncio
+import json
+import uuid
+
+from asgiref.sync import sync_to_async
+from channels.layers import get_channel_layer
+
+from ..utils import ViewsTestCase, create_user
+from ...events import asend_user_event, asend_user_events
+from ...tasks import opened_chats
+
+class StreamChats(ViewsTestCase):
+    def test_requires_authentication(self):
+        response = self.client.get(f"/api/stream-chats/?chat_uuid={uuid.uuid4()}")
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json(), {"detail": "Authentication credentials were not provided."})
+
+    def test_requires_chat_or_events(self):
+        self.create_and_login_user()
+        response = self.client.get("/api/stream-chats/")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"detail": "At least one chat UUID or events=true is required."})
+
+    def test_invalid_chat_uuid(self):
+        self.create_and_login_user()
+        response = self.client.get("/api/stream-chats/?chat_uuid=invalid")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"detail": "Invalid chat UUID."})
+
+    def test_chat_of_other_user(self):
+        other_user = create_user("someone@example.com")
+        chat = other_user.chats.create(title = "Chat")
+
+        self.create_and_login_user()
+        response = self.client.get(f"/api/stream-chats/?chat_uuid={chat.uuid}")
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json(), {"detail": "Chat was not found."})
+
+    def test_too_many_chats(self):
+        user = self.create_and_login_user()
+        chats = [user.chats.create(title = f"Chat {i + 1}") for i in range(21)]
+        response = self.client.get(f"/api/stream-chats/?{"&".join([f"chat_uuid={chat.uuid}" for chat in chats])}")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"detail": "At most 20 chats can be streamed at once."})
+
+    async def test_streams_events_of_several_chats(self):
+        user = await sync_to_async(self.create_and_login_user)()
+        chat1 = await user.chats.acreate(title = "Chat 1")
+        chat2 = await user.chats.acreate(title = "Chat 2")
+
+        self.async_client.cookies = self.client.cookies
+        response = await self.async_client.get(f"/api/stream-chats/?chat_uuid={chat1.uuid}&chat_uuid={chat2.uuid}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        self.assertEqual(response["Cache-Control"], "no-cache")
+
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), b"retry: 3000\n\n")
+        self.assertIn(str(chat1.uuid), opened_chats)
+        self.assertIn(str(chat2.uuid), opened_chats)
+
+        channel_layer = get_channel_layer()
+
+        await channel_layer.group_send(
+            f"chat_{chat1.uuid}",
+            {"type": "send_token", "chat_uuid": str(chat1.uuid), "token": "Hello", "message_index": 1, "seq": 1, "stream_id": "abc"}
+        )
+        data = {"chat_uuid": str(chat1.uuid), "token": "Hello", "message_index": 1, "seq": 1, "stream_id": "abc"}
+        self.assertEqual(await anext(stream), f"id: {chat1.uuid}:abc:1\nevent: token\ndata: {json.dumps(data)}\n\n".encode())
+
+        await channel_layer.group_send(f"chat_{chat2.uuid}", {"type": "send_title", "chat_uuid": str(chat2.uuid), "title": "Greetings"})
+        data = {"chat_uuid": str(chat2.uuid), "title": "Greetings"}
+        self.assertEqual(await anext(stream), f"event: title\ndata: {json.dumps(data)}\n\n".encode())
+
+        await channel_layer.group_send(f"chat_{chat1.uuid}", {"type": "send_end", "chat_uuid": str(chat1.uuid)})
+        data = {"chat_uuid": str(chat1.uuid)}
+        self.assertEqual(await anext(stream), f"event: end\ndata: {json.dumps(data)}\n\n".encode())
+
+        await self.close_stream(stream)
+        self.assertNotIn(str(chat1.uuid), opened_chats)
+        self.assertNotIn(str(chat2.uuid), opened_chats)
+
+    async def test_streams_user_events(self):
+        user = await sync_to_async(self.create_and_login_user)()
+
+        self.async_client.cookies = self.client.cookies
+        response = await self.async_client.get("/api/stream-chats/?events=true")
+        self.assertEqual(response.status_code, 200)
+
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), b"retry: 3000\n\n")
+
+        await asend_user_event(user.pk, "chat_renamed", chat_uuid = "123", title = "New Title")
+        data = {"chat_uuid": "123", "title": "New Title"}
+        self.assertEqual(await anext(stream), f"event: chat_renamed\ndata: {json.dumps(data)}\n\n".encode())
+
+        await asend_user_events(user.pk, [("chat_pending", {"chat_uuid": "123", "pending_message_id": None}), ("chats_deleted", {})])
+        data = {"chat_uuid": "123", "pending_message_id": None}
+        self.assertEqual(await anext(stream), f"event: chat_pending\ndata: {json.dumps(data)}\n\nevent: chats_deleted\ndata: {{}}\n\n".encode())
+
+        await self.close_stream(stream)
+
+    async def test_closing_stream_deletes_temporary_chat(self):
+        user = await sync_to_async(self.create_and_login_user)()
+        chat = await user.chats.acreate(title = "Chat", is_temporary = True)
+
+        self.async_client.cookies = self.client.cookies
+        response = await self.async_client.get(f"/api/stream-chats/?chat_uuid={chat.uuid}")
+        self.assertEqual(response.status_code, 200)
+
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), b"retry: 3000\n\n")
+
+        await self.close_stream(stream)
+        self.assertFalse(await user.chats.filter(uuid = chat.uuid).aexists())
+
+    async def close_stream(self, stream):
+        task = asyncio.create_task(anext(stream))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
\ No newline at end of file
@@ -3,18 +3,22 @@ import secrets
 import uuid
 from datetime import datetime, timedelta, timezone as dt_timezone
 
+from django.conf import settings
 from django.contrib.auth.hashers import check_password
 from django.core import mail
+from django.core.cache import cache
 from django.utils import timezone
 from freezegun import freeze_time
 from rest_framework_simplejwt.backends import TokenBackend
 from rest_framework_simplejwt.settings import api_settings as jwt_settings
 from rest_framework_simplejwt.tokens import RefreshToken
-from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
 
 from ..utils import ViewsTestCase, create_user
-from ...models import EmailVerificationToken, GuestIdentity, PreAuthToken, User, UserMFA, UserSession, derive_token_fingerprint
+from ...cleanup import collect_garbage, purge_deleted_accounts
+from ...models import AccountDeletion, Chat, EmailVerificationToken, GuestIdentity, PreAuthToken, User, UserMFA, UserSession, derive_token_fingerprint
 from ...urls.api import urlpatterns
+from ...versions import get_chats_version, get_user_version
 
 class Signup(ViewsTestCase):
     def test(self):
@@ -386,6 +390,46 @@ class LogoutAllSessions(ViewsTestCase):
         for s in UserSession.objects.all():
             self.assertIsNotNone(s.logout_at)
 
+    def test_revokes_all_tokens(self):
+        with freeze_time(timezone.now() - timedelta(minutes = 1)):
+            user = self.create_and_login_user()
+            access_token = self.client.cookies["access_token"].value
+            refresh_tokens = [RefreshToken.for_user(user) for _ in range(3)]
+
+        response = self.client.post("/api/logout-all-sessions/")
+        self.assertEqual(response.status_code, 200)
+
+        user.refresh_from_db()
+        self.assertIsNotNone(user.tokens_valid_after)
+        self.assertEqual(BlacklistedToken.objects.count(), 4)
+        for refresh in refresh_tokens:
+            self.client.cookies["refresh_token"] = str(refresh)
+            self.assertEqual(self.client.post("/api/refresh/").status_code, 401)
+
+        self.client.cookies["access_token"] = access_token
+        response = self.client.get("/api/me/")
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json()["code"], "token_revoked")
+
+        with freeze_time(timezone.now() + timedelta(seconds = 1)):
+            self.login_user()
+            response = self.client.get("/api/me/")
+            self.assertEqual(response.status_code, 200)
+
+    def test_revokes_tokens_issued_in_the_same_second(self):
+        with freeze_time(datetime(2026, 1, 1, 12, 0, 0, 100000, dt_timezone.utc)) as frozen_time:
+            self.create_and_login_user()
+            access_token = self.client.cookies["access_token"].value
+
+            frozen_time.tick(timedelta(milliseconds = 500))
+            response = self.client.post("/api/logout-all-sessions/")
+            self.assertEqual(response.status_code, 200)
+
+            self.client.cookies["access_token"] = access_token
+            response = self.client.get("/api/me/")
+            self.assertEqual(response.status_code, 401)
+            self.assertEqual(response.json()["code"], "token_revoked")
+
 class Refresh(ViewsTestCase):
     def test(self):
         refresh = RefreshToken.for_user(create_user())
@@ -984,7 +1028,8 @@ class Me(ViewsTestCase):
         }
 
         for key, value in modifications.items():
-            response = self.client.patch("/api/me/", {key: value}, "application/json")
+            with self.captureOnCommitCallbacks(execute = True):
+                response = self.client.patch("/api/me/", {key: value}, "application/json")
             self.assertEqual(response.status_code, 200)
 
             expected_json["preferences"][key] = value
@@ -993,6 +1038,45 @@ class Me(ViewsTestCase):
             self.assertEqual(response.status_code, 200)
             self.assertEqual(response.json(), expected_json)
 
+    def test_cached(self):
+        user = self.create_and_login_user()
+
+        with self.assertNumQueries(4):
+            response = self.client.get("/api/me/")
+        self.assertEqual(response.status_code, 200)
+
+        with self.assertNumQueries(1):
+            cached_response = self.client.get("/api/me/")
+        self.assertEqual(cached_response.json(), response.json())
+
+        with self.captureOnCommitCallbacks(execute = True):
+            user.mfa.enable()
+        response = self.client.get("/api/me/")
+        self.assertTrue(response.json()["mfa"]["is_enabled"])
+
+        with self.captureOnCommitCallbacks(execute = True):
+            user.sessions.create(ip_address = "127.0.0.2")
+        response = self.client.get("/api/me/")
+        self.assertEqual(len(response.json()["sessions"]), 2)
+
+    def test_not_modified(self):
+        self.create_and_login_user()
+
+        response = self.client.get("/api/me/")
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/me/", HTTP_IF_NONE_MATCH = etag)
+        self.assertEqual(response.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute = True):
+            self.client.patch("/api/me/", {"theme": "Dark"}, "application/json")
+
+        response = self.client.get("/api/me/", HTTP_IF_NONE_MATCH = etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["preferences"]["theme"], "Dark")
+
     def test_with_expired_cookie(self):
         refresh = RefreshToken.for_user(create_user())
         self.client.cookies["access_token"] = str(refresh.access_token)
@@ -1048,23 +1132,103 @@ class DeleteAccount(ViewsTestCase):
         self.create_and_login_user()
         response = self.client.delete("/api/delete-account/", {"password": "testpassword"}, "application/json")
         self.assertEqual(response.status_code, 204)
-        self.assertEqual(User.objects.count(), 0)
+        self.assertEqual(User.objects.filter(is_active = True).count(), 0)
 
         user1 = self.create_and_login_user("someone@example.com")
 
         self.create_and_login_user()
         response = self.client.delete("/api/delete-account/", {"password": "testpassword"}, "application/json")
         self.assertEqual(response.status_code, 204)
-        self.assertEqual(User.objects.count(), 1)
-        self.assertEqual(User.objects.first(), user1)
+        self.assertEqual(list(User.objects.filter(is_active = True)), [user1])
 
         user2 = self.create_and_login_user()
         user2.mfa.setup()
         user2.mfa.enable()
         response = self.client.delete("/api/delete-account/", {"password": "testpassword", "mfa_code": UserMFA.generate_code(user2.mfa.secret)}, "application/json")
         self.assertEqual(response.status_code, 204)
-        self.assertEqual(User.objects.count(), 1)
-        self.assertEqual(User.objects.first(), user1)
+        self.assertEqual(list(User.objects.filter(is_active = True)), [user1])
+
+        self.assertEqual(purge_deleted_accounts(), 3)
+        self.assertEqual(list(User.objects.all()), [user1])
+        self.assertEqual(AccountDeletion.objects.filter(user__isnull = True, completed_at__isnull = False).count(), 3)
+
+    def test_deactivates_account_before_purging_data(self):
+        user = self.create_and_login_user()
+        for i in range(3):
+            chat = user.chats.create(title = f"Chat {i + 1}")
+            message = chat.messages.create(text = "Hello!", is_from_user = True)
+            message.files.create(name = "file.txt", content = b"content", content_type = "text/plain")
+
+        response = self.client.delete("/api/delete-account/", {"password": "testpassword"}, "application/json")
+        self.assertEqual(response.status_code, 204)
+
+        user.refresh_from_db()
+        self.assertFalse(user.is_active)
+        self.assertNotEqual(user.email, "test@example.com")
+        self.assertFalse(user.has_usable_password())
+        self.assertFalse(user.sessions.filter(logout_at__isnull = True).exists())
+        self.assertEqual(user.chats.count(), 3)
+
+        response = self.client.get("/api/me/")
+        self.assertEqual(response.status_code, 401)
+
+        self.create_and_login_user()
+        get_user_version(user.pk)
+        get_chats_version(user.pk)
+
+        with self.settings(CLEANUP = {**settings.CLEANUP, "CHAT_BATCH_SIZE": 2, "BATCH_PAUSE": 0}):
+            self.assertEqual(purge_deleted_accounts(), 1)
+
+        deletion = AccountDeletion.objects.get()
+        self.assertIsNone(deletion.user)
+        self.assertEqual(deletion.deleted_chats, 3)
+        self.assertIsNotNone(deletion.completed_at)
+        self.assertFalse(User.objects.filter(pk = user.pk).exists())
+        self.assertEqual(Chat.objects.count(), 0)
+        self.assertIsNone(cache.get(f"user_version:{user.pk}"))
+        self.assertIsNone(cache.get(f"chats_version:{user.pk}"))
+
+        self.assertEqual(purge_deleted_accounts(), 0)
+
+    def test_purge_resumes_after_max_per_run(self):
+        user = self.create_and_login_user()
+        for i in range(4):
+            user.chats.create(title = f"Chat {i + 1}")
+
+        response = self.client.delete("/api/delete-account/", {"password": "testpassword"}, "application/json")
+        self.assertEqual(response.status_code, 204)
+
+        with self.settings(CLEANUP = {**settings.CLEANUP, "CHAT_BATCH_SIZE": 2, "BATCH_PAUSE": 0, "DELETED_CHATS_MAX_PER_RUN": 3}):
+            self.assertEqual(purge_deleted_accounts(), 0)
+
+            deletion = AccountDeletion.objects.get()
+            self.assertEqual(deletion.deleted_chats, 3)
+            self.assertIsNone(deletion.completed_at)
+            self.assertTrue(User.objects.filter(pk = user.pk).exists())
+
+            self.assertEqual(purge_deleted_accounts(), 1)
+
+        deletion.refresh_from_db()
+        self.assertEqual(deletion.deleted_chats, 4)
+        self.assertIsNotNone(deletion.completed_at)
+        self.assertFalse(User.objects.filter(pk = user.pk).exists())
+
+    def test_guest(self):
+        response = self.client.post("/api/authenticate-as-guest/")
+        self.assertEqual(response.status_code, 201)
+        guest_token = self.client.cookies["guest_token"].value
+
+        response = self.client.delete("/api/delete-account/")
+        self.assertEqual(response.status_code, 204)
+        self.assertIsNone(GuestIdentity.get_by_token(guest_token))
+
+        counts = collect_garbage(now = timezone.now() + timedelta(days = 2))
+        self.assertEqual((counts["guest_users"], counts["deleted_accounts"]), (0, 1))
+
+        deletion = AccountDeletion.objects.get()
+        self.assertIsNone(deletion.user)
+        self.assertIsNotNone(deletion.completed_at)
+        self.assertEqual(User.objects.count(), 0)
 
     def test_requires_password(self):
         self.create_and_login_user()
@@ -1253,7 +1417,7 @@ class AuthenticateAsGuest(ViewsTestCase):
             self.assertEqual(len(cookies["guest_token"].value), 43)
 
         self.assertEqual(len(user.email), 42 + len("@example.com"))
-        self.assertEqual(len(user.password), 89)
+        self.assertFalse(user.has_usable_password())
         self.assertTrue(user.email.endswith("@example.com"))
         self.assertTrue(user.is_active)
         self.assertTrue(user.is_guest)
@@ -1302,7 +1466,7 @@ class AuthenticateAsGuest(ViewsTestCase):
         user: User = User.objects.first()
         self.assertEqual(identity.user, user)
         self.assertEqual(len(user.email), 42 + len("@example.com"))
-        self.assertEqual(len(user.password), 89)
+        self.assertFalse(user.has_usable_password())
         self.assertTrue(user.email.endswith("@example.com"))
         self.assertTrue(user.is_active)
         self.assertTrue(user.is_guest)
@@ -1317,6 +1481,21 @@ class AuthenticateAsGuest(ViewsTestCase):
         response = self.client.get("/api/me/")
         self.assertEqual(response.status_code, 200)
 
+    def test_existing_guest_token_among_several_guests(self):
+        identities_and_tokens = [GuestIdentity.create("", "") for _ in range(3)]
+        identity, token = identities_and_tokens[1]
+
+        self.client.cookies["guest_token"] = token
+
+        response = self.client.post("/api/authenticate-as-guest/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(User.objects.count(), 3)
+        self.assertEqual(GuestIdentity.objects.count(), 3)
+
+        response = self.client.get("/api/me/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["email"], identity.user.email)
+
     def test_invalid_guest_token(self):
         self.assertEqual(User.objects.count(), 0)
         self.assertEqual(GuestIdentity.objects.count(), 0)
@@ -1354,7 +1533,7 @@ class AuthenticateAsGuest(ViewsTestCase):
             self.assertHasAttr(identity, "created_at")
 
             self.assertEqual(len(user.email), 42 + len("@example.com"))
-            self.assertEqual(len(user.password), 89)
+            self.assertFalse(user.has_usable_password())
             self.assertTrue(user.email.endswith("@example.com"))
             self.assertTrue(user.is_active)
             self.assertTrue(user.is_guest)
@@ -1406,7 +1585,7 @@ class AuthenticateAsGuest(ViewsTestCase):
             self.assertNotEqual(cookies["guest_token"].value, token)
 
         self.assertEqual(len(user2.email), 42 + len("@example.com"))
-        self.assertEqual(len(user2.password), 89)
+        self.assertFalse(user2.has_usable_password())
         self.assertTrue(user2.email.endswith("@example.com"))
         self.assertTrue(user2.is_active)
         self.assertTrue(user2.is_guest)
@@ -5,6 +5,7 @@ from django.conf import settings
 from rest_framework.request import Request
 from rest_framework.throttling import AnonRateThrottle, SimpleRateThrottle, UserRateThrottle
 
+from .limiter import allow_many_sync, get_token_bucket
 from .models import User
 
 class DebugBypassThrottleMixin:
@@ -13,13 +14,47 @@ class DebugBypassThrottleMixin:
             return True
         return super().allow_request(request, view)
 
-class SignupRateThrottle(DebugBypassThrottleMixin, AnonRateThrottle):
+class TokenBucketThrottleMixin:
+    lease = 1
+
+    def get_bucket_check(self, request, view):
+        if self.rate is None:
+            return None
+
+        key = self.get_cache_key(request, view)
+        if key is None:
+            return None
+
+        return get_token_bucket(f"throttle:{self.scope}", self.num_requests, self.duration, self.lease), key
+
+    def allow_request(self, request, view):
+        if not hasattr(request, "token_bucket_results"):
+            throttles = [t for t in view.get_throttles() if isinstance(t, TokenBucketThrottleMixin)]
+            request.token_bucket_results = check_token_buckets(request, view, throttles)
+        if type(self) not in request.token_bucket_results:
+            request.token_bucket_results.update(check_token_buckets(request, view, [self]))
+
+        allowed, self.retry_after = request.token_bucket_results[type(self)]
+        return allowed
+
+    def wait(self):
+        return self.retry_after
+
+def check_token_buckets(request, view, throttles: list[TokenBucketThrottleMixin]) -> dict[type, tuple[bool, float]]:
+    checks = {type(t): t.get_bucket_check(request, view) for t in throttles}
+    pending = {k: c for k, c in checks.items() if c is not None}
+
+    results = dict.fromkeys(checks, (True, 0.0))
+    results.update(zip(pending, allow_many_sync(list(pending.values()))))
+    return results
+
+class SignupRateThrottle(DebugBypassThrottleMixin, TokenBucketThrottleMixin, AnonRateThrottle):
     scope = "signup"
 
-class RefreshRateThrottle(DebugBypassThrottleMixin, AnonRateThrottle):
+class RefreshRateThrottle(DebugBypassThrottleMixin, TokenBucketThrottleMixin, AnonRateThrottle):
     scope = "refresh"
 
-class RefreshTokenRateThrottle(DebugBypassThrottleMixin, SimpleRateThrottle):
+class RefreshTokenRateThrottle(DebugBypassThrottleMixin, TokenBucketThrottleMixin, SimpleRateThrottle):
     scope = "refresh_token"
 
     def get_cache_key(self, request, view):
@@ -29,7 +64,7 @@ class RefreshTokenRateThrottle(DebugBypassThrottleMixin, SimpleRateThrottle):
         token_hash = hashlib.sha256(token.encode()).hexdigest()
         return f"refresh_token:{token_hash}"
 
-class MFATokenRateThrottle(DebugBypassThrottleMixin, SimpleRateThrottle):
+class MFATokenRateThrottle(DebugBypassThrottleMixin, TokenBucketThrottleMixin, SimpleRateThrottle):
     scope = "mfa_token"
 
     def get_cache_key(self, request, view):
@@ -38,14 +73,14 @@ class MFATokenRateThrottle(DebugBypassThrottleMixin, SimpleRateThrottle):
             return None
         return f"mfa_token:{token}"
 
-class MessageRateThrottle(DebugBypassThrottleMixin, SimpleRateThrottle):
+class MessageRateThrottle(DebugBypassThrottleMixin, TokenBucketThrottleMixin, SimpleRateThrottle):
     scope = "message"
 
     def get_cache_key(self, request: Request, view):
         user: User = request.user
         return f"message:{user.email}"
 
-class IPEmailRateThrottle(DebugBypassThrottleMixin, AnonRateThrottle):
+class IPEmailRateThrottle(DebugBypassThrottleMixin, TokenBucketThrottleMixin, AnonRateThrottle):
     scope = "ip_email"
 
     def get_cache_key(self, request, view):
@@ -61,16 +96,18 @@ class IPEmailRateThrottle(DebugBypassThrottleMixin, AnonRateThrottle):
         else:
             return f"throttle_{self.scope}_{ident}"
 
-class PerUserRateThrottle(DebugBypassThrottleMixin, UserRateThrottle):
+class PerUserRateThrottle(DebugBypassThrottleMixin, TokenBucketThrottleMixin, UserRateThrottle):
     scope = "per_user"
+    lease = 10
 
-    def allow_request(self, request, view):
+    def get_cache_key(self, request, view):
         if not request.user.is_authenticated:
-            return True
-        return super().allow_request(request, view)
+            return None
+        return super().get_cache_key(request, view)
 
-class PerUserIPRateThrottle(DebugBypassThrottleMixin, UserRateThrottle):
+class PerUserIPRateThrottle(DebugBypassThrottleMixin, TokenBucketThrottleMixin, UserRateThrottle):
     scope = "per_user_ip"
+    lease = 5
 
     def get_cache_key(self, request, view):
         if request.user and request.user.is_authenticated:
@@ -1,6 +1,6 @@
 from django.urls import path
 
-from ..views import chat, message, user
+from ..views import chat, message, metrics, stream, user
 
 urlpatterns = [
     path("signup/", user.Signup.as_view()),
@@ -34,7 +34,13 @@ urlpatterns = [
     path("get-message-file-content/", message.GetMessageFileContent.as_view()),
     path("get-message-file-ids/", message.GetMessageFileIDs.as_view()),
     path("get-messages/", message.GetMessages.as_view()),
+    path("get-message-window/", message.GetMessageWindow.as_view()),
+    path("get-message-changes/", message.GetMessageChanges.as_view()),
     path("new-message/", message.NewMessage.as_view()),
     path("edit-message/", message.EditMessage.as_view()),
-    path("regenerate-message/", message.RegenerateMessage.as_view())
+    path("regenerate-message/", message.RegenerateMessage.as_view()),
+
+    path("stream-chats/", stream.StreamChats.as_view()),
+
+    path("redis-metrics/", metrics.RedisMetrics.as_view())
 ]
\ No newline at end of file
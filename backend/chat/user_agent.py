@@ -0,0 +1,8 @@
+from functools import lru_cache
+
+from user_agents import parse
+from user_agents.parsers import UserAgent
+
+@lru_cache(maxsize = 1024)
+def parse_user_agent(user_agent: str) -> UserAgent:
+    return parse(user_agent)
\ No newline at end of file
@@ -0,0 +1,27 @@
+from django.core.cache import cache
+from redis.exceptions import RedisError
+
+from .versions import aget_user_version
+
+TTL = 60 * 10
+
+def get_me_key(user_id: int, version: int):
+    return f"me:{user_id}:{version}"
+
+async def aget_cached_me(user_id: int) -> tuple[int | None, dict | None]:
+    version = await aget_user_version(user_id)
+    if version is None:
+        return None, None
+
+    try:
+        return version, await cache.aget(get_me_key(user_id, version))
+    except RedisError:
+        return None, None
+
+async def aset_cached_me(user_id: int, version: int | None, data: dict):
+    if version is None:
+        return
+    try:
+        await cache.aset(get_me_key(user_id, version), data, TTL)
+    except RedisError:
+        pass
\ No newline at end of file
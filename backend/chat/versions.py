@@ -0,0 +1,76 @@
+import logging
+import time
+
+from django.core.cache import cache
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+TTL = 60 * 60 * 24 * 7
+
+def get_version(key: str) -> int | None:
+    try:
+        version = cache.get(key)
+        if version is None:
+            cache.add(key, time.time_ns(), TTL)
+            version = cache.get(key, 0)
+        return version
+    except RedisError:
+        return None
+
+async def aget_version(key: str) -> int | None:
+    try:
+        version = await cache.aget(key)
+        if version is None:
+            await cache.aadd(key, time.time_ns(), TTL)
+            version = await cache.aget(key, 0)
+        return version
+    except RedisError:
+        return None
+
+def bump_version(key: str):
+    try:
+        cache.incr(key)
+    except ValueError:
+        pass
+    except RedisError as e:
+        logger.warning("Could not bump version '%s' (%s).", key, e)
+
+def delete_versions(keys: list[str]):
+    try:
+        cache.delete_many(keys)
+    except RedisError as e:
+        logger.warning("Could not delete %d versions (%s).", len(keys), e)
+
+def get_user_version(user_id: int):
+    return get_version(f"user_version:{user_id}")
+
+async def aget_user_version(user_id: int):
+    return await aget_version(f"user_version:{user_id}")
+
+def bump_user_version(user_id: int):
+    bump_version(f"user_version:{user_id}")
+
+def delete_user_versions(user_ids: list[int]):
+    delete_versions([f"{prefix}:{user_id}" for user_id in user_ids for prefix in ["user_version", "chats_version"]])
+
+def get_chats_version(user_id: int):
+    return get_version(f"chats_version:{user_id}")
+
+async def aget_chats_version(user_id: int):
+    return await aget_version(f"chats_version:{user_id}")
+
+def bump_chats_version(user_id: int):
+    bump_version(f"chats_version:{user_id}")
+
+def get_messages_version(chat_uuid: str):
+    return get_version(f"messages_version:{chat_uuid}")
+
+async def aget_messages_version(chat_uuid: str):
+    return await aget_version(f"messages_version:{chat_uuid}")
+
+def bump_messages_version(chat_uuid: str):
+    bump_version(f"messages_version:{chat_uuid}")
+
+def delete_messages_versions(chat_uuids: list):
+    delete_versions([f"messages_version:{chat_uuid}" for chat_uuid in chat_uuids])
\ No newline at end of file
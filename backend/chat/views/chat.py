@@ -7,11 +7,15 @@ from rest_framework.response import Response
 from rest_framework.request import Request
 from rest_framework.views import APIView
 
+from ..cleanup import delete_chats
+from ..events import send_user_event
 from ..models import Chat, User
-from ..serializers.chat import ChatSerializer, ChatUUIDSerializer, GetChatsSerializer, RenameChatSerializer, SearchChatsSerializer
+from ..serializers.chat import ChatSerializer, ChatUUIDSerializer, GetChatsSerializer, RenameChatSerializer, SearchChatsSerializer, with_index
 from ..tasks import stop_pending_chat, stop_user_pending_chats
+from ..versions import aget_chats_version, bump_chats_version
+from .utils import AsyncAPIView, get_etag, is_not_modified, not_modified_response, with_etag
 
-class GetChat(APIView):
+class GetChat(AsyncAPIView):
     permission_classes = [IsAuthenticated]
 
     @extend_schema(
@@ -33,7 +37,7 @@ class GetChat(APIView):
             )
         ]
     )
-    def get(self, request: Request):
+    async def get(self, request: Request):
         user: User = request.user
 
         qs = ChatUUIDSerializer(data = request.query_params)
@@ -41,15 +45,19 @@ class GetChat(APIView):
 
         chat_uuid = qs.validated_data["chat_uuid"]
 
+        etag = get_etag("chat", user.pk, chat_uuid, await aget_chats_version(user.pk))
+        if is_not_modified(request, etag):
+            return not_modified_response(etag)
+
         try:
-            chat = user.chats.get(uuid = chat_uuid, is_temporary = False)
+            chat = await with_index(user.chats.filter(is_temporary = False)).aget(uuid = chat_uuid)
         except Chat.DoesNotExist:
             return Response({"detail": "Chat was not found."}, status.HTTP_404_NOT_FOUND)
 
         serializer = ChatSerializer(chat, many = False)
-        return Response(serializer.data, status.HTTP_200_OK)
+        return with_etag(Response(serializer.data, status.HTTP_200_OK), etag)
 
-class GetChats(APIView):
+class GetChats(AsyncAPIView):
     permission_classes = [IsAuthenticated]
 
     @extend_schema(
@@ -87,7 +95,7 @@ class GetChats(APIView):
             )
         ]
     )
-    def get(self, request: Request):
+    async def get(self, request: Request):
         user: User = request.user
 
         qs = GetChatsSerializer(data = request.query_params)
@@ -98,15 +106,19 @@ class GetChats(APIView):
         pending = qs.validated_data["pending"]
         archived = qs.validated_data["archived"]
 
+        etag = get_etag("chats", user.pk, offset, limit, pending, archived, await aget_chats_version(user.pk))
+        if is_not_modified(request, etag):
+            return not_modified_response(etag)
+
         chats = user.chats.filter(is_archived = archived, is_temporary = False)
         if pending:
-            chats = chats.exclude(pending_message = None)
+            chats = chats.filter(pending_message__isnull = False)
         chats = chats.order_by("-created_at")
 
-        serializer = ChatSerializer(chats[offset:offset + limit], many = True)
-        return Response({"chats": serializer.data, "has_more": offset + limit < chats.count()}, status.HTTP_200_OK)
+        serializer = ChatSerializer([c async for c in with_index(chats)[offset:offset + limit]], many = True)
+        return with_etag(Response({"chats": serializer.data, "has_more": offset + limit < await chats.acount()}, status.HTTP_200_OK), etag)
 
-class SearchChats(APIView):
+class SearchChats(AsyncAPIView):
     permission_classes = [IsAuthenticated]
 
     @extend_schema(
@@ -152,7 +164,7 @@ class SearchChats(APIView):
             )
         ]
     )
-    def get(self, request: Request):
+    async def get(self, request: Request):
         user: User = request.user
 
         qs = SearchChatsSerializer(data = request.query_params)
@@ -169,14 +181,14 @@ class SearchChats(APIView):
             "title": chat.title,
             "is_archived": chat.is_archived,
             "matches": [
-                m.text[:100] for m in chat.messages.filter(
+                m.text[:100] async for m in chat.messages.filter(
                     ~Q(text = "") & (Q(chat__title__icontains = search) | Q(text__icontains = search))
-                ).distinct().order_by("created_at")[:5]
+                ).distinct().order_by("position")[:5]
             ],
-            "last_modified_at": chat.last_modified_at().isoformat()
-        } for chat in chats[offset:offset + limit]]
+            "last_modified_at": (await chat.alast_modified_at()).isoformat()
+        } async for chat in chats[offset:offset + limit]]
 
-        return Response({"entries": entries, "has_more": offset + limit < chats.count()}, status.HTTP_200_OK)
+        return Response({"entries": entries, "has_more": offset + limit < await chats.acount()}, status.HTTP_200_OK)
 
 class RenameChat(APIView):
     permission_classes = [IsAuthenticated]
@@ -223,6 +235,7 @@ class RenameChat(APIView):
 
         chat.title = new_title
         chat.save()
+        send_user_event(user.pk, "chat_renamed", chat_uuid = str(chat.uuid), title = chat.title)
         return Response(status = status.HTTP_200_OK)
 
 class ArchiveChat(APIView):
@@ -267,6 +280,7 @@ class ArchiveChat(APIView):
         stop_pending_chat(chat)
         chat.is_archived = True
         chat.save()
+        send_user_event(user.pk, "chat_archived", chat_uuid = str(chat.uuid), is_archived = True)
         return Response(status = status.HTTP_200_OK)
 
 class UnarchiveChat(APIView):
@@ -311,6 +325,7 @@ class UnarchiveChat(APIView):
         stop_pending_chat(chat)
         chat.is_archived = False
         chat.save()
+        send_user_event(user.pk, "chat_archived", chat_uuid = str(chat.uuid), is_archived = False)
         return Response(status = status.HTTP_200_OK)
 
 class DeleteChat(APIView):
@@ -354,6 +369,7 @@ class DeleteChat(APIView):
 
         stop_pending_chat(chat)
         chat.delete()
+        send_user_event(user.pk, "chat_deleted", chat_uuid = str(chat_uuid))
         return Response(status = status.HTTP_204_NO_CONTENT)
 
 class ArchiveChats(APIView):
@@ -369,6 +385,8 @@ class ArchiveChats(APIView):
     def patch(self, request: Request):
         stop_user_pending_chats(request.user)
         Chat.objects.filter(user = request.user).update(is_archived = True)
+        bump_chats_version(request.user.pk)
+        send_user_event(request.user.pk, "chats_archived", is_archived = True)
         return Response(status = status.HTTP_200_OK)
 
 class UnarchiveChats(APIView):
@@ -384,6 +402,8 @@ class UnarchiveChats(APIView):
     def patch(self, request: Request):
         stop_user_pending_chats(request.user)
         Chat.objects.filter(user = request.user).update(is_archived = False)
+        bump_chats_version(request.user.pk)
+        send_user_event(request.user.pk, "chats_archived", is_archived = False)
         return Response(status = status.HTTP_200_OK)
 
 class DeleteChats(APIView):
@@ -398,7 +418,9 @@ class DeleteChats(APIView):
     )
     def delete(self, request: Request):
         stop_user_pending_chats(request.user)
-        Chat.objects.filter(user = request.user).delete()
+        delete_chats(Chat.objects.filter(user = request.user))
+        bump_chats_version(request.user.pk)
+        send_user_event(request.user.pk, "chats_deleted")
         return Response(status = status.HTTP_204_NO_CONTENT)
 
 class StopPendingChats(APIView):
@@ -1,3 +1,8 @@
+from datetime import timedelta
+
+from django.db.models import Prefetch
+from django.db.models.functions import Length
+from django.utils import timezone
 from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import extend_schema, OpenApiExample
 from rest_framework import serializers, status
@@ -8,16 +13,22 @@ from rest_framework.response import Response
 from rest_framework.request import Request
 from rest_framework.views import APIView
 
-from ..models import Chat, Message, MessageFile, User
+from ..cleanup import get_cleanup_settings
+from ..models import Chat, DeletedMessageFile, Message, MessageFile, User
 from ..serializers.chat import ChatSerializer, ChatUUIDSerializer
 from ..serializers.message import (
-    EditMessageSerializer, GetMessageFileContentSerializer,
-    MessageSerializer, NewMessageSerializer, RegenerateMessageSerializer
+    EditMessageSerializer, GetMessageChangesSerializer, GetMessageFileContentSerializer, GetMessageWindowSerializer,
+    MessageChangesSerializer, MessageSerializer, MessageWindowSerializer, NewMessageSerializer, RegenerateMessageSerializer
 )
+from ..temporary_chats import create_chat, get_chat
 from ..throttles import MessageRateThrottle
+from ..versions import aget_chats_version, aget_messages_version, get_chats_version, get_messages_version
+from .utils import AsyncAPIView, get_etag, is_not_modified, not_modified_response, with_etag
 
 from ..tasks import generate_pending_message_in_chat, is_any_user_chat_pending
 
+CHANGES_CURSOR_OVERLAP = timedelta(seconds = 5)
+
 class BinaryFileRenderer(BaseRenderer):
     media_type = "application/octet-stream"
     format = "binary"
@@ -27,6 +38,9 @@ class BinaryFileRenderer(BaseRenderer):
     def render(self, data, media_type = None, renderer_context = None):
         return data
 
+def get_files_prefetch():
+    return Prefetch("files", MessageFile.objects.defer("content").annotate(content_size = Length("content")))
+
 class GetMessageFileContent(APIView):
     permission_classes = [IsAuthenticated]
     renderer_classes = [BinaryFileRenderer, JSONRenderer]
@@ -100,17 +114,23 @@ class GetMessageFileIDs(APIView):
 
         chat_uuid = qs.validated_data["chat_uuid"]
 
+        etag = get_etag("message_file_ids", user.pk, chat_uuid, get_chats_version(user.pk), get_messages_version(chat_uuid))
+        if is_not_modified(request, etag):
+            return not_modified_response(etag)
+
         try:
             chat = user.chats.get(uuid = chat_uuid)
         except Chat.DoesNotExist:
             return Response({"detail": "Chat was not found."}, status.HTTP_404_NOT_FOUND)
 
-        file_ids = []
-        for files in [m.files for m in chat.messages.order_by("created_at")]:
-            file_ids.append([f.pk for f in files.order_by("created_at")])
-        return Response(file_ids, status.HTTP_200_OK)
+        file_ids: dict[int, list[int]] = {}
+        for message_id, file_id in chat.messages.order_by("position", "files__created_at", "files__id").values_list("id", "files__id"):
+            message_file_ids = file_ids.setdefault(message_id, [])
+            if file_id is not None:
+                message_file_ids.append(file_id)
+        return with_etag(Response(list(file_ids.values()), status.HTTP_200_OK), etag)
 
-class GetMessages(APIView):
+class GetMessages(AsyncAPIView):
     permission_classes = [IsAuthenticated]
 
     @extend_schema(
@@ -129,7 +149,7 @@ class GetMessages(APIView):
             )
         ]
     )
-    def get(self, request: Request):
+    async def get(self, request: Request):
         user: User = request.user
 
         qs = ChatUUIDSerializer(data = request.query_params)
@@ -137,14 +157,139 @@ class GetMessages(APIView):
 
         chat_uuid = qs.validated_data["chat_uuid"]
 
+        etag = get_etag("messages", user.pk, chat_uuid, await aget_chats_version(user.pk), await aget_messages_version(chat_uuid))
+        if is_not_modified(request, etag):
+            return not_modified_response(etag)
+
         try:
-            chat = user.chats.get(uuid = chat_uuid, is_temporary = False)
+            chat = await user.chats.aget(uuid = chat_uuid, is_temporary = False)
         except Chat.DoesNotExist:
             return Response({"detail": "Chat was not found."}, status.HTTP_404_NOT_FOUND)
 
-        messages = chat.messages.order_by("created_at").prefetch_related("files")
+        messages = [m async for m in chat.messages.order_by("position").prefetch_related(get_files_prefetch())]
         serializer = MessageSerializer(messages, many = True)
-        return Response(serializer.data, status.HTTP_200_OK)
+        return with_etag(Response(serializer.data, status.HTTP_200_OK), etag)
+
+class GetMessageWindow(APIView):
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(
+        summary="Get Message Window",
+        description="Retrieve the latest `limit` messages of a chat in chronological order. "
+                    "To load older history, pass the index of the oldest loaded message as `before`.",
+        tags=["Messages"],
+        parameters=[GetMessageWindowSerializer],
+        responses={200: MessageWindowSerializer, 404: OpenApiTypes.OBJECT},
+        examples=[
+            OpenApiExample(
+                "Example Response",
+                value={
+                    "messages": [
+                        {"index": 48, "id": 49, "text": "Hello!", "is_from_user": True, "files": [], "model": ""},
+                        {"index": 49, "id": 50, "text": "Hi! How can I help?", "is_from_user": False, "files": [], "model": "Qwen3-VL:4B"}
+                    ],
+                    "has_more": True
+                },
+                response_only=True,
+                status_codes=[200]
+            )
+        ]
+    )
+    def get(self, request: Request):
+        user: User = request.user
+
+        qs = GetMessageWindowSerializer(data = request.query_params)
+        qs.is_valid(raise_exception = True)
+
+        chat_uuid = qs.validated_data["chat_uuid"]
+        limit = qs.validated_data["limit"]
+        before = qs.validated_data.get("before")
+
+        etag = get_etag(
+            "message_window", user.pk, chat_uuid, limit, before if before is not None else "",
+            get_chats_version(user.pk), get_messages_version(chat_uuid)
+        )
+        if is_not_modified(request, etag):
+            return not_modified_response(etag)
+
+        try:
+            chat = user.chats.get(uuid = chat_uuid, is_temporary = False)
+        except Chat.DoesNotExist:
+            return Response({"detail": "Chat was not found."}, status.HTTP_404_NOT_FOUND)
+
+        messages = chat.messages.prefetch_related(get_files_prefetch()).window(limit + 1, before)
+        serializer = MessageWindowSerializer({"messages": messages[-limit:], "has_more": len(messages) > limit})
+        return with_etag(Response(serializer.data, status.HTTP_200_OK), etag)
+
+class GetMessageChanges(APIView):
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(
+        summary="Get Message Changes",
+        description="Retrieve only the messages of a chat that were created or modified since the `since` cursor, "
+                    "along with the IDs of files removed since then. Changes made up to 5 seconds before the cursor are included again, "
+                    "so that changes committed late are not missed, and clients should apply them idempotently. "
+                    "Without `since`, or with a `since` older than the retention of removed files, all messages are returned.",
+        tags=["Messages"],
+        parameters=[GetMessageChangesSerializer],
+        responses={200: MessageChangesSerializer, 404: OpenApiTypes.OBJECT},
+        examples=[
+            OpenApiExample(
+                "Example Response",
+                value={
+                    "messages": [{"index": 1, "id": 2, "text": "Hi! How can I help?", "is_from_user": False, "files": [], "model": "Qwen3-VL:4B"}],
+                    "removed_file_ids": [5],
+                    "message_count": 2,
+                    "cursor": "2026-01-01T12:00:00.123456Z"
+                },
+                response_only=True,
+                status_codes=[200]
+            )
+        ]
+    )
+    def get(self, request: Request):
+        user: User = request.user
+
+        qs = GetMessageChangesSerializer(data = request.query_params)
+        qs.is_valid(raise_exception = True)
+
+        chat_uuid = qs.validated_data["chat_uuid"]
+        since = qs.validated_data.get("since")
+
+        etag = get_etag(
+            "message_changes", user.pk, chat_uuid, since.isoformat() if since else "",
+            get_chats_version(user.pk), get_messages_version(chat_uuid)
+        )
+        if is_not_modified(request, etag):
+            return not_modified_response(etag)
+
+        try:
+            chat = user.chats.get(uuid = chat_uuid, is_temporary = False)
+        except Chat.DoesNotExist:
+            return Response({"detail": "Chat was not found."}, status.HTTP_404_NOT_FOUND)
+
+        if since is not None and since <= timezone.now() - get_cleanup_settings()["DELETED_FILE_RETENTION"]:
+            since = None
+
+        messages = chat.messages.order_by("position")
+        deleted_files = DeletedMessageFile.objects.filter(message__chat = chat)
+        if since is not None:
+            messages = messages.filter(last_modified_at__gte = since - CHANGES_CURSOR_OVERLAP)
+            deleted_files = deleted_files.filter(deleted_at__gte = since - CHANGES_CURSOR_OVERLAP)
+
+        messages = list(messages.prefetch_related(get_files_prefetch()))
+        deleted_files = list(deleted_files.order_by("deleted_at").values_list("file_id", "deleted_at"))
+
+        timestamps = [m.last_modified_at for m in messages] + [deleted_at for _, deleted_at in deleted_files]
+        cursor = max(timestamps) if len(timestamps) > 0 else since
+
+        serializer = MessageChangesSerializer({
+            "messages": messages,
+            "removed_file_ids": [file_id for file_id, _ in deleted_files],
+            "message_count": chat.messages.count(),
+            "cursor": cursor
+        })
+        return with_etag(Response(serializer.data, status.HTTP_200_OK), etag)
 
 class NewMessage(APIView):
     permission_classes = [IsAuthenticated]
@@ -190,23 +335,14 @@ class NewMessage(APIView):
         temporary = qs.validated_data["temporary"]
 
         if chat_uuid is None:
-            chat = user.chats.create(title = f"Chat {user.chats.filter(is_temporary = False).count() + 1}", is_temporary = temporary)
+            chat = create_chat(user, f"Chat {user.chats.filter(is_temporary = False).count() + 1}", temporary)
         else:
-            try:
-                chat = user.chats.get(uuid = chat_uuid)
-            except Chat.DoesNotExist:
+            chat = get_chat(user, chat_uuid)
+            if chat is None:
                 return Response({"detail": "Chat was not found."}, status.HTTP_404_NOT_FOUND)
 
-        user_message = chat.messages.create(text = text, is_from_user = True)
-        new_files = []
-        for file in files:
-            file.seek(0)
-            new_files.append(MessageFile(message = user_message, name = file.name, content = file.read(), content_type = file.content_type))
-        user_message.files.bulk_create(new_files)
-
-        bot_message = chat.messages.create(text = "", is_from_user = False, model = model)
-
-        chat.pending_message = bot_message
+        chat.add_message(text, True, files = files)
+        chat.pending_message = chat.add_message("", False, model)
         chat.save()
 
         generate_pending_message_in_chat(chat, chat_uuid == None and not temporary)
@@ -252,46 +388,33 @@ class EditMessage(APIView):
         added_files = qs.validated_data["added_files"]
         removed_file_ids = qs.validated_data["removed_file_ids"]
 
-        try:
-            chat = user.chats.get(uuid = chat_uuid)
-        except Chat.DoesNotExist:
+        chat = get_chat(user, chat_uuid)
+        if chat is None:
             return Response({"detail": "Chat was not found."}, status.HTTP_404_NOT_FOUND)
 
-        if index + 1 >= chat.messages.count():
+        messages = chat.get_messages_at([index, index + 1])
+        if index + 1 not in messages:
             return Response({"detail": "Index out of range."}, status.HTTP_404_NOT_FOUND)
 
-        messages = chat.messages.order_by("created_at")
         user_message: Message = messages[index]
 
-        removed_files: list[MessageFile] = []
-        for removed_file_id in removed_file_ids:
-            removed_message_file = user_message.files.filter(id = removed_file_id).first()
-            if removed_message_file:
-                removed_files.append(removed_message_file)
+        current_files = chat.get_message_files(user_message)
+        removed_files = [f for f in current_files if f.id in removed_file_ids]
 
-        if user_message.files.count() + len(added_files) - len(removed_files) > 10:
+        if len(current_files) + len(added_files) - len(removed_files) > 10:
             return Response({"detail": "Total number of files exceeds the limit of 10."}, status.HTTP_400_BAD_REQUEST)
 
-        total_size = sum([len(f.content) for f in user_message.files.all()])
+        total_size = sum([len(f.content) for f in current_files])
         total_size += sum([f.size for f in added_files])
         total_size -= sum([len(f.content) for f in removed_files])
         if total_size > 5_000_000:
             return Response({"detail": "Total file size exceeds limit of 5 MB."}, status.HTTP_400_BAD_REQUEST)
 
-        for removed_file in removed_files:
-            removed_file.delete()
-
         user_message.text = text
-
-        new_files = []
-        for file in added_files:
-            file.seek(0)
-            new_files.append(MessageFile(message = user_message, name = file.name, content = file.read(), content_type = file.content_type))
-        user_message.files.bulk_create(new_files)
-
+        chat.update_message_files(user_message, added_files, removed_files)
         user_message.save()
 
-        bot_message: Message = messages[index + 1]
+        bot_message = messages[index + 1]
         bot_message.text = ""
         bot_message.model = model
         bot_message.save()
@@ -339,15 +462,14 @@ class RegenerateMessage(APIView):
         index = qs.validated_data["index"]
         model = qs.validated_data["model"]
 
-        try:
-            chat = user.chats.get(uuid = chat_uuid)
-        except Chat.DoesNotExist:
+        chat = get_chat(user, chat_uuid)
+        if chat is None:
             return Response({"detail": "Chat was not found."}, status.HTTP_404_NOT_FOUND)
 
-        if index >= chat.messages.count():
+        bot_message: Message | None = chat.get_messages_at([index]).get(index)
+        if bot_message is None:
             return Response({"detail": "Index out of range."}, status.HTTP_404_NOT_FOUND)
 
-        bot_message: Message = chat.messages.order_by("created_at")[index]
         bot_message.text = ""
         bot_message.model = model
         bot_message.save()
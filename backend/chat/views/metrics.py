@@ -0,0 +1,66 @@
+from drf_spectacular.utils import extend_schema, inline_serializer, OpenApiExample
+from rest_framework import serializers, status
+from rest_framework.permissions import IsAdminUser
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from ..redis_pool import export_metrics
+
+class RedisMetrics(APIView):
+    permission_classes = [IsAdminUser]
+
+    @extend_schema(
+        summary="Redis Pool Metrics",
+        description="Retrieve saturation, health and connection hold time metrics of the Redis connection pools used by the cache, "
+                    "the WebSocket rate limiter and the HTTP throttles. Only available to staff users.",
+        tags=["Metrics"],
+        responses=inline_serializer(
+            name="RedisMetricsResponse",
+            fields={
+                "pools": inline_serializer(
+                    name="RedisPoolMetrics",
+                    many=True,
+                    fields={
+                        "name": serializers.CharField(),
+                        "healthy": serializers.BooleanField(),
+                        "max_connections": serializers.IntegerField(),
+                        "in_use": serializers.IntegerField(),
+                        "peak_in_use": serializers.IntegerField(),
+                        "saturation": serializers.FloatField(help_text="Connections in use divided by the pool size."),
+                        "exhausted": serializers.IntegerField(help_text="Times a connection was requested from a full pool."),
+                        "failures": serializers.IntegerField(help_text="Times the pool switched to fail-open mode."),
+                        "checkouts": serializers.IntegerField(help_text="Connections taken from the pool and returned."),
+                        "hold_avg_ms": serializers.FloatField(help_text="Average time a connection was held before being returned."),
+                        "hold_max_ms": serializers.FloatField(help_text="Longest time a connection was held before being returned.")
+                    }
+                )
+            }
+        ),
+        examples=[
+            OpenApiExample(
+                "Example Response",
+                value={
+                    "pools": [
+                        {
+                            "name": "cache",
+                            "healthy": True,
+                            "max_connections": 50,
+                            "in_use": 3,
+                            "peak_in_use": 12,
+                            "saturation": 0.06,
+                            "exhausted": 0,
+                            "failures": 0,
+                            "checkouts": 1520,
+                            "hold_avg_ms": 0.4,
+                            "hold_max_ms": 7.9
+                        }
+                    ]
+                },
+                response_only=True,
+                status_codes=[200]
+            )
+        ]
+    )
+    def get(self, request: Request):
+        return Response({"pools": export_metrics()}, status.HTTP_200_OK)
\ No newline at end of file
@@ -0,0 +1,163 @@
+import asyncio
+import json
+import uuid
+
+from asgiref.sync import sync_to_async
+from channels.layers import get_channel_layer
+from django.http import HttpRequest, JsonResponse, StreamingHttpResponse
+from django.views import View
+from rest_framework.exceptions import AuthenticationFailed
+
+from ..authentication import RevocableJWTAuthentication
+from ..events import get_user_group
+from ..limiter import get_token_bucket
+from ..models import User
+from ..stream_log import read_chunks
+from ..tasks import adelete_temporary_chat, opened_chats
+from ..temporary_chats import aget_temporary_chat
+
+class StreamChats(View):
+    max_chat_subscriptions = 20
+    keepalive_interval = 15
+    retry_ms = 3000
+
+    async def dispatch(self, request: HttpRequest, *args, **kwargs):
+        self.user = await self.get_user(request)
+        if self.user is None:
+            return JsonResponse({"detail": "Authentication credentials were not provided."}, status = 401)
+        return await super().dispatch(request, *args, **kwargs)
+
+    async def get(self, request: HttpRequest):
+        user = self.user
+
+        allowed, retry_after = await get_token_bucket("rate:user", 20, 60.0, 5).allow(str(user.pk))
+        if not allowed:
+            return JsonResponse({"detail": "Request was throttled.", "retry_after": retry_after}, status = 429)
+
+        chat_uuids = list(dict.fromkeys(request.GET.getlist("chat_uuid")))
+        include_events = request.GET.get("events") == "true"
+
+        if len(chat_uuids) == 0 and not include_events:
+            return JsonResponse({"detail": "At least one chat UUID or events=true is required."}, status = 400)
+        if len(chat_uuids) > self.max_chat_subscriptions:
+            return JsonResponse({"detail": f"At most {self.max_chat_subscriptions} chats can be streamed at once."}, status = 400)
+
+        try:
+            chat_uuids = [str(uuid.UUID(chat_uuid)) for chat_uuid in chat_uuids]
+        except ValueError:
+            return JsonResponse({"detail": "Invalid chat UUID."}, status = 400)
+
+        stored_chat_uuids = [u for u in chat_uuids if await aget_temporary_chat(user.pk, u) is None]
+        if await user.chats.filter(uuid__in = stored_chat_uuids).acount() != len(stored_chat_uuids):
+            return JsonResponse({"detail": "Chat was not found."}, status = 404)
+
+        response = StreamingHttpResponse(
+            self.stream(user, chat_uuids, include_events, request.headers.get("Last-Event-ID", "")),
+            content_type = "text/event-stream"
+        )
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+    async def stream(self, user: User, chat_uuids: list[str], include_events: bool, last_event_id: str):
+        channel_layer = get_channel_layer()
+        channel_name = await channel_layer.new_channel()
+
+        groups = [f"chat_{chat_uuid}" for chat_uuid in chat_uuids]
+        if include_events:
+            groups.append(get_user_group(user.pk))
+
+        try:
+            for group in groups:
+                await channel_layer.group_add(group, channel_name)
+
+            for chat_uuid in chat_uuids:
+                async for frame in self.replay_stream(chat_uuid, last_event_id):
+                    yield frame
+
+            yield f"retry: {self.retry_ms}\n\n"
+
+            while True:
+                try:
+                    event = await asyncio.wait_for(channel_layer.receive(channel_name), self.keepalive_interval)
+                except TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+
+                frame = self.format_event(event)
+                if frame is not None:
+                    yield frame
+        finally:
+            for group in groups:
+                await channel_layer.group_discard(group, channel_name)
+
+            for chat_uuid in chat_uuids:
+                opened_chats.discard(chat_uuid)
+                await adelete_temporary_chat(user, chat_uuid)
+
+    async def replay_stream(self, chat_uuid: str, last_event_id: str):
+        parts = last_event_id.split(":")
+        if len(parts) == 3 and parts[0] == chat_uuid and parts[2].isdigit():
+            result = await read_chunks(chat_uuid, parts[1], int(parts[2]))
+        else:
+            result = None
+
+        if result is None:
+            opened_chats.add(chat_uuid)
+            return
+
+        stream_id, resumed, chunks = result
+        tokens = [c for c in chunks if not c["end"]]
+
+        if resumed:
+            for chunk in tokens:
+                yield self.format_frame(
+                    "token",
+                    {"chat_uuid": chat_uuid, "token": chunk["token"], "message_index": chunk["message_index"], "seq": chunk["seq"], "stream_id": stream_id},
+                    f"{chat_uuid}:{stream_id}:{chunk["seq"]}"
+                )
+        elif len(tokens) > 0:
+            yield self.format_frame(
+                "message",
+                {"chat_uuid": chat_uuid, "message": "".join([c["token"] for c in tokens]), "message_index": tokens[-1]["message_index"], "seq": tokens[-1]["seq"], "stream_id": stream_id},
+                f"{chat_uuid}:{stream_id}:{tokens[-1]["seq"]}"
+            )
+
+        if len(tokens) < len(chunks):
+            yield self.format_frame("end", {"chat_uuid": chat_uuid})
+
+    def format_event(self, event: dict):
+        event_type = event["type"]
+
+        if event_type == "send_token":
+            data = {"chat_uuid": event["chat_uuid"], "token": event["token"], "message_index": event["message_index"]}
+            if "seq" not in event:
+                return self.format_frame("token", data)
+            data["seq"] = event["seq"]
+            data["stream_id"] = event["stream_id"]
+            return self.format_frame("token", data, f"{event["chat_uuid"]}:{event["stream_id"]}:{event["seq"]}")
+        elif event_type == "send_message":
+            return self.format_frame("message", {"chat_uuid": event["chat_uuid"], "message": event["message"], "message_index": event["message_index"]})
+        elif event_type == "send_title":
+            return self.format_frame("title", {"chat_uuid": event["chat_uuid"], "title": event["title"]})
+        elif event_type == "send_end":
+            return self.format_frame("end", {"chat_uuid": event["chat_uuid"]})
+        elif event_type == "send_user_event":
+            return self.format_frame(event["event"], event["data"])
+        elif event_type == "send_user_events":
+            return "".join([self.format_frame(e["event"], e["data"]) for e in event["events"]])
+        else:
+            return None
+
+    def format_frame(self, event: str, data: dict, event_id: str | None = None):
+        frame = f"event: {event}\ndata: {json.dumps(data)}\n\n"
+        if event_id is not None:
+            frame = f"id: {event_id}\n{frame}"
+        return frame
+
+    async def get_user(self, request: HttpRequest) -> User | None:
+        try:
+            result = await sync_to_async(RevocableJWTAuthentication().authenticate)(request)
+        except AuthenticationFailed:
+            return None
+        return result[0] if result is not None else None
\ No newline at end of file
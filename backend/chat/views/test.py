@@ -11,6 +11,7 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from ..models import Chat, Message, MessageFile, User, UserMFA
+from ..versions import bump_chats_version, bump_messages_version
 
 class CreateChat(APIView):
     @extend_schema(
@@ -49,11 +50,12 @@ class CreateChat(APIView):
         chat = user.chats.create(title = title)
         chat.messages.bulk_create([Message(chat = chat, text = m["text"], is_from_user = m["is_from_user"]) for m in messages])
         chat.refresh_from_db()
-        for c_m, m in zip(chat.messages.order_by("created_at"), messages):
+        for c_m, m in zip(chat.messages.order_by("position"), messages):
             c_m.files.bulk_create([
                 MessageFile(message = c_m, name = f["name"], content = f["content"].encode(), content_type = f["content_type"])
                 for f in m["files"]
             ])
+        bump_messages_version(chat.uuid)
         return Response(status = status.HTTP_200_OK)
 
 class CreateChats(APIView):
@@ -93,6 +95,7 @@ class CreateChats(APIView):
                 Message(chat = chat, text = message["text"], is_from_user = message["is_from_user"])
                 for message in chat_data["messages"]
             ])
+        bump_chats_version(user.pk)
 
         return Response({"uuids": [str(c.uuid) for c in chats]}, status.HTTP_200_OK)
 
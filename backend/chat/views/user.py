@@ -1,6 +1,7 @@
 import secrets
 from datetime import timedelta
 
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.contrib.auth import authenticate
 from django.contrib.auth.hashers import check_password, make_password
@@ -21,15 +22,20 @@ from rest_framework_simplejwt.serializers import TokenRefreshSerializer
 from rest_framework_simplejwt.exceptions import TokenError
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.views import TokenRefreshView
-from rest_framework_simplejwt.token_blacklist.models import OutstandingToken, BlacklistedToken
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
 
-from .utils import readable_user_agent
-from ..models import GuestIdentity, PasswordResetToken, PreAuthToken, User, derive_token_fingerprint, hash_user_agent
+from .utils import AsyncAPIView, get_etag, is_not_modified, not_modified_response, readable_user_agent, with_etag
+from ..authentication import revoke_user_tokens
+from ..models import AccountDeletion, GuestIdentity, PasswordResetToken, PreAuthToken, User, UserPreferences, derive_token_fingerprint, hash_user_agent
 from ..serializers.user import (
     AuthenticateAsGuestSerializer, ConfirmPasswordResetSerializer, DeleteAccountSerializer, LoginSerializer,
     MeSerializer, RequestPasswordResetSerializer, SetupMFASerializer, SignupSerializer, UserSerializer, VerifyEmailSerializer, VerifyMFASerializer
 )
+from ..tasks import stop_user_pending_chats
+from ..temporary_chats import discard_temporary_chat, get_user_temporary_chats
 from ..throttles import IPEmailRateThrottle, MFATokenRateThrottle, RefreshRateThrottle, RefreshTokenRateThrottle, SignupRateThrottle
+from ..user_cache import aget_cached_me, aset_cached_me
+from ..versions import bump_user_version
 
 class Signup(APIView):
     authentication_classes = []
@@ -250,6 +256,7 @@ class Logout(APIView):
             try:
                 refresh_jti = RefreshToken(refresh_token).get("jti")
                 user.sessions.filter(logout_at__isnull = True, refresh_jti = refresh_jti).update(logout_at = timezone.now())
+                bump_user_version(user.pk)
             except TokenError:
                 pass
 
@@ -272,9 +279,7 @@ class LogoutAllSessions(APIView):
         user: User = request.user
 
         user.sessions.filter(logout_at__isnull = True).update(logout_at = timezone.now())
-        tokens = OutstandingToken.objects.filter(user = user)
-        for token in tokens:
-            BlacklistedToken.objects.get_or_create(token = token)
+        revoke_user_tokens(user)
 
         response = Response(status = status.HTTP_200_OK)
         response.delete_cookie("access_token")
@@ -529,7 +534,7 @@ class VerifyMFA(APIView):
 
         return response
 
-class Me(APIView):
+class Me(AsyncAPIView):
     permission_classes = [IsAuthenticated]
 
     @extend_schema(
@@ -538,8 +543,20 @@ class Me(APIView):
         tags=["User"],
         responses={200: UserSerializer}
     )
-    def get(self, request: Request):
-        return Response(UserSerializer(request.user, many = False).data, status.HTTP_200_OK)
+    async def get(self, request: Request):
+        user: User = request.user
+
+        version, data = await aget_cached_me(user.pk)
+        etag = get_etag("me", user.pk, version)
+        if is_not_modified(request, etag):
+            return not_modified_response(etag)
+
+        if data is None:
+            user = await User.objects.select_related("preferences", "mfa").aget(pk = user.pk)
+            data = await sync_to_async(lambda: UserSerializer(user, many = False).data)()
+            await aset_cached_me(user.pk, version, data)
+
+        return with_etag(Response(data, status.HTTP_200_OK), etag)
 
     @extend_schema(
         summary="Update User Preferences",
@@ -548,18 +565,19 @@ class Me(APIView):
         request=MeSerializer,
         responses={200: OpenApiTypes.OBJECT}
     )
-    def patch(self, request: Request):
+    async def patch(self, request: Request):
         user: User = request.user
 
         qs = MeSerializer(data = request.data)
         qs.is_valid(raise_exception = True)
 
+        preferences = await UserPreferences.objects.aget(user = user)
         for key in ["language", "theme", "has_sidebar_open", "custom_instructions", "nickname", "occupation", "about"]:
             value = qs.validated_data.get(key)
             if value is not None:
-                setattr(user.preferences, key, value)
+                setattr(preferences, key, value)
 
-        user.preferences.save()
+        await preferences.asave()
         return Response(status = status.HTTP_200_OK)
 
 class DeleteAccount(APIView):
@@ -567,7 +585,8 @@ class DeleteAccount(APIView):
 
     @extend_schema(
         summary="Delete Account",
-        description="Permanently delete the user account. Requires password and MFA code (if enabled).",
+        description="Permanently delete the user account. Requires password and MFA code (if enabled). "
+                    "The account is deactivated immediately and its data is purged in the background.",
         tags=["User"],
         request=DeleteAccountSerializer,
         responses={
@@ -609,7 +628,11 @@ class DeleteAccount(APIView):
                 if not user.mfa.verify(mfa_code):
                     return Response({"detail": "mfa.messages.errorInvalidCode"}, status.HTTP_403_FORBIDDEN)
 
-        user.delete()
+        stop_user_pending_chats(user)
+        for chat_uuid in get_user_temporary_chats(user.pk):
+            discard_temporary_chat(user.pk, chat_uuid)
+        AccountDeletion.request(user)
+
         response = Response(status = status.HTTP_204_NO_CONTENT)
         response.delete_cookie("access_token")
         response.delete_cookie("refresh_token")
@@ -727,15 +750,12 @@ class AuthenticateAsGuest(APIView):
 
         user: User | None = None
         if guest_token:
-            identity = GuestIdentity.objects.select_related("user").filter(expires_at__gt = timezone.now()).first()
+            identity = GuestIdentity.get_by_token(guest_token)
 
-            if identity:
-                if not check_password(guest_token, identity.user.password):
+            if identity and identity.user_agent_hash:
+                current_ua_hash = hash_user_agent(request.user_agent_raw or "")
+                if current_ua_hash != identity.user_agent_hash:
                     identity = None
-                elif identity.user_agent_hash:
-                    current_ua_hash = hash_user_agent(request.user_agent_raw or "")
-                    if current_ua_hash != identity.user_agent_hash:
-                        identity = None
 
             if identity:
                 user = identity.user
@@ -1,11 +1,21 @@
+import hashlib
+import inspect
+
+from asgiref.sync import sync_to_async
+from django.utils.http import parse_etags
 from django.utils.translation import gettext_lazy as _
-from user_agents import parse
+from rest_framework import status
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from ..user_agent import parse_user_agent
 
 def readable_user_agent(user_agent_raw: str | None) -> str:
     if not user_agent_raw:
         return "Unknown device"
 
-    ua = parse(user_agent_raw)
+    ua = parse_user_agent(user_agent_raw)
 
     parts = []
 
@@ -18,4 +28,49 @@ def readable_user_agent(user_agent_raw: str | None) -> str:
     if ua.device.family and ua.device.family != "Other":
         parts.append(f"({ua.device.family})")
 
-    return " ".join(parts) or "Unknown device"
\ No newline at end of file
+    return " ".join(parts) or "Unknown device"
+
+class AsyncAPIView(APIView):
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+
+            response = handler(request, *args, **kwargs)
+            if inspect.isawaitable(response):
+                response = await response
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+def get_etag(*parts) -> str | None:
+    if None in parts:
+        return None
+    return f'"{hashlib.sha256(":".join([str(p) for p in parts]).encode()).hexdigest()[:32]}"'
+
+def is_not_modified(request: Request, etag: str | None) -> bool:
+    if etag is None:
+        return False
+    etags = [e.removeprefix("W/") for e in parse_etags(request.headers.get("If-None-Match", ""))]
+    return etag in etags or "*" in etags
+
+def not_modified_response(etag: str) -> Response:
+    return with_etag(Response(status = status.HTTP_304_NOT_MODIFIED), etag)
+
+def with_etag(response: Response, etag: str | None) -> Response:
+    if etag is not None:
+        response["ETag"] = etag
+        response["Cache-Control"] = "private, no-cache"
+    return response
\ No newline at end of file